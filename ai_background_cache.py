@@ -0,0 +1,82 @@
+"""
+AI背景图缓存
+按 (prompt, 模型, 生成尺寸, 页面尺寸) 缓存已缩放好的AI背景图，落盘到 data/ai_backgrounds，
+按总字节数淘汰；每个prompt最多保留 AI_BG_VARIANTS_PER_PROMPT 个变体，
+变体未满时继续调用AI生成新的变体，满了之后直接从缓存中选取
+"""
+import hashlib
+import json
+import os
+import random
+from io import BytesIO
+from typing import Optional
+
+from PIL import Image
+
+from cache_store import DiskCache, env_megabytes
+from project_paths import project_path
+
+AI_BG_CACHE_DIR = project_path("data", "ai_backgrounds")
+
+try:
+    AI_BG_VARIANTS_PER_PROMPT = max(1, int(os.getenv("AI_BG_VARIANTS_PER_PROMPT", "1")))
+except ValueError:
+    AI_BG_VARIANTS_PER_PROMPT = 1
+
+_background_cache = DiskCache(AI_BG_CACHE_DIR, env_megabytes("AI_BG_CACHE_MB", 512), suffix=".png")
+
+
+def background_cache_key(prompt: str, model: str, size: str, width: int, height: int) -> str:
+    """计算背景缓存键"""
+    payload = json.dumps([prompt, model, size, width, height], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cached_variants(key: str):
+    return [
+        i for i in range(AI_BG_VARIANTS_PER_PROMPT)
+        if os.path.exists(_background_cache.path_for(f"{key}_{i}"))
+    ]
+
+
+def get_cached_background(key: str, variant: Optional[int] = None) -> Optional[Image.Image]:
+    """
+    读取缓存的背景图
+
+    Args:
+        key: background_cache_key 的结果
+        variant: 变体选择值（如渲染种子），None时随机选择
+
+    Returns:
+        RGB/RGBA图片；变体数量未达到上限（需要生成新变体）或未命中时返回None
+    """
+    variants = _cached_variants(key)
+    if len(variants) < AI_BG_VARIANTS_PER_PROMPT:
+        return None
+
+    if variant is None:
+        index = random.choice(variants)
+    else:
+        index = variants[variant % len(variants)]
+    data = _background_cache.get(f"{key}_{index}")
+    if data is None:
+        return None
+    try:
+        img = Image.open(BytesIO(data))
+        img.load()
+        return img
+    except Exception as e:
+        print(f"AI背景缓存损坏，已丢弃 ({key}_{index}): {e}")
+        _background_cache.delete(f"{key}_{index}")
+        return None
+
+
+def put_cached_background(key: str, image: Image.Image):
+    """保存新生成的背景图到第一个空闲的变体位置"""
+    variants = set(_cached_variants(key))
+    free = [i for i in range(AI_BG_VARIANTS_PER_PROMPT) if i not in variants]
+    index = free[0] if free else 0
+
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    _background_cache.put(f"{key}_{index}", buffer.getvalue())
@@ -1,48 +1,40 @@
 import streamlit as st
 import base64
 import os
-import json
 from datetime import datetime, date
-from io import BytesIO
-from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageEnhance
-import random
 import uuid
-import requests
+import time
+import mimetypes
+import math
 
-# 火山方舟AI导入（可选，如果未安装则使用降级方案）
-try:
-    from volcenginesdkarkruntime import Ark
-    AI_AVAILABLE = True
-except ImportError:
-    AI_AVAILABLE = False
+from font_registry import resolve_cjk_font
+from image_source import ImageSource
+from jobs import bind_current_job, configure_feedback, get_job_runner, get_pipeline_executor, set_job_stage
+from journal_renderer import bg_path
+from journal_store import (
+    SUPABASE_AVAILABLE,
+    count_journals,
+    create_journal_renditions,
+    get_journal,
+    journal_download_name,
+    load_journals_page,
+    remove_replaced_file,
+    save_image,
+    save_journal,
+    storage_download_url,
+    store_journal_image
+)
+from local_store import delete_local_journal, update_local_journal
+from project_paths import project_path, use_project_root
+from render_service import RenderServiceBusy, get_render_service, render_journal_page
+from renditions import image_rendition, page_rendition
 
-# 支持从.env文件加载环境变量（推荐方式）
+# Supabase支持（可选，连接检查见 journal_store）
 try:
-    from dotenv import load_dotenv
-    load_dotenv()  # 自动加载项目根目录下的.env文件
+    from supabase_config import update_journal_in_supabase, delete_journal_from_supabase
 except ImportError:
-    # 如果没有安装python-dotenv，跳过（不影响功能）
     pass
 
-# Supabase支持（可选，如果配置了环境变量则使用云数据库）
-try:
-    from supabase_config import (
-        get_supabase_client,
-        upload_image_to_supabase,
-        upload_file_to_supabase,
-        load_journals_from_supabase,
-        save_journal_to_supabase,
-        update_journal_in_supabase,
-        delete_journal_from_supabase,
-        search_journals_in_supabase,
-        filter_journals_by_weather
-    )
-    SUPABASE_AVAILABLE = get_supabase_client() is not None
-except ImportError:
-    SUPABASE_AVAILABLE = False
-except Exception:
-    SUPABASE_AVAILABLE = False
-
 # ==========================================
 # 1. 配置与常量
 # ==========================================
@@ -55,739 +47,91 @@ st.set_page_config(
 
 
 # 路径配置
-DATA_DIR = "data"
-JOURNALS_FILE = os.path.join(DATA_DIR, "journals.json")
-IMAGES_DIR = os.path.join(DATA_DIR, "images")
-bg_path = "assets/bg_rain.jpg"
-icon_path = "assets/flower_icon.png"
-fog_path = "assets/fog_overlay.png"
+JOURNALS_PER_PAGE = 20  # 列表视图每页条目数
+icon_path = project_path("assets", "flower_icon.png")
+# 日记条目中的本地图片路径相对于项目根目录（从其他目录启动时也能找到）
+use_project_root()
 
-# 创建必要的目录
-os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs(IMAGES_DIR, exist_ok=True)
+# 启动时解析中文字体（进程内只执行一次，后续rerun直接命中缓存）
+resolve_cjk_font()
 
-# ==========================================
-# 2. 数据存储函数（支持Supabase和本地文件）
-# ==========================================
-def load_journals():
-    """加载所有日记条目（优先使用Supabase，降级到本地文件）"""
-    if SUPABASE_AVAILABLE:
-        try:
-            journals = load_journals_from_supabase()
-            # 转换格式以兼容现有代码（将URL转换为路径格式）
-            for journal in journals:
-                if "journal_image_url" in journal:
-                    journal["journal_image_path"] = journal["journal_image_url"]
-                if "image_paths" in journal and isinstance(journal["image_paths"], list):
-                    # image_paths已经是URL数组，保持原样
-                    pass
-            return journals
-        except Exception as e:
-            st.warning(f"⚠️ Supabase加载失败，使用本地文件：{str(e)}")
-    
-    # 降级到本地文件
-    if os.path.exists(JOURNALS_FILE):
-        try:
-            with open(JOURNALS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
+# 不在后台任务中时，提示和加载动画显示在页面上
+configure_feedback(lambda level, message: getattr(st, level)(message), st.spinner)
 
-def save_journals(journals):
-    """保存日记条目（兼容函数，实际使用save_journal）"""
-    # 这个函数主要用于向后兼容，实际保存使用save_journal函数
-    if SUPABASE_AVAILABLE:
-        # 如果使用Supabase，这个函数不应该被调用
-        # 因为每个条目应该单独保存
-        pass
-    else:
-        # 本地文件模式
-        with open(JOURNALS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(journals, f, ensure_ascii=False, indent=2)
+# 后台生成任务的进度阶段
+JOURNAL_JOB_STAGES = [
+    ("uploading", "📤 正在上传图片..."),
+    ("ai_background", "🎨 AI正在生成背景图..."),
+    ("queued", "⏳ 正在排队等待渲染..."),
+    ("compositing", "🌧️ 正在合成手账..."),
+    ("storing", "💾 正在保存手账..."),
+]
+JOB_POLL_INTERVAL = 0.5  # 页面轮询任务状态的间隔（秒）
 
-def save_journal(journal_entry):
-    """保存单个日记条目（新增，支持Supabase和本地）"""
-    if SUPABASE_AVAILABLE:
-        try:
-            # 准备Supabase格式的数据
-            supabase_data = {
-                "date": journal_entry["date"],
-                "weather": journal_entry["weather"],
-                "text": journal_entry["text"],
-                "image_paths": journal_entry.get("image_paths", []),
-                "journal_image_url": journal_entry.get("journal_image_path") or journal_entry.get("journal_image_url")
-            }
-            journal_id = save_journal_to_supabase(supabase_data)
-            if journal_id:
-                journal_entry["id"] = journal_id
-                return True
-            return False
-        except Exception as e:
-            st.warning(f"⚠️ Supabase保存失败，使用本地文件：{str(e)}")
-    
-    # 降级到本地文件
-    journals = load_journals()
-    journals.append(journal_entry)
-    with open(JOURNALS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(journals, f, ensure_ascii=False, indent=2)
-    return True
-
-def save_image(uploaded_file):
-    """保存上传的图片（优先使用Supabase Storage，降级到本地文件）"""
-    file_id = str(uuid.uuid4())
-    file_ext = os.path.splitext(uploaded_file.name)[1]
-    
-    if SUPABASE_AVAILABLE:
-        try:
-            # 上传到Supabase Storage
-            file_bytes = uploaded_file.getbuffer()
-            filename = f"{file_id}{file_ext}"
-            url = upload_file_to_supabase(file_bytes, filename, folder="uploads")
-            if url:
-                return url  # 返回URL而不是路径
-        except Exception as e:
-            st.warning(f"⚠️ Supabase上传失败，使用本地文件：{str(e)}")
-    
-    # 降级到本地文件
-    file_path = os.path.join(IMAGES_DIR, f"{file_id}{file_ext}")
-    with open(file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    return file_path
-
-def load_image_from_path_or_url(path_or_url):
+def generate_journal(uploaded_files, journal_text, date_str, weather, ticket=None):
     """
-    从本地路径或URL加载图片
-    支持本地文件路径和HTTP/HTTPS URL
+    完整的手账生成流程：保存图片 / 生成手账（并发） -> 保存手账图片 -> 保存日记条目
+    在后台任务中执行，进度通过 set_job_stage 上报
+    上传图片与AI生图互不依赖，同时进行；图片预处理和合成在渲染进程中执行
     
     Args:
-        path_or_url: 本地文件路径或URL
+        uploaded_files: 上传的图片（ImageSource 或带 name 属性的文件对象）
+        journal_text: 随笔文字
+        date_str: 日期字符串
+        weather: 天气
+        ticket: 页面提交任务前在渲染服务中占的位置（见 render_service），为None时在这里占位
     
     Returns:
-        PIL Image对象，失败返回None
+        包含 journal_image、journal_file（编码后的手账图片）、journal_entry、date_str 的字典
     """
-    try:
-        # 判断是URL还是本地路径
-        if path_or_url.startswith(('http://', 'https://')):
-            # 从URL加载
-            response = requests.get(path_or_url, timeout=30)
-            if response.status_code == 200:
-                return Image.open(BytesIO(response.content))
-            else:
-                return None
-        else:
-            # 从本地路径加载
-            if os.path.exists(path_or_url):
-                return Image.open(path_or_url)
-            else:
-                return None
-    except Exception as e:
-        print(f"加载图片失败 ({path_or_url}): {e}")
-        return None
-
-# ==========================================
-# 3. 图片处理函数（Shoegaze/Dreamcore风格）
-# ==========================================
-def apply_dreamcore_effects(img, intensity=0.7):
-    """
-    应用Dreamcore效果：模糊、滤镜、水汽感
-    """
-    # 转换为RGBA以便处理透明度
-    img = img.convert("RGBA")
-    
-    # 1. 轻微模糊（失焦效果）
-    blur_radius = int(3 * intensity)
-    if blur_radius > 0:
-        img = img.filter(ImageFilter.GaussianBlur(radius=blur_radius))
-    
-    # 2. 色调调整（冷色调，增加朦胧感）
-    enhancer = ImageEnhance.Color(img)
-    img = enhancer.enhance(0.8)  # 降低饱和度
-    
-    # 3. 亮度调整（略微降低）
-    enhancer = ImageEnhance.Brightness(img)
-    img = enhancer.enhance(0.9)
-    
-    # 4. 添加半透明层（水汽感）
-    overlay = Image.new("RGBA", img.size, (200, 220, 255, int(30 * intensity)))
-    img = Image.alpha_composite(img, overlay)
-    
-    return img
-
-# ==========================================
-# 4. AI生图相关函数
-# ==========================================
-def generate_ai_prompt(text, date_str, weather):
-    """
-    根据用户输入生成Dreamcore风格的AI生图prompt
-    """
-    # 基础Dreamcore风格关键词
-    dreamcore_keywords = [
-        "dreamcore aesthetic", "shoegaze atmosphere", "hazy and ethereal",
-        "soft focus", "blurred bokeh lights", "rainy window", "nostalgic mood",
-        "pastel colors", "vaporwave vibes", "memory fragments", "emotional atmosphere",
-        "watery reflections", "translucent layers", "non-linear composition"
-    ]
-    
-    # 根据天气调整氛围
-    weather_moods = {
-        "☀️ 晴天": "warm sunlight filtering through, golden hour glow, cheerful brightness",
-        "⛅ 多云": "soft diffused light, gentle shadows, peaceful overcast sky",
-        "🌧️ 雨天": "raindrops on glass, blurred city lights, melancholic rainy atmosphere",
-        "❄️ 雪天": "snowflakes falling, cold blue tones, serene winter scene",
-        "🌫️ 雾天": "thick fog, mysterious atmosphere, obscured distant views",
-        "🌙 夜晚": "night city lights, dark moody tones, nocturnal dreamscape"
-    }
-    
-    weather_mood = weather_moods.get(weather, "dreamy atmospheric")
+    sources = [ImageSource.coerce(uploaded_file) for uploaded_file in uploaded_files]
     
-    # 根据用户文字提取情绪关键词
-    emotion_keywords = ""
-    if text:
-        # 简单的情感关键词提取（可以根据需要扩展）
-        positive_words = ["开心", "快乐", "幸福", "美好", "温暖", "喜欢", "爱"]
-        negative_words = ["难过", "悲伤", "孤独", "疲惫", "焦虑", "担心"]
-        
-        text_lower = text.lower()
-        if any(word in text for word in positive_words):
-            emotion_keywords = "warm and joyful, uplifting mood, positive energy"
-        elif any(word in text for word in negative_words):
-            emotion_keywords = "melancholic and introspective, soft sadness, contemplative mood"
-        else:
-            emotion_keywords = "peaceful and reflective, calm atmosphere, gentle emotions"
-    
-    # 组合prompt - 明确要求纯背景，不包含文字
-    prompt_parts = [
-        "A dreamcore aesthetic journal page background,",
-        weather_mood + ",",
-        emotion_keywords + "," if emotion_keywords else "",
-        "featuring " + ", ".join(dreamcore_keywords[:5]) + ",",
-        "vertical composition, soft pastel color palette,",
-        "paper texture overlay, artistic journal style,",
-        "NO TEXT, NO WORDS, NO LETTERS, pure background only,",  # 明确禁止文字
-        "suitable for handwritten text overlay, abstract decorative elements only"
+    # 保存图片（并发上传，与手账生成同时进行）
+    set_job_stage("uploading")
+    upload_futures = [
+        get_pipeline_executor().submit(bind_current_job(save_image), source)
+        for source in sources
     ]
     
-    prompt = " ".join([p for p in prompt_parts if p])
-    
-    # 如果用户有具体文字描述，只提取情绪和氛围，不直接加入文字内容
-    if text and len(text) < 50:  # 短文本可以提取情绪
-        # 只提取情绪关键词，不直接使用文字内容
-        prompt += f", mood: {text[:20]}"  # 只取前20个字符作为情绪参考
-    
-    return prompt
-
-def generate_ai_background(prompt, base_width=1200, base_height=1600, show_error=True):
-    """
-    使用火山方舟AI生成背景图片
-    返回PIL Image对象，失败时返回None
-    
-    Args:
-        prompt: 生图提示词
-        base_width: 图片宽度
-        base_height: 图片高度
-        show_error: 是否显示错误信息（默认True，便于调试）
-    """
-    if not AI_AVAILABLE:
-        if show_error:
-            st.warning("⚠️ AI功能不可用：未安装 volcengine-python-sdk[ark]，请运行 `pip install 'volcengine-python-sdk[ark]'`")
-        return None
-    
-    api_key = os.getenv('ARK_API_KEY')
-    if not api_key:
-        if show_error:
-            st.warning("⚠️ AI功能不可用：未设置 ARK_API_KEY 环境变量。请在 .env 文件中设置，或使用系统环境变量。")
-        return None
-    
-    try:
-        # 初始化客户端
-        client = Ark(
-            base_url="https://ark.cn-beijing.volces.com/api/v3",
-            api_key=api_key,
+    # 生成手帐：直接使用内存中的原始字节，不等待上传完成，也不会再从网络下载
+    # （新日记尚未保存，种子只由内容派生：相同内容重试时排版一致，并命中渲染缓存）
+    # AI背景在当前任务线程中生成（与上传同时进行），合成在渲染进程中执行，渲染进程都在工作时排队等待
+    journal_id = str(uuid.uuid4())
+    with ticket or get_render_service().reserve() as ticket:
+        journal_image = ticket.render(
+            sources,
+            journal_text,
+            date_str,
+            weather
         )
-        
-        # 调用生图API
-        with st.spinner("🎨 AI正在生成背景图..."):
-            imagesResponse = client.images.generate(
-                model="doubao-seedream-4-5-251128",
-                prompt=prompt,
-                size="2K",  # 2K分辨率，适合作为背景
-                response_format="url",
-                watermark=False
-            )
-        
-        # 获取图片URL并下载
-        if imagesResponse.data and len(imagesResponse.data) > 0:
-            image_url = imagesResponse.data[0].url
-            
-            # 下载图片
-            response = requests.get(image_url, timeout=30)
-            if response.status_code == 200:
-                # 转换为PIL Image
-                img = Image.open(BytesIO(response.content))
-                
-                # 调整尺寸以匹配手账页面
-                img = img.resize((base_width, base_height), Image.Resampling.LANCZOS)
-                
-                st.success("✨ AI背景生成成功！")
-                return img
-            else:
-                if show_error:
-                    st.error(f"❌ 图片下载失败：HTTP {response.status_code}")
-                return None
-        else:
-            if show_error:
-                st.error("❌ AI生图返回为空，请检查API响应")
-            return None
-            
-    except Exception as e:
-        # 显示详细错误信息
-        if show_error:
-            error_msg = str(e)
-            st.error(f"❌ AI生图失败：{error_msg}")
-            # 如果是API相关错误，提供更多提示
-            if "api_key" in error_msg.lower() or "auth" in error_msg.lower():
-                st.info("💡 提示：请检查 API 密钥是否正确，或访问 https://console.volcengine.com/ark/region:ark+cn-beijing/apikey 获取新密钥")
-            elif "model" in error_msg.lower():
-                st.info("💡 提示：请检查模型ID是否正确：doubao-seedream-4-5-251128")
-        return None
-
-# ==========================================
-# 5. 手帐生成函数
-# ==========================================
-def create_journal_page(images, text, date_str, weather, base_width=1200, base_height=1600, use_ai=True):
-    """
-    生成手帐页面
-    风格：Shoegaze/Dreamcore - 失焦、朦胧、半透明、非线性排版
-    
-    Args:
-        images: 用户上传的图片列表
-        text: 用户输入的文本
-        date_str: 日期字符串
-        weather: 天气
-        base_width: 基础宽度
-        base_height: 基础高度
-        use_ai: 是否使用AI生成背景（默认True）
-    """
-    # 尝试使用AI生成背景
-    ai_background = None
-    if use_ai:
-        try:
-            prompt = generate_ai_prompt(text, date_str, weather)
-            # 显示生成的prompt（调试用，可选）
-            # st.info(f"🎨 AI Prompt: {prompt[:100]}...")
-            ai_background = generate_ai_background(prompt, base_width, base_height, show_error=True)
-        except Exception as e:
-            # AI失败时显示错误并降级
-            st.warning(f"⚠️ AI生图异常，使用默认背景：{str(e)}")
-            ai_background = None
-    
-    # 创建底图
-    if ai_background:
-        # 使用AI生成的背景作为底图
-        base_img = ai_background.convert("RGBA")
-        
-        # 添加轻微的纸质纹理叠加（保持手账感）
-        paper_overlay = Image.new("RGBA", (base_width, base_height), (245, 240, 235, 30))
-        base_img = Image.alpha_composite(base_img, paper_overlay)
-    else:
-        # 降级方案：使用默认纸质纹理
-        if use_ai:
-            # 只在尝试使用AI但失败时显示提示（避免每次都显示）
-            pass  # 错误信息已在 generate_ai_background 中显示
-        base_img = Image.new("RGB", (base_width, base_height), (245, 240, 235))
-        
-        # 添加微妙的纹理（模拟纸张）
-        draw = ImageDraw.Draw(base_img)
-        for _ in range(1000):
-            x = random.randint(0, base_width)
-            y = random.randint(0, base_height)
-            gray = random.randint(240, 250)
-            draw.point((x, y), fill=(gray, gray-5, gray-10))
-        
-        # 如果有背景雨图，作为底层氛围
-        if os.path.exists(bg_path):
-            try:
-                bg = Image.open(bg_path).convert("RGBA")
-                bg = bg.resize((base_width, base_height), Image.Resampling.LANCZOS)
-                # 非常低的透明度，作为氛围
-                bg_alpha = bg.split()[3]
-                bg_alpha = bg_alpha.point(lambda x: int(x * 0.15))
-                bg.putalpha(bg_alpha)
-                base_img = Image.alpha_composite(base_img.convert("RGBA"), bg).convert("RGB")
-            except:
-                pass
-        
-        # 转换为RGBA以便后续合成
-        if base_img.mode != "RGBA":
-            base_img = base_img.convert("RGBA")
-    
-    # 处理并放置图片（1-3张，非线性排版）
-    processed_images = []
-    for img_path in images[:3]:  # 最多3张
-        img = load_image_from_path_or_url(img_path)
-        if img:
-            try:
-                img = img.convert("RGBA")
-                
-                # 应用Dreamcore效果
-                img = apply_dreamcore_effects(img, intensity=0.6)
-                
-                # 随机尺寸（但保持比例）- 移动端优化
-                max_size = min(base_width, base_height) // 2.5
-                img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-                
-                processed_images.append(img)
-            except Exception as e:
-                print(f"处理图片失败: {e}")
-                continue
-    
-    # 非线性排版：随机位置和角度
-    positions = []
-    for i, img in enumerate(processed_images):
-        # 计算可用区域（避免重叠）- 移动端优化边距
-        margin = int(base_width * 0.1)  # 响应式边距
-        x_range = (margin, base_width - img.width - margin)
-        y_range = (margin, base_height - img.height - margin)
-        
-        # 尝试找到一个不重叠的位置
-        max_attempts = 50
-        for _ in range(max_attempts):
-            x = random.randint(*x_range)
-            y = random.randint(*y_range)
-            
-            # 检查是否与已有位置重叠
-            overlap = False
-            for px, py, pw, ph in positions:
-                if not (x + img.width < px or x > px + pw or y + img.height < py or y > py + ph):
-                    overlap = True
-                    break
-            
-            if not overlap:
-                positions.append((x, y, img.width, img.height))
-                break
-        else:
-            # 如果找不到不重叠的位置，使用默认位置
-            x = margin + i * (base_width - 2 * margin) // len(processed_images)
-            y = margin + random.randint(0, base_height // 3)
-            positions.append((x, y, img.width, img.height))
-    
-    # 粘贴图片（带旋转和透明度）
-    for i, (img, (x, y, w, h)) in enumerate(zip(processed_images, positions)):
-        # 随机旋转角度（-15到15度）
-        angle = random.uniform(-15, 15)
-        rotated_img = img.rotate(angle, expand=False, fillcolor=(0, 0, 0, 0))
-        
-        # 调整透明度（模拟记忆碎片感）
-        alpha = rotated_img.split()[3]
-        alpha = alpha.point(lambda x: int(x * 0.85))  # 85%不透明度
-        rotated_img.putalpha(alpha)
-        
-        # 粘贴到基图上
-        base_img.paste(rotated_img, (x, y), rotated_img)
-    
-    # 加载字体 - 移动端优化尺寸
-    font_title = None
-    font_text = None
-    font_size_title = int(base_width * 0.06)  # 响应式字体大小
-    font_size_text = int(base_width * 0.04)
-    
-    # 获取项目根目录路径
-    project_root = os.path.dirname(os.path.abspath(__file__))
-    fonts_dir = os.path.join(project_root, "fonts")
-    
-    # 字体路径列表，优先使用项目内的字体文件
-    font_paths = [
-        # ============================================
-        # 优先：项目内 fonts 文件夹中的字体文件
-        # ============================================
-        (os.path.join(fonts_dir, "journal_font.ttf"), None),  # 项目字体（优先）
-        (os.path.join(fonts_dir, "NotoSansCJK-Regular.ttf"), None),  # Noto 中文字体
-        (os.path.join(fonts_dir, "NotoSansCJK-Regular.ttc"), None),  # Noto 中文字体（TTC格式）
-        (os.path.join(fonts_dir, "wqy-microhei.ttc"), None),  # 文泉驿微米黑
-        (os.path.join(fonts_dir, "wqy-zenhei.ttc"), None),  # 文泉驿正黑
-        (os.path.join(fonts_dir, "msyh.ttc"), None),  # 微软雅黑
-        (os.path.join(fonts_dir, "simhei.ttf"), None),  # 黑体
-        (os.path.join(fonts_dir, "simsun.ttc"), None),  # 宋体
-        (os.path.join(fonts_dir, "simkai.ttf"), None),  # 楷体
-        # 尝试 fonts 文件夹中的所有 .ttf 和 .ttc 文件（如果文件夹存在）
-    ]
-    
-    # 动态添加 fonts 文件夹中的所有字体文件
-    if os.path.exists(fonts_dir) and os.path.isdir(fonts_dir):
-        try:
-            for f in os.listdir(fonts_dir):
-                font_path = os.path.join(fonts_dir, f)
-                if os.path.isfile(font_path) and f.lower().endswith(('.ttf', '.ttc')):
-                    # 避免重复添加已列出的字体
-                    if font_path not in [p for p, _ in font_paths]:
-                        font_paths.append((font_path, None))
-        except Exception:
-            # 如果读取文件夹失败，继续使用已列出的字体路径
-            pass
-    
-    # 继续添加其他字体路径
-    font_paths.extend([
-        # ============================================
-        # 备选：项目内 assets 文件夹中的字体文件
-        # ============================================
-        (os.path.join(project_root, "assets", "handwriting.ttf"), None),  # 手写字体（如果支持中文）
-        (os.path.join(project_root, "assets", "journal_font.ttf"), None),  # assets 中的字体
-        
-        # ============================================
-        # 降级：系统字体路径（云服务器常用）
-        # ============================================
-        # Linux 字体路径（云服务器常用）
-        ("/usr/share/fonts/truetype/wqy/wqy-microhei.ttc", None),  # 文泉驿微米黑
-        ("/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc", None),  # 文泉驿正黑
-        ("/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc", None),  # Noto 中文字体
-        ("/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc", None),  # Noto 中文字体（OpenType）
-        ("/usr/share/fonts/truetype/arphic/uming.ttc", None),  # AR PL UMing 中文字体
-        ("/usr/share/fonts/truetype/arphic/ukai.ttc", None),  # AR PL UKai 中文字体
-        ("/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf", None),  # Droid Sans Fallback
-        ("/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf", None),  # Liberation Sans
-        
-        # Windows 字体路径
-        ("C:/Windows/Fonts/msyh.ttc", None),  # 微软雅黑（优先，支持中文）
-        ("C:/Windows/Fonts/msyhbd.ttc", None),  # 微软雅黑 Bold
-        ("C:/Windows/Fonts/simhei.ttf", None),  # 黑体
-        ("C:/Windows/Fonts/simsun.ttc", None),  # 宋体
-        ("C:/Windows/Fonts/simkai.ttf", None),  # 楷体
-        ("C:/Windows/Fonts/arial.ttf", None),  # Arial（英文，最后备选）
-        
-        # macOS 字体路径
-        ("/System/Library/Fonts/PingFang.ttc", None),  # macOS 中文字体
-        ("/System/Library/Fonts/STHeiti Light.ttc", None),  # macOS 黑体
-        ("/System/Library/Fonts/Supplemental/PingFang.ttc", None),  # macOS PingFang 备选路径
-        
-        # 尝试使用系统默认字体目录
-        (os.path.expanduser("~/Library/Fonts/PingFang.ttc"), None),  # macOS 用户字体目录
-        (os.path.expanduser("~/.fonts/wqy-microhei.ttc"), None),  # Linux 用户字体目录
-        (os.path.expanduser("~/.local/share/fonts/wqy-microhei.ttc"), None),  # Linux 用户字体目录（备选）
-    ])
-    
-    # 去重字体路径列表（避免重复）
-    seen_paths = set()
-    unique_font_paths = []
-    for path, index in font_paths:
-        if path not in seen_paths:
-            seen_paths.add(path)
-            unique_font_paths.append((path, index))
-    font_paths = unique_font_paths
-    
-    # 尝试加载字体（优先使用项目内字体）
-    font_title = None
-    font_text = None
-    font_loaded = False
-    
-    for path, index in font_paths:
-        try:
-            # 检查文件是否存在
-            if not os.path.exists(path):
-                continue
-            
-            # 加载字体
-            try:
-                # 对于 .ttc 文件，尝试不同的索引
-                if path.endswith('.ttc'):
-                    # 尝试索引 0（通常包含常规字体）
-                    try:
-                        font_title = ImageFont.truetype(path, font_size_title, index=0)
-                        font_text = ImageFont.truetype(path, font_size_text, index=0)
-                    except:
-                        # 如果索引 0 失败，尝试不指定索引
-                        try:
-                            font_title = ImageFont.truetype(path, font_size_title)
-                            font_text = ImageFont.truetype(path, font_size_text)
-                        except:
-                            # 如果还是失败，尝试其他索引（1-3）
-                            for idx in range(1, 4):
-                                try:
-                                    font_title = ImageFont.truetype(path, font_size_title, index=idx)
-                                    font_text = ImageFont.truetype(path, font_size_text, index=idx)
-                                    break
-                                except:
-                                    continue
-                else:
-                    # .ttf 文件直接加载
-                    font_title = ImageFont.truetype(path, font_size_title)
-                    font_text = ImageFont.truetype(path, font_size_text)
-            except Exception as e:
-                # 如果加载失败，继续尝试下一个字体
-                font_title = None
-                font_text = None
-                continue
-            
-            # 测试字体是否能正确渲染中文
-            if font_title is not None:
-                test_img = Image.new("RGB", (100, 100), "white")
-                test_draw = ImageDraw.Draw(test_img)
-                try:
-                    # 测试中文字符（使用多个中文字符确保字体支持中文）
-                    test_text = "年月日中文"
-                    test_draw.text((0, 0), test_text, font=font_title)
-                    # 如果成功，使用这个字体
-                    font_loaded = True
-                    break
-                except Exception as e:
-                    # 如果测试失败，继续尝试下一个
-                    font_title = None
-                    font_text = None
-                    continue
-        except Exception as e:
-            # 发生任何异常，继续尝试下一个字体
-            font_title = None
-            font_text = None
-            continue
-    
-    # 如果所有字体都加载失败，尝试使用PIL的默认字体
-    # 如果默认字体也不可用，创建一个简单的字体对象用于渲染
-    if font_title is None:
-        try:
-            # 尝试加载默认字体
-            font_title = ImageFont.load_default()
-            font_text = ImageFont.load_default()
-        except:
-            # 如果默认字体也失败，创建一个空字体对象（会在后续代码中处理）
-            font_title = None
-            font_text = None
-    
-    # 如果仍然没有字体，使用PIL的默认字体（可能不支持中文，但至少能显示）
-    if font_title is None:
-        try:
-            font_title = ImageFont.load_default()
-            font_text = ImageFont.load_default()
-        except:
-            pass
-    
-    draw = ImageDraw.Draw(base_img)
-    
-    # 绘制日期和天气（左上角，略微旋转）
-    # 增强颜色对比度，确保字体清晰可见
-    date_weather_text = f"{date_str}  {weather}"
-    
-    # 计算文字宽度
-    if font_title is not None:
-        try:
-            bbox = draw.textbbox((0, 0), date_weather_text, font=font_title)
-            text_width = bbox[2] - bbox[0]
-        except Exception as e:
-            # 如果字体不支持某些字符，使用估算
-            text_width = len(date_weather_text) * font_size_title * 0.6
-    else:
-        # 如果没有字体，使用估算（中文字符通常更宽）
-        text_width = len(date_weather_text) * font_size_title * 0.8
-    
-    date_x = int(base_width * 0.08)
-    date_y = int(base_height * 0.08)
-    
-    # 创建日期文字的临时图像以便旋转
-    # 使用更深的颜色和更高的不透明度，确保字体清晰可见
-    date_img = Image.new("RGBA", (int(text_width) + 100, font_size_title + 50), (0, 0, 0, 0))
-    date_draw = ImageDraw.Draw(date_img)
-    # 增强颜色对比度：使用更深的颜色 (60, 60, 80) 和更高的不透明度 (240)
-    try:
-        if font_title is not None:
-            # 尝试使用字体绘制
-            try:
-                date_draw.text((50, 25), date_weather_text, fill=(60, 60, 80, 240), font=font_title)
-            except Exception as e:
-                # 如果字体不支持某些字符，尝试不使用字体
-                date_draw.text((50, 25), date_weather_text, fill=(60, 60, 80, 240))
-        else:
-            # 如果没有字体，直接绘制（PIL会使用默认字体，可能不支持中文）
-            # 如果默认字体不支持中文，至少显示日期数字部分
-            try:
-                date_draw.text((50, 25), date_weather_text, fill=(60, 60, 80, 240))
-            except:
-                # 如果还是失败，使用ASCII格式的日期
-                ascii_date = date_str.replace("年", "-").replace("月", "-").replace("日", "")
-                date_draw.text((50, 25), f"{ascii_date} {weather}", fill=(60, 60, 80, 240))
-    except Exception as e:
-        # 最后的降级方案：只显示日期数字
-        try:
-            ascii_date = date_str.replace("年", "-").replace("月", "-").replace("日", "")
-            date_draw.text((50, 25), ascii_date, fill=(60, 60, 80, 240))
-        except:
-            pass
-    
-    date_img = date_img.rotate(-5, expand=False, fillcolor=(0, 0, 0, 0))
-    base_img.paste(date_img, (date_x, date_y), date_img)
-    
-    # 绘制文字（非线性排版，模拟手写感）
-    if text:
-        lines = text.split('\n')
-        # 文字起始位置（避开图片区域）- 移动端优化
-        text_start_y = base_height // 2
-        if processed_images:
-            # 如果有多张图片，文字放在下方
-            max_img_bottom = max([y + h for _, (x, y, w, h) in zip(processed_images, positions)])
-            text_start_y = max_img_bottom + int(base_height * 0.1)
-        
-        current_y = text_start_y
-        line_spacing = font_size_text * 1.5
-        
-        for i, line in enumerate(lines):
-            if line.strip():
-                # 每行略微不同的x位置（模拟手写）- 移动端优化
-                x_offset = random.randint(-20, 20) if i > 0 else 0
-                text_x = int(base_width * 0.1) + x_offset
-                
-                # 略微旋转（-3到3度）
-                line_angle = random.uniform(-3, 3)
-                
-                # 创建单行文字的临时图像
-                if font_text is not None:
-                    try:
-                        bbox = draw.textbbox((0, 0), line, font=font_text)
-                        line_width = bbox[2] - bbox[0]
-                        line_height = bbox[3] - bbox[1]
-                    except:
-                        line_width = len(line) * font_size_text * 0.6
-                        line_height = font_size_text * 1.2
-                else:
-                    line_width = len(line) * font_size_text * 0.6
-                    line_height = font_size_text * 1.2
-                
-                line_img = Image.new("RGBA", (int(line_width) + 100, int(line_height) + 50), (0, 0, 0, 0))
-                line_draw = ImageDraw.Draw(line_img)
-                # 增强颜色对比度：使用更深的颜色和更高的不透明度，确保字体清晰可见
-                try:
-                    if font_text is not None:
-                        line_draw.text((50, 25), line, fill=(40, 40, 60, 250), font=font_text)
-                    else:
-                        # 如果没有字体，直接绘制（PIL会使用默认字体）
-                        line_draw.text((50, 25), line, fill=(40, 40, 60, 250))
-                except Exception as e:
-                    # 如果绘制失败，尝试不使用字体
-                    try:
-                        line_draw.text((50, 25), line, fill=(40, 40, 60, 250))
-                    except:
-                        # 如果还是失败，跳过这一行
-                        continue
-                line_img = line_img.rotate(line_angle, expand=False, fillcolor=(0, 0, 0, 0))
-                
-                # 粘贴到基图
-                base_img.paste(line_img, (int(text_x), int(current_y)), line_img)
-                
-                current_y += line_spacing + random.randint(-10, 10)  # 随机行间距变化
-    
-    # 如果有雾气层，最后叠加
-    if os.path.exists(fog_path):
-        try:
-            fog = Image.open(fog_path).convert("RGBA")
-            fog = fog.resize((base_width, base_height), Image.Resampling.LANCZOS)
-            fog_alpha = fog.split()[3]
-            fog_alpha = fog_alpha.point(lambda x: min(x, 80))  # 很低的透明度
-            fog.putalpha(fog_alpha)
-            base_img = Image.alpha_composite(base_img, fog)
-        except:
-            pass
-    
-    # 转换回RGB
-    final_img = base_img.convert("RGB")
+    saved_image_paths = [future.result() for future in upload_futures]
+    
+    # 保存生成的手帐图片
+    set_job_stage("storing")
+    journal_image_path, journal_file = store_journal_image(journal_image, journal_id)
+    
+    # 生成展示尺寸副本（列表和手账本视图不再加载原图）
+    renditions = create_journal_renditions(journal_image, journal_image_path, sources)
+    
+    # 保存日记条目
+    journal_entry = {
+        "id": journal_id,
+        "date": date_str,
+        "weather": weather,
+        "text": journal_text,
+        "image_paths": saved_image_paths,
+        "journal_image_path": journal_image_path,
+        "renditions": renditions,
+        "created_at": datetime.now().isoformat()
+    }
+    save_journal(journal_entry)
     
-    return final_img
+    return {
+        "journal_image": journal_image,
+        "journal_file": journal_file,
+        "journal_entry": journal_entry,
+        "date_str": date_str,
+    }
 
 # ==========================================
 # 5. CSS样式
@@ -1361,105 +705,87 @@ if page == "✨ 新建日记":
     with col_center:
         generate_btn = st.button("✨ 制作手账", use_container_width=True)
     
-    # 生成逻辑
+    # 生成逻辑（在后台任务中执行，页面轮询进度）
     if generate_btn:
         if not journal_text and not uploaded_files:
             st.warning("请至少上传一张图片或输入一些文字")
         else:
-            with st.spinner("🌧️ 正在生成你的情绪手帐..."):
-                try:
-                    # 保存图片
-                    saved_image_paths = []
-                    if uploaded_files:
-                        for uploaded_file in uploaded_files:
-                            img_path = save_image(uploaded_file)
-                            saved_image_paths.append(img_path)
-                    
-                    # 生成手帐
-                    date_str = selected_date.strftime("%Y年%m月%d日")
-                    journal_image = create_journal_page(
-                        saved_image_paths,
-                        journal_text,
-                        date_str,
-                        selected_weather
-                    )
-                    
-                    # 保存生成的手帐图片
-                    journal_id = str(uuid.uuid4())
-                    journal_filename = f"journal_{journal_id}.png"
-                    
-                    # 上传到Supabase Storage或保存到本地
-                    if SUPABASE_AVAILABLE:
-                        try:
-                            journal_image_url = upload_image_to_supabase(
-                                journal_image, 
-                                journal_filename, 
-                                folder="journals"
-                            )
-                            if journal_image_url:
-                                journal_image_path = journal_image_url
-                            else:
-                                # 降级到本地
-                                journal_image_path = os.path.join(IMAGES_DIR, journal_filename)
-                                journal_image.save(journal_image_path, "PNG")
-                        except Exception as e:
-                            st.warning(f"⚠️ Supabase上传失败，使用本地存储：{str(e)}")
-                            journal_image_path = os.path.join(IMAGES_DIR, journal_filename)
-                            journal_image.save(journal_image_path, "PNG")
-                    else:
-                        # 本地存储
-                        journal_image_path = os.path.join(IMAGES_DIR, journal_filename)
-                        journal_image.save(journal_image_path, "PNG")
-                    
-                    # 保存日记条目
-                    journal_entry = {
-                        "id": journal_id,
-                        "date": date_str,
-                        "weather": selected_weather,
-                        "text": journal_text,
-                        "image_paths": saved_image_paths,
-                        "journal_image_path": journal_image_path,
-                        "created_at": datetime.now().isoformat()
-                    }
-                    save_journal(journal_entry)
-                    
-                    # 显示结果
-                    st.success("✨ 手帐生成成功！")
-                    st.markdown("### 📖 你的手帐")
-                    # 限制预览图大小，移动端更友好
-                    st.image(journal_image, width=600)
-                    
-                    # 下载按钮
-                    buf = BytesIO()
-                    journal_image.save(buf, format="PNG")
-                    buf.seek(0)
-                    st.download_button(
-                        label="📥 下载手帐",
-                        data=buf,
-                        file_name=f"journal_{date_str}.png",
-                        mime="image/png"
-                    )
-                    
-                    # 清空输入（通过重新运行）
-                    st.balloons()
-                    
-                except Exception as e:
-                    st.error(f"生成失败：{str(e)}")
-                    import traceback
-                    st.code(traceback.format_exc())
+            # 复制上传文件的内容，后台线程不依赖本次rerun的控件对象
+            uploads = [ImageSource.from_file(uploaded_file) for uploaded_file in uploaded_files or []]
+            date_str = selected_date.strftime("%Y年%m月%d日")
+            # 先在渲染服务中占位，渲染队列已满时直接提示，不再提交任务
+            try:
+                ticket = get_render_service().reserve()
+            except RenderServiceBusy as e:
+                st.warning(f"⏳ {e}")
+            else:
+                st.session_state["journal_render_ticket"] = ticket
+                st.session_state["journal_job_id"] = get_job_runner().submit(
+                    generate_journal, uploads, journal_text, date_str, selected_weather, ticket
+                )
+    
+    journal_job_id = st.session_state.get("journal_job_id")
+    if journal_job_id:
+        job = get_job_runner().get(journal_job_id)
+        ticket = st.session_state.get("journal_render_ticket")
+        if job is None:
+            # 任务已过期（例如服务重启）
+            del st.session_state["journal_job_id"]
+            st.session_state.pop("journal_render_ticket", None)
+        elif not job.finished:
+            stage_names = [stage for stage, _ in JOURNAL_JOB_STAGES]
+            stage_labels = dict(JOURNAL_JOB_STAGES)
+            stage_index = stage_names.index(job.stage) if job.stage in stage_names else 0
+            stage_text = stage_labels.get(job.stage, "🌧️ 正在生成你的情绪手帐...")
+            position = ticket.position if ticket is not None else None
+            if position is not None and job.stage in (None, "uploading", "queued"):
+                # 渲染进程都在工作，显示排队位置
+                stage_text = f"⏳ 制作手账的人较多，正在排队（第 {position} 位）..."
+            st.progress((stage_index + 1) / (len(stage_names) + 1), text=stage_text)
+            time.sleep(JOB_POLL_INTERVAL)
+            st.rerun()
+        else:
+            del st.session_state["journal_job_id"]
+            st.session_state.pop("journal_render_ticket", None)
+            get_job_runner().discard(journal_job_id)
+            for level, message in job.messages:
+                getattr(st, level)(message)
+            
+            if job.status == job.FAILED:
+                st.error(f"生成失败：{job.error}")
+                st.code(job.traceback)
+            else:
+                journal_image = job.result["journal_image"]
+                date_str = job.result["date_str"]
+                
+                # 显示结果
+                st.success("✨ 手帐生成成功！")
+                st.markdown("### 📖 你的手帐")
+                # 限制预览图大小，移动端更友好
+                st.image(journal_image, width=600)
+                
+                # 下载按钮（直接使用保存时编码好的文件）
+                journal_file = job.result["journal_file"]
+                st.download_button(
+                    label="📥 下载手帐",
+                    data=journal_file.data,
+                    file_name=f"journal_{date_str}{journal_file.extension}",
+                    mime=journal_file.content_type
+                )
+                
+                # 清空输入（通过重新运行）
+                st.balloons()
 
 elif page == "⚙️ 管理手账":
     st.markdown("<div style='height: 2vh;'></div>", unsafe_allow_html=True)
     st.markdown("### ⚙️ 管理手账")
     
-    journals = load_journals()
+    # 只查询总数（不加载所有条目），具体条目按页加载
+    total_journals = count_journals()
     
-    if not journals:
+    if not total_journals:
         st.info("还没有任何记录，去创建第一篇日记吧！")
     else:
-        # 按日期倒序排列
-        journals.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-        
         # 视图切换
         view_mode = st.radio(
             "📖 视图模式",
@@ -1475,80 +801,35 @@ elif page == "⚙️ 管理手账":
         with col2:
             weather_filter = st.selectbox("🌤️ 筛选天气", ["全部", "☀️ 晴天", "⛅ 多云", "🌧️ 雨天", "❄️ 雪天", "🌫️ 雾天", "🌙 夜晚"])
         
-        # 筛选手账（优先使用Supabase，降级到本地搜索）
-        if SUPABASE_AVAILABLE:
-            try:
-                if search_keyword:
-                    filtered_journals = search_journals_in_supabase(search_keyword)
-                else:
-                    filtered_journals = load_journals_from_supabase()
-                
-                if weather_filter != "全部":
-                    filtered_journals = filter_journals_by_weather(weather_filter)
-                
-                # 转换格式以兼容现有代码
-                for journal in filtered_journals:
-                    if "journal_image_url" in journal:
-                        journal["journal_image_path"] = journal["journal_image_url"]
-            except Exception as e:
-                st.warning(f"⚠️ Supabase搜索失败，使用本地搜索：{str(e)}")
-                # 降级到本地搜索
-                filtered_journals = journals
-                if search_keyword:
-                    filtered_journals = [
-                        j for j in filtered_journals
-                        if search_keyword in j.get("date", "") 
-                        or search_keyword in j.get("weather", "")
-                        or search_keyword in j.get("text", "")
-                    ]
-                if weather_filter != "全部":
-                    filtered_journals = [j for j in filtered_journals if j.get("weather", "") == weather_filter]
-        else:
-            # 本地搜索
-            filtered_journals = journals
-            if search_keyword:
-                filtered_journals = [
-                    j for j in filtered_journals
-                    if search_keyword in j.get("date", "") 
-                    or search_keyword in j.get("weather", "")
-                    or search_keyword in j.get("text", "")
-                ]
-            if weather_filter != "全部":
-                filtered_journals = [j for j in filtered_journals if j.get("weather", "") == weather_filter]
+        # 筛选条件变化时页码重置
+        filter_key = f"filtered_{hash((search_keyword, weather_filter))}"
         
         if view_mode == "📚 手账本视图":
             # 手账本翻页视图（仅查看）
             st.markdown("---")
             
-            # 初始化页码（使用筛选后的列表作为key的一部分，确保筛选变化时重置）
-            if filtered_journals:
-                first_id = str(filtered_journals[0].get('id', ''))
-            else:
-                first_id = ''
-            filter_key = f"filtered_{len(filtered_journals)}_{hash(first_id)}"
+            # 初始化页码（使用筛选条件作为key的一部分，确保筛选变化时重置）
             page_key = f"current_page_{filter_key}"
             
             if page_key not in st.session_state:
                 st.session_state[page_key] = 0
             
-            total_pages = len(filtered_journals)
+            # 每页一篇手账，只加载当前页
+            current_page = max(st.session_state[page_key], 0)
+            page_journals, total_pages = load_journals_page(current_page, 1, search_keyword, weather_filter)
             
             if total_pages == 0:
                 st.info("没有找到匹配的记录")
             else:
-                current_page = st.session_state[page_key]
-                
                 # 确保页码在有效范围内
                 if current_page >= total_pages:
                     current_page = total_pages - 1
-                    st.session_state[page_key] = current_page
-                if current_page < 0:
-                    current_page = 0
-                    st.session_state[page_key] = current_page
+                    page_journals, total_pages = load_journals_page(current_page, 1, search_keyword, weather_filter)
+                st.session_state[page_key] = current_page
                 
                 # 重新读取当前页码（确保使用最新值）
                 current_page = st.session_state[page_key]
-                current_journal = filtered_journals[current_page]
+                current_journal = page_journals[0]
                 
                 st.markdown("---")
                 
@@ -1712,7 +993,7 @@ elif page == "⚙️ 管理手账":
                         # 支持URL和本地路径
                         if journal_img_path.startswith(('http://', 'https://')) or os.path.exists(journal_img_path):
                             st.markdown('<div class="journal-image-wrapper">', unsafe_allow_html=True)
-                            st.image(journal_img_path, width=380)
+                            st.image(page_rendition(current_journal, 380), width=380)
                             st.markdown("</div>", unsafe_allow_html=True)
                         else:
                             st.info("手账图片未找到")
@@ -1786,8 +1067,29 @@ elif page == "⚙️ 管理手账":
                 st.markdown("</div>", unsafe_allow_html=True)
         
         else:
-            # 列表视图（原有功能）
-            st.markdown(f"**共找到 {len(filtered_journals)} 条记录**")
+            # 列表视图（原有功能，按页加载）
+            list_page_key = f"list_page_{filter_key}"
+            list_page = max(int(st.session_state.get(list_page_key, 1)), 1)
+            filtered_journals, total_filtered = load_journals_page(
+                (list_page - 1) * JOURNALS_PER_PAGE, JOURNALS_PER_PAGE, search_keyword, weather_filter
+            )
+            list_pages = max(math.ceil(total_filtered / JOURNALS_PER_PAGE), 1)
+            if list_page > list_pages:
+                list_page = list_pages
+                filtered_journals, total_filtered = load_journals_page(
+                    (list_page - 1) * JOURNALS_PER_PAGE, JOURNALS_PER_PAGE, search_keyword, weather_filter
+                )
+            st.session_state[list_page_key] = list_page
+            
+            st.markdown(f"**共找到 {total_filtered} 条记录**")
+            if list_pages > 1:
+                st.number_input(
+                    f"页码（共 {list_pages} 页）",
+                    min_value=1,
+                    max_value=list_pages,
+                    step=1,
+                    key=list_page_key
+                )
             st.markdown("---")
             
             # 显示手账列表
@@ -1795,7 +1097,6 @@ elif page == "⚙️ 管理手账":
                 journal_id = journal.get("id", "")
                 date_str = journal.get("date", "未知日期")
                 weather = journal.get("weather", "")
-                text = journal.get("text", "")
                 
                 with st.expander(f"📅 {date_str} {weather}", expanded=False):
                     # 操作按钮
@@ -1814,22 +1115,36 @@ elif page == "⚙️ 管理手账":
                             st.session_state[f"delete_journal_{journal_id}"] = True
                     
                     with col_btn4:
+                        # 下载内容按需生成：列表渲染时只用到元数据，不下载/不重新编码图片
                         journal_img_path = journal.get("journal_image_path") or journal.get("journal_image_url")
                         if journal_img_path:
-                            # 支持URL和本地路径
-                            if journal_img_path.startswith(('http://', 'https://')) or os.path.exists(journal_img_path):
-                                buf = BytesIO()
-                                img = load_image_from_path_or_url(journal_img_path)
-                                if img:
-                                    img.save(buf, format="PNG")
-                                    buf.seek(0)
-                                    st.download_button(
-                                        "📥 下载",
-                                        data=buf,
-                                        file_name=f"journal_{date_str}.png",
-                                        mime="image/png",
-                                        key=f"download_{journal_id}"
-                                    )
+                            download_name = journal_download_name(journal_img_path, date_str)
+                            if journal_img_path.startswith(('http://', 'https://')):
+                                # 远程图片：浏览器直接从Storage下载
+                                st.link_button("📥 下载", storage_download_url(journal_img_path, download_name))
+                            elif os.path.exists(journal_img_path):
+                                # 本地图片：点击后才读取文件（原始字节，不重新编码）
+                                # 只在点击后的这一次rerun中读取，之后的rerun恢复为按钮，不再每次读取文件
+                                prepare_key = f"prepare_download_{journal_id}"
+                                if st.session_state.pop(prepare_key, False):
+                                    with open(journal_img_path, "rb") as f:
+                                        st.download_button(
+                                            "📥 保存文件",
+                                            data=f.read(),
+                                            file_name=download_name,
+                                            mime=mimetypes.guess_type(download_name)[0] or "application/octet-stream",
+                                            key=f"download_{journal_id}"
+                                        )
+                                elif st.button("📥 下载", key=f"prepare_{journal_id}"):
+                                    st.session_state[prepare_key] = True
+                                    st.rerun()
+                    
+                    # 查看、编辑或删除时才读取完整条目（文字内容、原始图片等）
+                    text = ""
+                    if any(st.session_state.get(f"{action}_journal_{journal_id}", False)
+                           for action in ("view", "edit", "delete")):
+                        journal = get_journal(journal_id) or journal
+                        text = journal.get("text", "")
                     
                     # 显示详情
                     if st.session_state.get(f"view_journal_{journal_id}", False):
@@ -1838,9 +1153,9 @@ elif page == "⚙️ 管理手账":
                         if journal_img_path:
                             # 支持URL和本地路径
                             if journal_img_path.startswith(('http://', 'https://')):
-                                st.image(journal_img_path, width=600)
+                                st.image(page_rendition(journal, 600), width=600)
                             elif os.path.exists(journal_img_path):
-                                st.image(journal_img_path, width=600)
+                                st.image(page_rendition(journal, 600), width=600)
                         
                         if text:
                             st.markdown(f"**随笔：** {text}")
@@ -1854,7 +1169,7 @@ elif page == "⚙️ 管理手账":
                                 # 支持URL和本地路径
                                 if img_path.startswith(('http://', 'https://')) or os.path.exists(img_path):
                                     with cols[i]:
-                                        st.image(img_path, width=150)
+                                        st.image(image_rendition(journal, img_path, 150), width=150)
                     
                     # 编辑功能
                     if st.session_state.get(f"edit_journal_{journal_id}", False):
@@ -1887,7 +1202,7 @@ elif page == "⚙️ 管理手账":
                                 # 支持URL和本地路径
                                 if img_path.startswith(('http://', 'https://')) or os.path.exists(img_path):
                                     with cols[i]:
-                                        st.image(img_path, width=150)
+                                        st.image(image_rendition(journal, img_path, 150), width=150)
                         
                         col_save, col_cancel = st.columns(2)
                         with col_save:
@@ -1896,49 +1211,42 @@ elif page == "⚙️ 管理手账":
                                     try:
                                         # 重新生成手账
                                         edit_date_str = edit_date.strftime("%Y年%m月%d日")
-                                        new_journal_image = create_journal_page(
+                                        new_journal_image = render_journal_page(
                                             original_images,
                                             edit_text,
                                             edit_date_str,
                                             edit_weather
                                         )
                                         
-                                        # 保存新的手账图片
-                                        journal_filename = f"journal_{journal_id}.png"
+                                        # 保存新的手账图片（覆盖；格式配置变化时扩展名随之变化）
+                                        previous_image_path = journal.get("journal_image_path")
+                                        new_journal_image_path, _ = store_journal_image(new_journal_image, journal_id)
+                                        journal["journal_image_path"] = new_journal_image_path
+                                        journal["journal_image_url"] = new_journal_image_path
                                         
-                                        if SUPABASE_AVAILABLE:
-                                            try:
-                                                # 上传到Supabase Storage（覆盖）
-                                                new_journal_image_url = upload_image_to_supabase(
-                                                    new_journal_image,
-                                                    journal_filename,
-                                                    folder="journals"
-                                                )
-                                                if new_journal_image_url:
-                                                    journal["journal_image_path"] = new_journal_image_url
-                                                    journal["journal_image_url"] = new_journal_image_url
-                                            except Exception as e:
-                                                st.warning(f"⚠️ Supabase上传失败，使用本地存储：{str(e)}")
-                                                journal_image_path = os.path.join(IMAGES_DIR, journal_filename)
-                                                new_journal_image.save(journal_image_path, "PNG")
-                                                journal["journal_image_path"] = journal_image_path
-                                        else:
-                                            # 本地存储
-                                            journal_image_path = os.path.join(IMAGES_DIR, journal_filename)
-                                            new_journal_image.save(journal_image_path, "PNG")
-                                            journal["journal_image_path"] = journal_image_path
+                                        # 重新生成手账图片的副本（原图未变，沿用原有副本）
+                                        journal["renditions"] = dict(
+                                            journal.get("renditions") or {},
+                                            page=create_journal_renditions(
+                                                new_journal_image,
+                                                journal.get("journal_image_path") or journal.get("journal_image_url")
+                                            )["page"]
+                                        )
                                         
                                         # 更新日记条目
                                         update_data = {
                                             "date": edit_date_str,
                                             "weather": edit_weather,
                                             "text": edit_text,
-                                            "journal_image_url": journal.get("journal_image_path") or journal.get("journal_image_url")
+                                            "journal_image_url": journal.get("journal_image_path") or journal.get("journal_image_url"),
+                                            "renditions": journal["renditions"]
                                         }
                                         
                                         if SUPABASE_AVAILABLE:
                                             # 使用Supabase更新
                                             if update_journal_in_supabase(journal_id, update_data):
+                                                # 日记已指向新文件后再删除旧文件（包括Storage中的对象）
+                                                remove_replaced_file(previous_image_path, new_journal_image_path)
                                                 st.success("✨ 手账已更新！")
                                                 st.session_state[f"edit_journal_{journal_id}"] = False
                                                 st.rerun()
@@ -1951,12 +1259,8 @@ elif page == "⚙️ 管理手账":
                                             journal["text"] = edit_text
                                             journal["created_at"] = datetime.now().isoformat()
                                             
-                                            all_journals = load_journals()
-                                            for i, j in enumerate(all_journals):
-                                                if j.get("id") == journal_id:
-                                                    all_journals[i] = journal
-                                                    break
-                                            save_journals(all_journals)
+                                            update_local_journal(journal_id, journal)
+                                            remove_replaced_file(previous_image_path, new_journal_image_path)
                                             st.success("✨ 手账已更新！")
                                             st.session_state[f"edit_journal_{journal_id}"] = False
                                             st.rerun()
@@ -1995,10 +1299,15 @@ elif page == "⚙️ 管理手账":
                                             if os.path.exists(img_path):
                                                 os.remove(img_path)
                                         
+                                        # 删除图片副本
+                                        renditions = journal.get("renditions") or {}
+                                        for image_renditions in [renditions.get("page") or {}, *(renditions.get("images") or {}).values()]:
+                                            for kind, rendition_path in image_renditions.items():
+                                                if kind != "full" and rendition_path and os.path.exists(rendition_path):
+                                                    os.remove(rendition_path)
+                                        
                                         # 从列表中删除
-                                        all_journals = load_journals()
-                                        all_journals = [j for j in all_journals if j.get("id") != journal_id]
-                                        save_journals(all_journals)
+                                        delete_local_journal(journal_id)
                                         
                                         st.success("🗑️ 手账已删除")
                                         st.session_state[f"delete_journal_{journal_id}"] = False
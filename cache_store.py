@@ -0,0 +1,211 @@
+"""
+通用缓存组件
+- LRUCache: 进程内LRU缓存，按总字节数限制容量
+- DiskCache: 磁盘目录缓存，按总字节数限制容量，最久未访问的文件先淘汰
+- TieredCache: 内存 + 磁盘两级缓存，内存淘汰后仍可从磁盘命中
+"""
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+
+class LRUCache:
+    """按总字节数限制容量的线程安全LRU缓存"""
+
+    def __init__(self, max_bytes: int, sizeof: Callable[[Any], int] = len):
+        """
+        Args:
+            max_bytes: 缓存容量上限（字节）
+            sizeof: 计算缓存值大小的函数（默认len，适用于bytes）
+        """
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value, size: Optional[int] = None):
+        """写入缓存，超过容量时淘汰最久未使用的条目；单个值超过容量时不缓存"""
+        if size is None:
+            size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._data:
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None:
+                return default
+            self._bytes -= item[1]
+            return item[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """返回命中/未命中次数和当前占用"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+class DiskCache:
+    """按总字节数限制容量的磁盘缓存（键需为可作文件名的字符串，如哈希值）"""
+
+    def __init__(self, directory: str, max_bytes: int, suffix: str = ".bin"):
+        """
+        Args:
+            directory: 缓存目录
+            max_bytes: 缓存容量上限（字节）
+            suffix: 缓存文件扩展名
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self.path_for(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        # 更新访问时间，用于LRU淘汰
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key: str, data: bytes):
+        """原子写入（先写临时文件再重命名），然后按容量淘汰旧文件"""
+        if len(data) > self.max_bytes:
+            return
+        path = self.path_for(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"写入磁盘缓存失败 ({path}): {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self._evict()
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.path_for(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if not name.endswith(self.suffix):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    continue
+
+
+class TieredCache:
+    """内存LRU + 磁盘两级缓存（值为bytes）"""
+
+    def __init__(self, memory: LRUCache, disk: Optional[DiskCache] = None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self.memory.get(key)
+        if data is not None:
+            return data
+        if self.disk is None:
+            return None
+        data = self.disk.get(key)
+        if data is not None:
+            self.memory.put(key, data)
+        return data
+
+    def put(self, key: str, data: bytes):
+        self.memory.put(key, data)
+        if self.disk is not None:
+            self.disk.put(key, data)
+
+    def delete(self, key: str):
+        self.memory.pop(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+
+def env_megabytes(name: str, default_mb: float) -> int:
+    """从环境变量读取以MB为单位的容量配置，返回字节数"""
+    try:
+        return int(float(os.getenv(name, default_mb)) * 1024 * 1024)
+    except ValueError:
+        return int(default_mb * 1024 * 1024)
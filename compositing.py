@@ -0,0 +1,98 @@
+"""
+数组化的合成工具
+纸张纹理、透明度缩放/截断用 NumPy 整体运算完成，避免逐像素的 Python 循环；
+未安装 NumPy 时退回到等价的 PIL 实现，输出像素一致
+"""
+import random
+
+from PIL import Image, ImageDraw
+
+# NumPy（可选，未安装时使用PIL降级实现）
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+def add_paper_grain(img, count=1000, rng=random):
+    """
+    添加纸张颗粒纹理（随机灰点）
+
+    随机数的抽取顺序与逐点绘制时完全相同，相同种子下输出像素一致。
+
+    Args:
+        img: RGB图片
+        count: 颗粒数量
+        rng: 随机数来源（random模块或random.Random实例）
+
+    Returns:
+        添加纹理后的新RGB图片
+    """
+    width, height = img.size
+    # 随机数仍逐点抽取（每点3次，开销很小）：换成 NumPy 的随机数生成器会改变随机序列，
+    # 同一种子下的排版和已有的渲染缓存都会随之改变；只有写像素的部分数组化
+    samples = []
+    for _ in range(count):
+        x = rng.randint(0, width)
+        y = rng.randint(0, height)
+        gray = rng.randint(240, 250)
+        samples.append((x, y, gray))
+
+    if not NUMPY_AVAILABLE:
+        img = img.copy()
+        draw = ImageDraw.Draw(img)
+        for x, y, gray in samples:
+            draw.point((x, y), fill=(gray, gray - 5, gray - 10))
+        return img
+
+    points = np.array(samples, dtype=np.int64).reshape(-1, 3)
+    # randint包含上界，落在画布外的点与draw.point一样直接丢弃
+    points = points[(points[:, 0] < width) & (points[:, 1] < height)]
+    if len(points) == 0:
+        return img.copy()
+
+    # 同一像素被多次命中时保留最后一次（与逐点绘制的覆盖顺序一致）
+    flat = points[:, 1] * width + points[:, 0]
+    _, last_in_reversed = np.unique(flat[::-1], return_index=True)
+    points = points[len(points) - 1 - last_in_reversed]
+
+    xs, ys, grays = points[:, 0], points[:, 1], points[:, 2]
+    pixels = np.array(img.convert("RGB"), dtype=np.uint8)
+    pixels[ys, xs] = np.stack([grays, grays - 5, grays - 10], axis=1).astype(np.uint8)
+    return Image.fromarray(pixels, "RGB")
+
+
+def scale_alpha(img, factor):
+    """
+    按系数缩放透明度通道（等价于 alpha.point(lambda x: int(x * factor))），原地修改
+
+    Args:
+        img: RGBA图片
+        factor: 缩放系数（0-1）
+    """
+    alpha = img.getchannel("A")
+    if NUMPY_AVAILABLE:
+        lut = (np.arange(256, dtype=np.float64) * factor).astype(np.uint8)
+        alpha = Image.fromarray(lut[np.asarray(alpha)], "L")
+    else:
+        alpha = alpha.point(lambda x: int(x * factor))
+    img.putalpha(alpha)
+    return img
+
+
+def cap_alpha(img, cap):
+    """
+    截断透明度通道上限（等价于 alpha.point(lambda x: min(x, cap))），原地修改
+
+    Args:
+        img: RGBA图片
+        cap: 透明度上限（0-255）
+    """
+    alpha = img.getchannel("A")
+    if NUMPY_AVAILABLE:
+        alpha = Image.fromarray(np.minimum(np.asarray(alpha), np.uint8(cap)), "L")
+    else:
+        alpha = alpha.point(lambda x: min(x, cap))
+    img.putalpha(alpha)
+    return img
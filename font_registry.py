@@ -0,0 +1,217 @@
+"""
+字体注册表
+进程内只解析一次可用的中文字体，并缓存按 (路径, 索引, 字号) 加载的字体对象
+
+Streamlit 每次交互都会重新执行 app.py，但导入的模块只加载一次，
+因此缓存放在这里可以跨 rerun 和会话复用。
+"""
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+from project_paths import project_path
+
+FONTS_DIR = project_path("fonts")
+
+# 用于验证字体能否渲染中文的测试字符串
+TEST_TEXT = "年月日中文"
+
+_lock = threading.Lock()
+_resolved = False
+_resolved_font: Optional[Tuple[str, Optional[int]]] = None
+_font_cache: Dict[Tuple[str, Optional[int], int], ImageFont.FreeTypeFont] = {}
+_default_font = None
+
+
+def get_font_candidates() -> List[str]:
+    """返回候选字体路径列表（优先项目内字体，其次系统字体，已去重）"""
+    font_paths = [
+        # ============================================
+        # 优先：项目内 fonts 文件夹中的字体文件
+        # ============================================
+        os.path.join(FONTS_DIR, "journal_font.ttf"),  # 项目字体（优先）
+        os.path.join(FONTS_DIR, "NotoSansCJK-Regular.ttf"),  # Noto 中文字体
+        os.path.join(FONTS_DIR, "NotoSansCJK-Regular.ttc"),  # Noto 中文字体（TTC格式）
+        os.path.join(FONTS_DIR, "wqy-microhei.ttc"),  # 文泉驿微米黑
+        os.path.join(FONTS_DIR, "wqy-zenhei.ttc"),  # 文泉驿正黑
+        os.path.join(FONTS_DIR, "msyh.ttc"),  # 微软雅黑
+        os.path.join(FONTS_DIR, "simhei.ttf"),  # 黑体
+        os.path.join(FONTS_DIR, "simsun.ttc"),  # 宋体
+        os.path.join(FONTS_DIR, "simkai.ttf"),  # 楷体
+    ]
+
+    # 动态添加 fonts 文件夹中的所有字体文件
+    if os.path.isdir(FONTS_DIR):
+        try:
+            for f in sorted(os.listdir(FONTS_DIR)):
+                font_path = os.path.join(FONTS_DIR, f)
+                if os.path.isfile(font_path) and f.lower().endswith(('.ttf', '.ttc')):
+                    font_paths.append(font_path)
+        except Exception:
+            # 如果读取文件夹失败，继续使用已列出的字体路径
+            pass
+
+    font_paths.extend([
+        # ============================================
+        # 备选：项目内 assets 文件夹中的字体文件
+        # ============================================
+        project_path("assets", "handwriting.ttf"),  # 手写字体（如果支持中文）
+        project_path("assets", "journal_font.ttf"),  # assets 中的字体
+
+        # ============================================
+        # 降级：系统字体路径（云服务器常用）
+        # ============================================
+        # Linux 字体路径（云服务器常用）
+        "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",  # 文泉驿微米黑
+        "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",  # 文泉驿正黑
+        "/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc",  # Noto 中文字体
+        "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",  # Noto 中文字体（OpenType）
+        "/usr/share/fonts/truetype/arphic/uming.ttc",  # AR PL UMing 中文字体
+        "/usr/share/fonts/truetype/arphic/ukai.ttc",  # AR PL UKai 中文字体
+        "/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf",  # Droid Sans Fallback
+        "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",  # Liberation Sans
+
+        # Windows 字体路径
+        "C:/Windows/Fonts/msyh.ttc",  # 微软雅黑（优先，支持中文）
+        "C:/Windows/Fonts/msyhbd.ttc",  # 微软雅黑 Bold
+        "C:/Windows/Fonts/simhei.ttf",  # 黑体
+        "C:/Windows/Fonts/simsun.ttc",  # 宋体
+        "C:/Windows/Fonts/simkai.ttf",  # 楷体
+        "C:/Windows/Fonts/arial.ttf",  # Arial（英文，最后备选）
+
+        # macOS 字体路径
+        "/System/Library/Fonts/PingFang.ttc",  # macOS 中文字体
+        "/System/Library/Fonts/STHeiti Light.ttc",  # macOS 黑体
+        "/System/Library/Fonts/Supplemental/PingFang.ttc",  # macOS PingFang 备选路径
+
+        # 尝试使用系统默认字体目录
+        os.path.expanduser("~/Library/Fonts/PingFang.ttc"),  # macOS 用户字体目录
+        os.path.expanduser("~/.fonts/wqy-microhei.ttc"),  # Linux 用户字体目录
+        os.path.expanduser("~/.local/share/fonts/wqy-microhei.ttc"),  # Linux 用户字体目录（备选）
+    ])
+
+    # 去重（保持顺序）
+    return list(dict.fromkeys(font_paths))
+
+
+def _probe_font(path: str) -> Optional[Tuple[str, Optional[int]]]:
+    """
+    尝试加载字体并测试中文渲染
+
+    Returns:
+        可用的 (路径, 索引)，不可用返回None
+    """
+    # 对于 .ttc 文件依次尝试索引 0、默认索引、1-3
+    if path.lower().endswith('.ttc'):
+        indexes = [0, None, 1, 2, 3]
+    else:
+        indexes = [None]
+
+    for index in indexes:
+        try:
+            if index is None:
+                font = ImageFont.truetype(path, 24)
+            else:
+                font = ImageFont.truetype(path, 24, index=index)
+            test_img = Image.new("RGB", (100, 100), "white")
+            ImageDraw.Draw(test_img).text((0, 0), TEST_TEXT, font=font)
+            return path, index
+        except Exception:
+            continue
+    return None
+
+
+def resolve_cjk_font(force: bool = False) -> Optional[Tuple[str, Optional[int]]]:
+    """
+    解析第一个可用的中文字体（每个进程只解析一次）
+
+    Args:
+        force: 是否忽略已有结果重新解析（例如新增了字体文件）
+
+    Returns:
+        (字体路径, ttc索引)，没有可用字体返回None
+    """
+    global _resolved, _resolved_font
+    if _resolved and not force:
+        return _resolved_font
+
+    with _lock:
+        if _resolved and not force:
+            return _resolved_font
+        resolved_font = None
+        for path in get_font_candidates():
+            if not os.path.exists(path):
+                continue
+            resolved_font = _probe_font(path)
+            if resolved_font:
+                break
+        if resolved_font is None:
+            print("未找到可用的中文字体，将使用PIL默认字体")
+        _resolved_font = resolved_font
+        _font_cache.clear()
+        _resolved = True
+        return _resolved_font
+
+
+def font_fingerprint() -> Optional[List]:
+    """
+    当前使用的中文字体的标识（路径、ttc索引、修改时间、文件大小），用于渲染缓存键：
+    更换字体文件后缓存自动失效
+
+    Returns:
+        [路径, 索引, 修改时间, 大小]，没有可用中文字体返回None
+    """
+    resolved_font = resolve_cjk_font()
+    if resolved_font is None:
+        return None
+    path, index = resolved_font
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return [path, index, None, None]
+    return [path, index, stat.st_mtime, stat.st_size]
+
+
+def get_font(size: int):
+    """
+    获取指定字号的中文字体（按 (路径, 索引, 字号) 缓存）
+
+    Returns:
+        FreeTypeFont对象；没有可用中文字体时返回PIL默认字体，都失败返回None
+    """
+    resolved_font = resolve_cjk_font()
+    if resolved_font is None:
+        return _get_default_font()
+
+    path, index = resolved_font
+    key = (path, index, size)
+    font = _font_cache.get(key)
+    if font is not None:
+        return font
+
+    with _lock:
+        font = _font_cache.get(key)
+        if font is None:
+            try:
+                if index is None:
+                    font = ImageFont.truetype(path, size)
+                else:
+                    font = ImageFont.truetype(path, size, index=index)
+            except Exception as e:
+                print(f"加载字体失败 ({path}): {e}")
+                return _get_default_font()
+            _font_cache[key] = font
+    return font
+
+
+def _get_default_font():
+    """PIL默认字体（可能不支持中文，但至少能显示）"""
+    global _default_font
+    if _default_font is None:
+        try:
+            _default_font = ImageFont.load_default()
+        except Exception:
+            return None
+    return _default_font
@@ -0,0 +1,368 @@
+"""
+命令行批量渲染手账
+不启动 Streamlit，直接调用 journal_renderer 渲染手账页面，多个进程并行渲染，
+用于字体、叠加素材等更换后重新渲染整个存档，或按描述文件批量生成手账图片
+
+用法：
+    # 按 JSONL 描述文件渲染到目录（每行一个日记：id、date、weather、text、images）
+    python generator.py --input journals.jsonl --output-dir data/rendered
+
+    # 重新渲染已有日记并写回存储（Supabase 或本地，同时更新手账图片副本）
+    python generator.py --from-store --write-back --workers 4
+
+默认不读取渲染缓存，每篇日记都重新渲染（结果仍写入缓存）；加 --use-cache 时命中缓存的日记直接使用缓存结果
+
+可以从任意目录运行：--input、--output-dir 和描述文件中的相对图片路径按当前目录解析，
+之后切换到项目根目录（存储中日记条目的本地图片路径相对于项目根目录，见 project_paths）
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from font_registry import resolve_cjk_font
+from image_cache import image_cache_stats
+from image_encoding import encode_image
+from jobs import Job, job_context
+from journal_query import JOURNAL_DATE_FORMAT
+from journal_renderer import bg_path, create_journal_page, fog_path
+from project_paths import project_path, use_project_root
+from render_cache import render_cache_stats
+from renditions import create_renditions
+
+# 支持从.env文件加载环境变量（ARK_API_KEY、Supabase配置等）
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+# 从存储读取日记时每次查询的条数
+STORE_PAGE_SIZE = 100
+DEFAULT_OUTPUT_DIR = project_path("data", "rendered")
+
+
+class RenderResult:
+    """单个日记的渲染结果（由工作进程返回）"""
+
+    def __init__(self, index: int, journal_id: Optional[str], encoded=None, rendition_files=None,
+                 renditions=None, messages=None, render_seconds: float = 0.0, error: Optional[str] = None):
+        self.index = index
+        # 工作进程的缓存统计（进程启动以来的累计值，主进程按进程取最新一份汇总）
+        self.worker = os.getpid()
+        self.cache_stats = {"image": image_cache_stats(), "render": render_cache_stats()}
+        self.journal_id = journal_id
+        self.encoded = encoded
+        # 手账图片副本：{文件名: 编码后的字节}，renditions 为 {副本名称: 文件名}
+        self.rendition_files = rendition_files or {}
+        self.renditions = renditions or {}
+        self.messages = messages or []
+        self.render_seconds = render_seconds
+        self.error = error
+
+    @property
+    def label(self) -> str:
+        return self.journal_id or f"#{self.index + 1}"
+
+
+def _init_worker():
+    # 每个工作进程启动时解析一次中文字体
+    resolve_cjk_font()
+
+
+def render_spec(index: int, spec: Dict, use_ai: bool = True, with_renditions: bool = False,
+                use_cache: bool = False) -> RenderResult:
+    """
+    在工作进程中渲染并编码一个日记（提示信息记录到结果上，由主进程统一输出）
+
+    Args:
+        index: 日记在输入中的序号
+        spec: 日记描述（id、date、weather、text、images，可选 seed）
+        use_ai: 是否使用AI背景
+        with_renditions: 是否同时生成手账图片副本
+        use_cache: 是否读取渲染缓存
+    """
+    journal_id = spec.get("id")
+    job = Job(journal_id or f"batch-{index}")
+    with job_context(job):
+        start = time.perf_counter()
+        try:
+            image = create_journal_page(
+                spec.get("images") or [],
+                spec.get("text") or "",
+                spec.get("date") or datetime.now().strftime(JOURNAL_DATE_FORMAT),
+                spec.get("weather") or "",
+                use_ai=use_ai,
+                seed=spec.get("seed"),
+                use_cache=use_cache
+            )
+            render_seconds = time.perf_counter() - start
+            encoded = encode_image(image, log=False)
+
+            rendition_files = {}
+            renditions = {}
+            if with_renditions:
+                def collect(data, filename):
+                    rendition_files[filename] = data
+                    return filename
+                location = f"journal_{journal_id or index}{encoded.extension}"
+                renditions = create_renditions(image, location, collect)
+        except Exception as e:
+            return RenderResult(index, journal_id, messages=job.messages, error=str(e))
+    return RenderResult(index, journal_id, encoded, rendition_files, renditions, job.messages, render_seconds)
+
+
+def read_specs(path: str) -> List[Dict]:
+    """读取 JSONL 描述文件（空行跳过，无法解析的行打印后跳过；相对图片路径按当前目录转换为绝对路径）"""
+    specs = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                spec = json.loads(line)
+            except ValueError as e:
+                print(f"解析第 {line_number} 行失败: {e}")
+                continue
+            # 兼容日记条目格式（image_paths）
+            if "images" not in spec:
+                spec["images"] = spec.get("image_paths") or []
+            spec["images"] = [
+                image if image.startswith(("http://", "https://")) else os.path.abspath(image)
+                for image in spec["images"]
+            ]
+            specs.append(spec)
+    return specs
+
+
+def store_specs(keyword: Optional[str] = None, weather: Optional[str] = None,
+                limit: Optional[int] = None) -> Tuple[Iterator[Dict], int]:
+    """
+    从存储中分页读取日记（按创建时间正序）
+
+    Returns:
+        (日记描述的迭代器, 总数)；描述中的 journal 为完整的日记条目，用于写回
+    """
+    from journal_store import query_journals
+
+    _, total = query_journals(keyword=keyword, weather=weather, sort="created_at_asc", limit=1)
+    if limit is not None:
+        total = min(total, limit)
+
+    def iterate():
+        offset = 0
+        while offset < total:
+            journals, _ = query_journals(
+                keyword=keyword, weather=weather, sort="created_at_asc",
+                offset=offset, limit=min(STORE_PAGE_SIZE, total - offset)
+            )
+            if not journals:
+                return
+            for journal in journals:
+                yield {
+                    "id": journal.get("id"),
+                    "date": journal.get("date"),
+                    "weather": journal.get("weather"),
+                    "text": journal.get("text"),
+                    "images": journal.get("image_paths") or [],
+                    "journal": journal,
+                }
+            offset += len(journals)
+
+    return iterate(), total
+
+
+def write_to_dir(result: RenderResult, output_dir: str) -> str:
+    """把手账图片写入输出目录，返回文件路径"""
+    path = os.path.join(output_dir, f"journal_{result.journal_id or result.index + 1}{result.encoded.extension}")
+    with open(path, "wb") as f:
+        f.write(result.encoded.data)
+    return path
+
+
+def write_back(result: RenderResult, journal: Dict) -> Optional[str]:
+    """
+    保存手账图片和副本并更新日记条目（与页面上编辑后重新生成的处理一致）
+
+    Returns:
+        新的存储位置，更新失败返回None
+    """
+    from journal_store import remove_replaced_file, store_journal_file, store_rendition, update_journal_page
+
+    previous_image_path = journal.get("journal_image_path") or journal.get("journal_image_url")
+    journal_image_path = store_journal_file(result.encoded, result.journal_id)
+
+    page = {"full": journal_image_path}
+    for kind, filename in result.renditions.items():
+        if kind == "full":
+            continue
+        stored = store_rendition(result.rendition_files[filename], filename)
+        if stored:
+            page[kind] = stored
+    renditions = dict(journal.get("renditions") or {}, page=page)
+
+    if not update_journal_page(journal, journal_image_path, renditions):
+        return None
+    # 日记已指向新文件后再删除旧文件
+    remove_replaced_file(previous_image_path, journal_image_path)
+    return journal_image_path
+
+
+def summarize_cache_stats(worker_stats: Dict[int, Dict]) -> str:
+    """汇总各工作进程的图片缓存和渲染缓存统计"""
+    totals = {"image": {}, "render": {}}
+    for stats in worker_stats.values():
+        for cache, values in stats.items():
+            for name, value in values.items():
+                totals[cache][name] = totals[cache].get(name, 0) + value
+    image, render = totals["image"], totals["render"]
+    lookups = render.get("page_hits", 0) + render.get("page_misses", 0)
+    render_text = f"命中 {render.get('page_hits', 0)}/{lookups}" if lookups else "未读取"
+    return (f"缓存：渲染缓存{render_text}；图片缓存 直接命中 {image.get('fresh_hits', 0)}，"
+            f"重新验证 {image.get('revalidated', 0)}，读取 {image.get('fetches', 0)}")
+
+
+def run_batch(specs, total: int, workers: int, use_ai: bool = True, output_dir: Optional[str] = None,
+              writeback: bool = False, use_cache: bool = False) -> Tuple[int, int]:
+    """
+    在进程池中渲染，主进程负责写入结果并输出进度
+
+    同时提交的任务数限制为工作进程数的2倍，结果图片及时写出，内存占用不随日记数量增长
+
+    Returns:
+        (成功数, 失败数)
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    done = succeeded = failed = 0
+    total_bytes = 0
+    render_seconds = 0.0
+    worker_stats = {}
+    start = time.perf_counter()
+
+    # 使用 spawn 启动工作进程：主进程中已有数据库连接和线程池，fork 后在子进程中不可用
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as executor:
+        pending = {}
+        spec_iter = enumerate(specs)
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < workers * 2:
+                try:
+                    index, spec = next(spec_iter)
+                except StopIteration:
+                    exhausted = True
+                    break
+                worker_spec = {key: value for key, value in spec.items() if key != "journal"}
+                future = executor.submit(render_spec, index, worker_spec, use_ai, writeback, use_cache)
+                pending[future] = spec
+            if not pending:
+                break
+
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                spec = pending.pop(future)
+                done += 1
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # 工作进程异常退出等
+                    failed += 1
+                    print(f"[{done}/{total}] {spec.get('id') or '?'} 渲染失败: {e}")
+                    continue
+                worker_stats[result.worker] = result.cache_stats
+                for level, message in result.messages:
+                    print(f"    [{level}] {message}")
+                if result.error is not None:
+                    failed += 1
+                    print(f"[{done}/{total}] {result.label} 渲染失败: {result.error}")
+                    continue
+
+                try:
+                    if writeback:
+                        destination = write_back(result, spec["journal"])
+                        if destination is None:
+                            raise RuntimeError("更新日记条目失败")
+                    else:
+                        destination = write_to_dir(result, output_dir)
+                except Exception as e:
+                    failed += 1
+                    print(f"[{done}/{total}] {result.label} 保存失败: {e}")
+                    continue
+
+                succeeded += 1
+                total_bytes += result.encoded.size
+                render_seconds += result.render_seconds
+                elapsed = time.perf_counter() - start
+                print(f"[{done}/{total}] {result.label} -> {destination} "
+                      f"(渲染 {result.render_seconds:.2f}s, {result.encoded.report()}; "
+                      f"{done / elapsed:.2f} 页/s)")
+
+    elapsed = time.perf_counter() - start
+    print(f"完成：成功 {succeeded}，失败 {failed}，用时 {elapsed:.1f}s，"
+          f"吞吐 {done / elapsed if elapsed else 0:.2f} 页/s，"
+          f"平均渲染 {render_seconds / succeeded if succeeded else 0:.2f}s/页，"
+          f"共 {total_bytes / 1024 / 1024:.1f} MB（{workers} 个进程）")
+    print(summarize_cache_stats(worker_stats))
+    return succeeded, failed
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="批量渲染手账页面")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="JSONL 描述文件，每行一个日记（id、date、weather、text、images、seed）")
+    source.add_argument("--from-store", action="store_true", help="重新渲染存储中的已有日记")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help=f"输出目录（默认 {DEFAULT_OUTPUT_DIR}）")
+    parser.add_argument("--write-back", action="store_true",
+                        help="把结果写回存储并更新日记条目（需要 --from-store）")
+    parser.add_argument("--keyword", help="只渲染匹配关键词的日记（--from-store）")
+    parser.add_argument("--weather", help="只渲染指定天气的日记（--from-store）")
+    parser.add_argument("--limit", type=int, help="最多渲染的日记数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="工作进程数（默认CPU核数）")
+    parser.add_argument("--no-ai", action="store_true", help="不使用AI背景")
+    parser.add_argument("--use-cache", action="store_true",
+                        help="读取渲染缓存（默认不读取，字体、素材或渲染逻辑更换后需要重新渲染）")
+    args = parser.parse_args(argv)
+
+    if args.write_back and not args.from_store:
+        parser.error("--write-back 需要 --from-store")
+
+    # 命令行中的路径按当前目录解析，之后切换到项目根目录
+    output_dir = os.path.abspath(args.output_dir)
+    if not args.from_store:
+        specs = read_specs(args.input)
+        if args.limit is not None:
+            specs = specs[:args.limit]
+        total = len(specs)
+    use_project_root()
+    if args.from_store:
+        specs, total = store_specs(args.keyword, args.weather, args.limit)
+    if total == 0:
+        print("没有需要渲染的日记")
+        return 0
+
+    missing = [path for path in (bg_path, fog_path) if not os.path.exists(path)]
+    if missing:
+        print(f"⚠️ 未找到氛围素材，渲染结果将不含雨景/雾气叠加: {', '.join(missing)}")
+
+    workers = max(1, min(args.workers, total))
+    print(f"开始渲染 {total} 篇日记（{workers} 个进程）")
+    _, failed = run_batch(
+        specs, total, workers,
+        use_ai=not args.no_ai,
+        output_dir=None if args.write_back else output_dir,
+        writeback=args.write_back,
+        use_cache=args.use_cache
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
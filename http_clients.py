@@ -0,0 +1,63 @@
+"""
+进程级共享的网络客户端
+- 火山方舟 Ark 客户端：按 (base_url, api_key) 懒加载并复用（内部的HTTP连接池随之复用）
+- requests.Session：开启keep-alive和连接池，用于下载AI生成图和Supabase中的图片
+
+Streamlit rerun 不会重新导入本模块，因此客户端在多次rerun和多个会话间共享。
+"""
+import os
+import threading
+from typing import Dict, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+ARK_BASE_URL = "https://ark.cn-beijing.volces.com/api/v3"
+
+try:
+    HTTP_POOL_SIZE = max(1, int(os.getenv("HTTP_POOL_SIZE", "16")))
+except ValueError:
+    HTTP_POOL_SIZE = 16
+
+_lock = threading.Lock()
+_session = None
+_ark_clients: Dict[Tuple[str, str], object] = {}
+
+
+def get_http_session() -> requests.Session:
+    """获取共享的 requests.Session（带连接池）"""
+    global _session
+    if _session is not None:
+        return _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+
+def get_ark_client(api_key: str, base_url: str = ARK_BASE_URL):
+    """
+    获取共享的 Ark 客户端（首次调用时创建）
+
+    Args:
+        api_key: ARK_API_KEY
+        base_url: 方舟接口地址
+
+    Raises:
+        ImportError: 未安装 volcengine-python-sdk[ark]
+    """
+    key = (base_url, api_key)
+    client = _ark_clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _ark_clients.get(key)
+        if client is None:
+            from volcenginesdkarkruntime import Ark
+            client = Ark(base_url=base_url, api_key=api_key)
+            _ark_clients[key] = client
+    return client
@@ -0,0 +1,148 @@
+"""
+图片缓存
+按 本地路径/URL 缓存图片的原始字节，按总字节数LRU淘汰；
+只缓存压缩后的字节，不在这里解码：需要小图的调用方可以用 JPEG draft 按目标尺寸解码（见 ImageSource.open_reduced），
+缓存占用也只是文件大小，而不是解码后的整幅像素
+- 本地文件以 mtime 校验，文件修改后自动失效
+- 远程URL在 IMAGE_CACHE_FRESH_SECONDS 内直接命中，超时后带 ETag / Last-Modified 条件请求重新验证，
+  服务器返回 304 时继续使用缓存
+"""
+import os
+import threading
+import time
+from io import BytesIO
+from typing import Optional, Tuple
+
+from PIL import Image
+
+from cache_store import LRUCache, env_megabytes
+from http_clients import get_http_session
+
+try:
+    IMAGE_CACHE_FRESH_SECONDS = float(os.getenv("IMAGE_CACHE_FRESH_SECONDS", "300"))
+except ValueError:
+    IMAGE_CACHE_FRESH_SECONDS = 300.0
+
+
+class CachedImage:
+    """缓存条目：原始字节 + 图片尺寸（只读取文件头） + 校验信息"""
+
+    def __init__(self, data: bytes, size: Tuple[int, int], mtime: Optional[float] = None,
+                 etag: Optional[str] = None, last_modified: Optional[str] = None):
+        self.data = data
+        self.size = size
+        self.mtime = mtime
+        self.etag = etag
+        self.last_modified = last_modified
+        self.checked_at = time.time()
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data)
+
+
+def is_url(path_or_url: str) -> bool:
+    return path_or_url.startswith(('http://', 'https://'))
+
+
+_cache = LRUCache(env_megabytes("IMAGE_CACHE_MB", 128), sizeof=lambda entry: entry.nbytes)
+# 按有效性校验结果统计（与LRU自身按键统计的 hits/misses 不同）：
+#   fresh_hits: 无需请求直接使用缓存（本地文件未修改，或远程图片仍在有效期内）
+#   revalidated: 远程图片条件请求返回304，继续使用缓存
+#   fetches: 重新读取文件或下载
+# 缓存在流水线线程池中并发访问，计数在锁内更新
+_stats_lock = threading.Lock()
+_stats = {"fresh_hits": 0, "revalidated": 0, "fetches": 0}
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _image_size(data: bytes) -> Tuple[int, int]:
+    """只解析文件头得到尺寸（同时确认是可识别的图片，无法识别时抛出异常，不写入缓存）"""
+    with Image.open(BytesIO(data)) as img:
+        return img.size
+
+
+def _load_local(path: str) -> Optional[CachedImage]:
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        _cache.pop(path)
+        return None
+
+    entry = _cache.get(path)
+    if entry is not None and entry.mtime == mtime:
+        _count("fresh_hits")
+        return entry
+
+    _count("fetches")
+    with open(path, "rb") as f:
+        data = f.read()
+    entry = CachedImage(data, _image_size(data), mtime=mtime)
+    _cache.put(path, entry)
+    return entry
+
+
+def _load_remote(url: str) -> Optional[CachedImage]:
+    entry = _cache.get(url)
+    if entry is not None and time.time() - entry.checked_at < IMAGE_CACHE_FRESH_SECONDS:
+        _count("fresh_hits")
+        return entry
+
+    headers = {}
+    if entry is not None:
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+
+    response = get_http_session().get(url, headers=headers, timeout=30)
+    if entry is not None and response.status_code == 304:
+        entry.checked_at = time.time()
+        _count("revalidated")
+        return entry
+    _count("fetches")
+    if response.status_code != 200:
+        _cache.pop(url)
+        return None
+
+    data = response.content
+    entry = CachedImage(
+        data,
+        _image_size(data),
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+    )
+    _cache.put(url, entry)
+    return entry
+
+
+def load_cached_image(path_or_url: str) -> Optional[CachedImage]:
+    """
+    读取图片（带缓存）
+
+    Returns:
+        CachedImage，失败返回None
+    """
+    try:
+        if is_url(path_or_url):
+            return _load_remote(path_or_url)
+        return _load_local(path_or_url)
+    except Exception as e:
+        print(f"加载图片失败 ({path_or_url}): {e}")
+        return None
+
+
+def image_cache_stats():
+    """LRU的命中/未命中次数和当前占用，以及有效性校验的统计（fresh_hits / revalidated / fetches）"""
+    stats = _cache.stats()
+    with _stats_lock:
+        stats.update(_stats)
+    return stats
+
+
+def clear_image_cache():
+    _cache.clear()
@@ -0,0 +1,121 @@
+"""
+图片编码
+手账图片保存和上传前统一在这里编码：格式、质量、压缩级别按部署环境配置，
+返回的结果带有正确的扩展名和 content-type，并记录每次编码的大小和耗时
+
+环境变量：
+    JOURNAL_IMAGE_FORMAT: png / webp / jpeg（默认png）
+    JOURNAL_IMAGE_QUALITY: WebP/JPEG 质量 1-100（默认85）
+    JOURNAL_IMAGE_COMPRESS_LEVEL: PNG 压缩级别 0-9（默认6）
+"""
+import mimetypes
+import os
+import threading
+import time
+from io import BytesIO
+from typing import Dict, Optional
+
+from PIL import Image
+
+# 格式 -> (扩展名, content-type)
+FORMATS = {
+    "PNG": (".png", "image/png"),
+    "WEBP": (".webp", "image/webp"),
+    "JPEG": (".jpg", "image/jpeg"),
+}
+_ALIASES = {"JPG": "JPEG"}
+
+# 部分系统的 mimetypes 不认识 .webp（下载按钮按扩展名推断类型）
+mimetypes.add_type("image/webp", ".webp")
+
+
+def normalize_format(fmt: Optional[str], default: str = "PNG") -> str:
+    """规范化格式名（大小写、jpg别名），不支持的格式返回默认格式"""
+    fmt = (fmt or default).strip().upper()
+    fmt = _ALIASES.get(fmt, fmt)
+    return fmt if fmt in FORMATS else default
+
+
+def _env_int(name: str, default: int, low: int, high: int) -> int:
+    try:
+        return min(high, max(low, int(os.getenv(name, str(default)))))
+    except ValueError:
+        return default
+
+
+JOURNAL_IMAGE_FORMAT = normalize_format(os.getenv("JOURNAL_IMAGE_FORMAT"))
+JOURNAL_IMAGE_QUALITY = _env_int("JOURNAL_IMAGE_QUALITY", 85, 1, 100)
+JOURNAL_IMAGE_COMPRESS_LEVEL = _env_int("JOURNAL_IMAGE_COMPRESS_LEVEL", 6, 0, 9)
+
+
+class EncodedImage:
+    """编码结果"""
+
+    def __init__(self, data: bytes, fmt: str, width: int, height: int, seconds: float):
+        self.data = data
+        self.format = fmt
+        self.extension, self.content_type = FORMATS[fmt]
+        self.width = width
+        self.height = height
+        self.seconds = seconds
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    def report(self) -> str:
+        """大小和耗时（用于日志）"""
+        return (f"{self.format} {self.width}x{self.height}: "
+                f"{self.size / 1024:.0f} KB, {self.seconds * 1000:.0f} ms")
+
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, Dict[str, float]] = {}
+
+
+def encode_image(image: Image.Image, fmt: Optional[str] = None, quality: Optional[int] = None,
+                 compress_level: Optional[int] = None, log: bool = True) -> EncodedImage:
+    """
+    按配置编码图片
+
+    Args:
+        image: PIL图片
+        fmt: 格式（默认 JOURNAL_IMAGE_FORMAT）
+        quality: WebP/JPEG 质量（默认 JOURNAL_IMAGE_QUALITY）
+        compress_level: PNG 压缩级别（默认 JOURNAL_IMAGE_COMPRESS_LEVEL）
+        log: 是否打印大小和耗时
+    """
+    fmt = normalize_format(fmt, JOURNAL_IMAGE_FORMAT)
+    quality = JOURNAL_IMAGE_QUALITY if quality is None else quality
+    compress_level = JOURNAL_IMAGE_COMPRESS_LEVEL if compress_level is None else compress_level
+
+    start = time.perf_counter()
+    if fmt == "JPEG" and image.mode != "RGB":
+        # JPEG 不支持透明度
+        image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGBA")
+
+    buffer = BytesIO()
+    if fmt == "PNG":
+        image.save(buffer, format="PNG", optimize=compress_level >= 9, compress_level=compress_level)
+    elif fmt == "WEBP":
+        image.save(buffer, format="WEBP", quality=quality, method=4)
+    else:
+        image.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+    encoded = EncodedImage(buffer.getvalue(), fmt, image.width, image.height, time.perf_counter() - start)
+
+    with _stats_lock:
+        stats = _stats.setdefault(fmt, {"count": 0, "bytes": 0, "seconds": 0.0})
+        stats["count"] += 1
+        stats["bytes"] += encoded.size
+        stats["seconds"] += encoded.seconds
+    if log:
+        print(f"图片编码 {encoded.report()}")
+    return encoded
+
+
+def encoding_stats() -> Dict[str, Dict[str, float]]:
+    """按格式统计的编码次数、总字节数和总耗时"""
+    with _stats_lock:
+        return {fmt: dict(stats) for fmt, stats in _stats.items()}
@@ -0,0 +1,151 @@
+"""
+图片来源抽象
+统一表示 bytes、文件对象、本地路径、URL 形式的图片：
+原始字节只读取一次，随对象在生成流程中传递，
+刚上传的图片直接使用内存中的字节，不会再从网络下载回来；
+路径和URL经过 image_cache 读取原始字节，重复访问同一张图片时直接命中缓存，解码在需要时按目标尺寸进行
+"""
+import hashlib
+import os
+from io import BytesIO
+from typing import Optional, Tuple
+
+from PIL import Image
+
+from image_cache import load_cached_image
+
+
+def _reduce_to(img: Image.Image, min_size: int) -> Image.Image:
+    """按整数倍缩小，缩小后短边仍不小于 min_size（不足2倍时返回副本）"""
+    factor = min(img.width, img.height) // max(1, min_size)
+    if factor >= 2:
+        return img.reduce(factor)
+    return img.copy()
+
+
+class ImageSource:
+    """
+    一张图片的来源
+
+    Attributes:
+        location: 图片的存储位置（本地路径或URL），上传完成后可更新
+        name: 原始文件名（用于确定扩展名）
+    """
+
+    def __init__(self, data: Optional[bytes] = None, location: Optional[str] = None,
+                 name: Optional[str] = None):
+        self._data = data
+        self._image = None
+        self._digest = None
+        self._size = None
+        self.location = location
+        self.name = name or (os.path.basename(location) if location else None)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, name: Optional[str] = None, location: Optional[str] = None):
+        return cls(data=bytes(data), location=location, name=name)
+
+    @classmethod
+    def from_file(cls, fileobj, name: Optional[str] = None):
+        """从文件对象（如 Streamlit 的 UploadedFile）读取"""
+        if hasattr(fileobj, "getvalue"):
+            data = fileobj.getvalue()
+        else:
+            data = fileobj.read()
+        return cls(data=bytes(data), name=name or getattr(fileobj, "name", None))
+
+    @classmethod
+    def from_location(cls, path_or_url: str):
+        """本地路径或URL（首次使用时才读取）"""
+        return cls(location=path_or_url)
+
+    @classmethod
+    def coerce(cls, value):
+        """把 ImageSource / bytes / 文件对象 / 路径或URL 统一转换为 ImageSource"""
+        if isinstance(value, ImageSource):
+            return value
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return cls.from_bytes(value)
+        if isinstance(value, str):
+            return cls.from_location(value)
+        return cls.from_file(value)
+
+    def read_bytes(self) -> Optional[bytes]:
+        """原始字节（从路径或URL加载的只读取一次，并经过图片缓存），失败返回None"""
+        if self._data is None and self.location:
+            entry = load_cached_image(self.location)
+            if entry is not None:
+                self._data = entry.data
+                self._size = entry.size
+        return self._data
+
+    def open(self) -> Optional[Image.Image]:
+        """解码后的图片（只解码一次，调用方不要原地修改），失败返回None"""
+        if self._image is not None:
+            return self._image
+        data = self.read_bytes()
+        if data is None:
+            return None
+        try:
+            img = Image.open(BytesIO(data))
+            img.load()
+        except Exception as e:
+            print(f"解码图片失败 ({self.location or self.name}): {e}")
+            return None
+        self._image = img
+        return img
+
+    def open_reduced(self, min_size: int) -> Optional[Image.Image]:
+        """
+        解码为接近目标尺寸的图片（短边不小于 min_size），用于只需要小图的场景
+        JPEG 用 draft 模式在解码时直接按 1/2、1/4、1/8 缩小，其他格式解码后用 reduce 整数倍缩小；
+        已通过 open() 完整解码过的图片直接缩小。结果不缓存，调用方可以原地修改；失败返回None
+        """
+        if self._image is not None:
+            return _reduce_to(self._image, min_size)
+        data = self.read_bytes()
+        if data is None:
+            return None
+        try:
+            img = Image.open(BytesIO(data))
+            self._size = img.size
+            if img.format == "JPEG":
+                img.draft(img.mode, (min_size, min_size))
+            img.load()
+        except Exception as e:
+            print(f"解码图片失败 ({self.location or self.name}): {e}")
+            return None
+        return _reduce_to(img, min_size)
+
+    def size(self) -> Optional[Tuple[int, int]]:
+        """原图尺寸（只读取文件头，不解码像素），失败返回None"""
+        if self._size is None:
+            if self._image is not None:
+                self._size = self._image.size
+            else:
+                data = self.read_bytes()
+                if self._size is None and data is not None:
+                    try:
+                        with Image.open(BytesIO(data)) as img:
+                            self._size = img.size
+                    except Exception:
+                        return None
+        return self._size
+
+    def digest(self) -> Optional[str]:
+        """原始字节的 SHA-256，读取失败返回None"""
+        if self._digest is None:
+            data = self.read_bytes()
+            if data is None:
+                return None
+            self._digest = hashlib.sha256(data).hexdigest()
+        return self._digest
+
+    def __getstate__(self):
+        # 解码后的图片可以从字节重建，序列化时不携带
+        state = self.__dict__.copy()
+        state["_image"] = None
+        return state
+
+    def __repr__(self):
+        return f"ImageSource(location={self.location!r}, name={self.name!r})"
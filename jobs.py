@@ -0,0 +1,250 @@
+"""
+后台任务执行器
+手账生成（上传、AI生图、合成、保存）在线程池中执行，提交后立即返回任务ID，
+页面通过任务ID轮询进度和结果，不再阻塞Streamlit脚本线程
+
+后台线程不能直接调用 st.* 显示提示，运行中的任务会绑定到当前线程，
+提示信息通过 current_job() 记录到任务上，由页面轮询时统一显示；
+不在任务中时交给 configure_feedback 设置的处理函数（页面上为 st.*，命令行下默认打印）
+"""
+import contextlib
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 已结束的任务保留时长（秒），超时后清理，避免结果图片长期占用内存
+JOB_RESULT_TTL = 600
+
+try:
+    JOURNAL_JOB_WORKERS = max(1, int(os.getenv("JOURNAL_JOB_WORKERS", "4")))
+except ValueError:
+    JOURNAL_JOB_WORKERS = 4
+
+# 任务内部并发子步骤（上传、AI生图、图片预处理）使用的线程数
+try:
+    PIPELINE_WORKERS = max(2, int(os.getenv("PIPELINE_WORKERS", "8")))
+except ValueError:
+    PIPELINE_WORKERS = 8
+
+_local = threading.local()
+
+# 不在任务中时显示提示 / 加载动画的函数（见 configure_feedback）
+_message_handler: Optional[Callable[[str, str], None]] = None
+_spinner_factory: Optional[Callable[[str], Any]] = None
+
+
+class Job:
+    """单个后台任务的状态"""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, job_id: str):
+        self.id = job_id
+        self.status = Job.PENDING
+        self.stage: Optional[str] = None
+        self.messages: List[Tuple[str, str]] = []
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.traceback: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (Job.DONE, Job.FAILED)
+
+    def set_stage(self, stage: str):
+        self.stage = stage
+
+    def notify(self, level: str, message: str):
+        """记录一条提示（level 对应 st.info / st.warning / st.error / st.success）"""
+        with self._lock:
+            self.messages.append((level, message))
+
+
+class JobRunner:
+    """基于线程池的后台任务执行器"""
+
+    def __init__(self, max_workers: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="journal-job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> str:
+        """
+        提交任务，立即返回任务ID
+
+        Args:
+            fn: 任务函数，在后台线程中以 fn(*args, **kwargs) 调用，返回值作为任务结果
+        """
+        self._cleanup()
+        job = Job(str(uuid.uuid4()))
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def discard(self, job_id: str):
+        """结果已取走后移除任务"""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def _run(self, job: Job, fn: Callable, args, kwargs):
+        _local.job = job
+        job.status = Job.RUNNING
+        try:
+            job.result = fn(*args, **kwargs)
+            job.status = Job.DONE
+        except Exception as e:
+            job.error = str(e)
+            job.traceback = traceback.format_exc()
+            job.status = Job.FAILED
+        finally:
+            job.finished_at = time.time()
+            _local.job = None
+
+    def _cleanup(self):
+        now = time.time()
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished_at is not None and now - job.finished_at > JOB_RESULT_TTL
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+
+_runner: Optional[JobRunner] = None
+_pipeline_executor: Optional[ThreadPoolExecutor] = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> JobRunner:
+    """获取进程级共享的任务执行器"""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = JobRunner(JOURNAL_JOB_WORKERS)
+    return _runner
+
+
+def current_job() -> Optional[Job]:
+    """当前线程正在执行的任务（不在后台任务中时返回None）"""
+    return getattr(_local, "job", None)
+
+
+def set_job_stage(stage: str):
+    """更新当前任务的进度阶段（不在后台任务中时忽略）"""
+    job = current_job()
+    if job is not None:
+        job.set_stage(stage)
+
+
+def get_pipeline_executor() -> ThreadPoolExecutor:
+    """
+    获取任务内部子步骤使用的线程池
+    只提交不会再等待其他子步骤的叶子任务，避免线程池内相互等待造成死锁
+    """
+    global _pipeline_executor
+    if _pipeline_executor is None:
+        with _runner_lock:
+            if _pipeline_executor is None:
+                _pipeline_executor = ThreadPoolExecutor(
+                    max_workers=PIPELINE_WORKERS, thread_name_prefix="journal-pipeline"
+                )
+    return _pipeline_executor
+
+
+def bind_current_job(fn: Callable) -> Callable:
+    """
+    包装函数，使其在其他线程中执行时仍归属当前任务
+    （子步骤中的提示和进度会记录到同一个任务上）
+    """
+    job = current_job()
+
+    def wrapper(*args, **kwargs):
+        with job_context(job):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+@contextlib.contextmanager
+def job_context(job: Job):
+    """在当前线程临时绑定任务（例如在页面线程中收集并发子步骤的提示）"""
+    previous = getattr(_local, "job", None)
+    _local.job = job
+    try:
+        yield job
+    finally:
+        _local.job = previous
+
+
+def configure_feedback(message_handler: Optional[Callable[[str, str], None]] = None,
+                       spinner_factory: Optional[Callable[[str], Any]] = None):
+    """
+    设置不在任务中时的提示方式，渲染代码因此不依赖 Streamlit
+
+    Args:
+        message_handler: (level, message) -> None，为None时打印到标准输出
+        spinner_factory: text -> 上下文管理器（如 st.spinner），为None时不显示加载动画
+    """
+    global _message_handler, _spinner_factory
+    _message_handler = message_handler
+    _spinner_factory = spinner_factory
+
+
+def notify(level: str, message: str):
+    """
+    显示提示信息（level: info / warning / error / success）
+    在后台任务中运行时记录到任务上，由页面轮询结果时统一显示
+    """
+    job = current_job()
+    if job is not None:
+        job.notify(level, message)
+    elif _message_handler is not None:
+        _message_handler(level, message)
+    else:
+        print(f"[{level}] {message}")
+
+
+def status_spinner(text: str):
+    """页面上显示加载动画；后台任务中进度由任务阶段表示，不显示动画"""
+    if current_job() is not None or _spinner_factory is None:
+        return contextlib.nullcontext()
+    return _spinner_factory(text)
+
+
+def run_concurrently(steps: List[Tuple]) -> List[Any]:
+    """
+    在流水线线程池中并发执行互不依赖的步骤，按提交顺序返回结果
+    子步骤的提示和进度归属当前任务；在页面线程中调用时先收集，全部完成后再显示
+
+    Args:
+        steps: [(函数, 参数...), ...]
+    """
+    owner = current_job()
+    collector = owner if owner is not None else Job("inline")
+    with job_context(collector):
+        futures = [
+            get_pipeline_executor().submit(bind_current_job(fn), *args)
+            for fn, *args in steps
+        ]
+        results = [future.result() for future in futures]
+    if owner is None:
+        for level, message in collector.messages:
+            notify(level, message)
+    return results
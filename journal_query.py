@@ -0,0 +1,48 @@
+"""
+日记查询条件
+Supabase 与本地文件两种存储共用的筛选/排序定义，
+保证同样的关键词、天气、日期范围、排序和分页在两种模式下返回一致的结果
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 日记日期的存储格式（同格式字符串按字典序比较即按日期先后比较）
+JOURNAL_DATE_FORMAT = "%Y年%m月%d日"
+
+# 表示不按天气筛选的选项
+ALL_WEATHER = "全部"
+
+# 排序方式：名称 -> [(字段, 是否倒序), ...]，后面的字段用于打破并列
+SORT_ORDERS: Dict[str, List[Tuple[str, bool]]] = {
+    "created_at_desc": [("created_at", True), ("id", True)],
+    "created_at_asc": [("created_at", False), ("id", False)],
+    "date_desc": [("date", True), ("created_at", True)],
+    "date_asc": [("date", False), ("created_at", False)],
+}
+DEFAULT_SORT = "created_at_desc"
+# 按搜索相关度排序（相关度相同时按创建时间倒序），有关键词且未指定排序时使用
+RELEVANCE_SORT = "relevance"
+
+# 关键词匹配的字段
+SEARCH_FIELDS = ("date", "weather", "text")
+
+# 列表展示只需要的字段（不含文字内容等大字段，查看详情时再按ID读取完整条目）
+LIST_FIELDS = ("id", "date", "weather", "created_at", "journal_image_url", "renditions")
+
+
+def effective_sort(sort: Optional[str], keyword: Optional[str]) -> str:
+    """实际使用的排序方式：未指定时有关键词按相关度，否则按默认排序"""
+    if sort:
+        return sort
+    return RELEVANCE_SORT if keyword else DEFAULT_SORT
+
+
+def sort_fields(sort: Optional[str]) -> List[Tuple[str, bool]]:
+    """排序方式对应的字段列表，未知的排序方式（包括相关度）使用默认排序"""
+    return SORT_ORDERS.get(sort or DEFAULT_SORT, SORT_ORDERS[DEFAULT_SORT])
+
+
+def project(journal: Dict, fields: Optional[Sequence[str]]) -> Dict:
+    """本地投影：只保留指定字段（fields为None时返回原条目）"""
+    if fields is None:
+        return journal
+    return {field: journal[field] for field in fields if field in journal}
@@ -0,0 +1,610 @@
+"""
+手账页面渲染
+Shoegaze/Dreamcore 风格的手账合成（图片效果、AI背景、排版）与页面代码分离，
+Streamlit 页面、后台任务和命令行批量渲染（见 generator.py）共用；
+模块不依赖 Streamlit，提示信息通过 jobs.notify 输出
+"""
+import hashlib
+import json
+import os
+import random
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+
+from ai_background_cache import background_cache_key, get_cached_background, put_cached_background
+from compositing import add_paper_grain, scale_alpha
+from font_registry import font_fingerprint, get_font
+from http_clients import get_ark_client, get_http_session
+from image_source import ImageSource
+from jobs import notify, run_concurrently, set_job_stage, status_spinner
+from overlay_cache import get_overlay, overlay_fingerprint
+from project_paths import project_path
+from render_cache import get_cached_page, put_cached_page, render_cache_key
+
+# 火山方舟AI导入（可选，如果未安装则使用降级方案）
+try:
+    from volcenginesdkarkruntime import Ark
+    AI_AVAILABLE = True
+except ImportError:
+    AI_AVAILABLE = False
+
+# 氛围素材
+bg_path = project_path("assets", "bg_rain.jpg")
+fog_path = project_path("assets", "fog_overlay.png")
+
+# ==========================================
+# 1. 图片处理函数（Shoegaze/Dreamcore风格）
+# ==========================================
+def apply_dreamcore_effects(img, intensity=0.7, scale=1.0):
+    """
+    应用Dreamcore效果：模糊、滤镜、水汽感
+    
+    Args:
+        scale: 图片相对于效果参数设计尺寸的缩放比例（先缩小再处理时传入，模糊半径随之缩放，保持相同观感）
+    """
+    # 转换为RGBA以便处理透明度
+    img = img.convert("RGBA")
+    
+    # 1. 轻微模糊（失焦效果）
+    blur_radius = int(3 * intensity) * scale
+    if blur_radius > 0:
+        img = img.filter(ImageFilter.GaussianBlur(radius=blur_radius))
+    
+    # 2. 色调调整（冷色调，增加朦胧感）
+    enhancer = ImageEnhance.Color(img)
+    img = enhancer.enhance(0.8)  # 降低饱和度
+    
+    # 3. 亮度调整（略微降低）
+    enhancer = ImageEnhance.Brightness(img)
+    img = enhancer.enhance(0.9)
+    
+    # 4. 添加半透明层（水汽感）
+    overlay = Image.new("RGBA", img.size, (200, 220, 255, int(30 * intensity)))
+    img = Image.alpha_composite(img, overlay)
+    
+    return img
+
+# ==========================================
+# 2. AI生图相关函数
+# ==========================================
+def generate_ai_prompt(text, date_str, weather):
+    """
+    根据用户输入生成Dreamcore风格的AI生图prompt
+    """
+    # 基础Dreamcore风格关键词
+    dreamcore_keywords = [
+        "dreamcore aesthetic", "shoegaze atmosphere", "hazy and ethereal",
+        "soft focus", "blurred bokeh lights", "rainy window", "nostalgic mood",
+        "pastel colors", "vaporwave vibes", "memory fragments", "emotional atmosphere",
+        "watery reflections", "translucent layers", "non-linear composition"
+    ]
+    
+    # 根据天气调整氛围
+    weather_moods = {
+        "☀️ 晴天": "warm sunlight filtering through, golden hour glow, cheerful brightness",
+        "⛅ 多云": "soft diffused light, gentle shadows, peaceful overcast sky",
+        "🌧️ 雨天": "raindrops on glass, blurred city lights, melancholic rainy atmosphere",
+        "❄️ 雪天": "snowflakes falling, cold blue tones, serene winter scene",
+        "🌫️ 雾天": "thick fog, mysterious atmosphere, obscured distant views",
+        "🌙 夜晚": "night city lights, dark moody tones, nocturnal dreamscape"
+    }
+    
+    weather_mood = weather_moods.get(weather, "dreamy atmospheric")
+    
+    # 根据用户文字提取情绪关键词
+    emotion_keywords = ""
+    if text:
+        # 简单的情感关键词提取（可以根据需要扩展）
+        positive_words = ["开心", "快乐", "幸福", "美好", "温暖", "喜欢", "爱"]
+        negative_words = ["难过", "悲伤", "孤独", "疲惫", "焦虑", "担心"]
+        
+        text_lower = text.lower()
+        if any(word in text for word in positive_words):
+            emotion_keywords = "warm and joyful, uplifting mood, positive energy"
+        elif any(word in text for word in negative_words):
+            emotion_keywords = "melancholic and introspective, soft sadness, contemplative mood"
+        else:
+            emotion_keywords = "peaceful and reflective, calm atmosphere, gentle emotions"
+    
+    # 组合prompt - 明确要求纯背景，不包含文字
+    prompt_parts = [
+        "A dreamcore aesthetic journal page background,",
+        weather_mood + ",",
+        emotion_keywords + "," if emotion_keywords else "",
+        "featuring " + ", ".join(dreamcore_keywords[:5]) + ",",
+        "vertical composition, soft pastel color palette,",
+        "paper texture overlay, artistic journal style,",
+        "NO TEXT, NO WORDS, NO LETTERS, pure background only,",  # 明确禁止文字
+        "suitable for handwritten text overlay, abstract decorative elements only"
+    ]
+    
+    prompt = " ".join([p for p in prompt_parts if p])
+    
+    # 如果用户有具体文字描述，只提取情绪和氛围，不直接加入文字内容
+    if text and len(text) < 50:  # 短文本可以提取情绪
+        # 只提取情绪关键词，不直接使用文字内容
+        prompt += f", mood: {text[:20]}"  # 只取前20个字符作为情绪参考
+    
+    return prompt
+
+# AI生图模型配置
+AI_IMAGE_MODEL = "doubao-seedream-4-5-251128"
+AI_IMAGE_SIZE = "2K"  # 2K分辨率，适合作为背景
+
+def generate_ai_background(prompt, base_width=1200, base_height=1600, show_error=True, variant=None):
+    """
+    使用火山方舟AI生成背景图片
+    相同prompt的结果缓存在磁盘上（见 ai_background_cache），命中时不再调用AI接口
+    返回PIL Image对象，失败时返回None
+    
+    Args:
+        prompt: 生图提示词
+        base_width: 图片宽度
+        base_height: 图片高度
+        show_error: 是否显示错误信息（默认True，便于调试）
+        variant: 缓存变体选择值（如渲染种子），None时随机选择
+    """
+    if not AI_AVAILABLE:
+        if show_error:
+            notify("warning", "⚠️ AI功能不可用：未安装 volcengine-python-sdk[ark]，请运行 `pip install 'volcengine-python-sdk[ark]'`")
+        return None
+    
+    api_key = os.getenv('ARK_API_KEY')
+    if not api_key:
+        if show_error:
+            notify("warning", "⚠️ AI功能不可用：未设置 ARK_API_KEY 环境变量。请在 .env 文件中设置，或使用系统环境变量。")
+        return None
+    
+    # 优先使用缓存的背景图
+    background_key = background_cache_key(prompt, AI_IMAGE_MODEL, AI_IMAGE_SIZE, base_width, base_height)
+    cached_background = get_cached_background(background_key, variant)
+    if cached_background is not None:
+        return cached_background
+    
+    try:
+        # 获取共享客户端（进程内复用连接）
+        client = get_ark_client(api_key)
+        
+        # 调用生图API
+        with status_spinner("🎨 AI正在生成背景图..."):
+            imagesResponse = client.images.generate(
+                model=AI_IMAGE_MODEL,
+                prompt=prompt,
+                size=AI_IMAGE_SIZE,
+                response_format="url",
+                watermark=False
+            )
+        
+        # 获取图片URL并下载
+        if imagesResponse.data and len(imagesResponse.data) > 0:
+            image_url = imagesResponse.data[0].url
+            
+            # 下载图片
+            response = get_http_session().get(image_url, timeout=30)
+            if response.status_code == 200:
+                # 转换为PIL Image
+                img = Image.open(BytesIO(response.content))
+                
+                # 调整尺寸以匹配手账页面
+                img = img.resize((base_width, base_height), Image.Resampling.LANCZOS)
+                
+                # 保存到背景缓存
+                try:
+                    put_cached_background(background_key, img)
+                except Exception as e:
+                    print(f"保存AI背景缓存失败: {e}")
+                
+                notify("success", "✨ AI背景生成成功！")
+                return img
+            else:
+                if show_error:
+                    notify("error", f"❌ 图片下载失败：HTTP {response.status_code}")
+                return None
+        else:
+            if show_error:
+                notify("error", "❌ AI生图返回为空，请检查API响应")
+            return None
+            
+    except Exception as e:
+        # 显示详细错误信息
+        if show_error:
+            error_msg = str(e)
+            notify("error", f"❌ AI生图失败：{error_msg}")
+            # 如果是API相关错误，提供更多提示
+            if "api_key" in error_msg.lower() or "auth" in error_msg.lower():
+                notify("info", "💡 提示：请检查 API 密钥是否正确，或访问 https://console.volcengine.com/ark/region:ark+cn-beijing/apikey 获取新密钥")
+            elif "model" in error_msg.lower():
+                notify("info", f"💡 提示：请检查模型ID是否正确：{AI_IMAGE_MODEL}")
+        return None
+
+# ==========================================
+# 3. 手帐生成函数
+# ==========================================
+def derive_render_seed(image_hashes, text, date_str, weather):
+    """
+    根据手账内容派生渲染种子
+    相同的输入总是得到相同的种子，从而得到相同的排版
+    图片按内容哈希参与计算，因此不依赖图片的存储位置（上传完成前即可确定种子）；
+    种子不包含日记ID，新建、编辑后重新生成和命令行批量渲染对同样的内容得到同样的页面
+    """
+    payload = json.dumps(
+        [
+            [image_hash or "" for image_hash in image_hashes or []],
+            text or "",
+            date_str or "",
+            weather or ""
+        ],
+        ensure_ascii=False
+    )
+    return int.from_bytes(hashlib.sha256(payload.encode("utf-8")).digest()[:8], "big")
+
+def prepare_photo(source, base_width=1200, base_height=1600):
+    """
+    解码并预处理单张用户图片：缩放到排版尺寸 + Dreamcore效果
+    先按目标尺寸解码（JPEG draft / reduce）并缩小，再在小图上应用效果，
+    模糊半径按缩放比例换算，效果与在原图上处理后再缩小一致
+    
+    Args:
+        source: ImageSource
+    
+    Returns:
+        RGBA图片，失败返回None
+    """
+    # 随机尺寸（但保持比例）- 移动端优化
+    max_size = min(base_width, base_height) // 2.5
+    img = source.open_reduced(int(max_size))
+    if img is None:
+        return None
+    try:
+        # 原图尺寸（draft/reduce 之前），用于换算效果参数
+        full_width = (source.size() or img.size)[0]
+        img = img.convert("RGBA")
+        img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+        
+        # 应用Dreamcore效果
+        img = apply_dreamcore_effects(img, intensity=0.6, scale=img.width / full_width)
+        return img
+    except Exception as e:
+        print(f"处理图片失败: {e}")
+        return None
+
+def load_ai_background(prompt, base_width=1200, base_height=1600, seed=None):
+    """生成AI背景，任何异常都降级为None（使用默认背景）"""
+    set_job_stage("ai_background")
+    try:
+        # 显示生成的prompt（调试用，可选）
+        # st.info(f"🎨 AI Prompt: {prompt[:100]}...")
+        return generate_ai_background(prompt, base_width, base_height, show_error=True, variant=seed)
+    except Exception as e:
+        # AI失败时显示错误并降级
+        notify("warning", f"⚠️ AI生图异常，使用默认背景：{str(e)}")
+        return None
+
+class PagePlan:
+    """
+    一次页面渲染的输入和派生值（种子、prompt、渲染缓存键）
+    可以pickle：AI背景在任务线程中获取后，与计划一起交给渲染进程合成（见 render_service）
+    """
+
+    def __init__(self, sources, image_hashes, text, date_str, weather, size, seed, use_ai, prompt,
+                 background_id, cache_key):
+        self.sources = sources
+        self.image_hashes = image_hashes
+        self.text = text
+        self.date_str = date_str
+        self.weather = weather
+        self.size = size
+        self.seed = seed
+        self.use_ai = use_ai
+        self.prompt = prompt
+        self.background_id = background_id
+        self.cache_key = cache_key
+
+def plan_journal_page(images, text, date_str, weather, base_width=1200, base_height=1600, use_ai=True,
+                      seed=None):
+    """
+    读取图片原始数据，计算渲染种子和渲染缓存键（参数同 create_journal_page）
+    
+    Returns:
+        PagePlan
+    """
+    sources = [ImageSource.coerce(img) for img in images[:3]]  # 最多3张
+    
+    # 读取图片原始数据（只读取一次，同时用于种子、渲染缓存键和解码；远程图片并发下载）
+    image_hashes = run_concurrently([(source.digest,) for source in sources])
+    if seed is None:
+        seed = derive_render_seed(image_hashes, text, date_str, weather)
+    
+    # AI背景以prompt区分，只有AI可用时才计入缓存键
+    ai_enabled = use_ai and AI_AVAILABLE and bool(os.getenv('ARK_API_KEY'))
+    prompt = generate_ai_prompt(text, date_str, weather) if use_ai else None
+    if ai_enabled:
+        background_id = "ai:" + hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    else:
+        background_id = "default"
+    cache_key = None
+    if all(image_hash is not None for image_hash in image_hashes):
+        assets = {"font": font_fingerprint(), "overlays": overlay_fingerprint([bg_path, fog_path])}
+        cache_key = render_cache_key(
+            image_hashes, text, date_str, weather, (base_width, base_height), seed, background_id, assets
+        )
+    return PagePlan(sources, image_hashes, text, date_str, weather, (base_width, base_height), seed, use_ai,
+                    prompt, background_id, cache_key)
+
+def get_planned_page(plan):
+    """查询渲染缓存，未命中（或图片读取失败、无法计算缓存键）返回None"""
+    if plan.cache_key is None:
+        return None
+    return get_cached_page(plan.cache_key)
+
+def fetch_page_background(plan):
+    """获取AI背景（调用生图API并下载，主要是网络等待），不使用AI或失败时返回None"""
+    if not plan.use_ai:
+        return None
+    base_width, base_height = plan.size
+    return load_ai_background(plan.prompt, base_width, base_height, plan.seed)
+
+def prepare_photo_steps(plan):
+    """图片预处理步骤（传给 run_concurrently），跳过读取失败的图片"""
+    base_width, base_height = plan.size
+    return [
+        (prepare_photo, source, base_width, base_height)
+        for source, image_hash in zip(plan.sources, plan.image_hashes) if image_hash is not None
+    ]
+
+def create_journal_page(images, text, date_str, weather, base_width=1200, base_height=1600, use_ai=True,
+                        seed=None, use_cache=True):
+    """
+    生成手帐页面
+    风格：Shoegaze/Dreamcore - 失焦、朦胧、半透明、非线性排版
+    除AI背景外，输出只取决于输入参数（随机性来自私有的 random.Random 实例）
+    AI背景和图片预处理互不依赖，并发执行后再合成
+    
+    Args:
+        images: 用户上传的图片列表（ImageSource、bytes、文件对象、本地路径或URL）
+        text: 用户输入的文本
+        date_str: 日期字符串
+        weather: 天气
+        base_width: 基础宽度
+        base_height: 基础高度
+        use_ai: 是否使用AI生成背景（默认True）
+        seed: 随机种子（默认根据内容派生，见 derive_render_seed）
+        use_cache: 是否读取渲染缓存（False时总是重新渲染，结果仍写入缓存）
+    """
+    plan = plan_journal_page(images, text, date_str, weather, base_width, base_height, use_ai, seed)
+    cached_page = get_planned_page(plan) if use_cache else None
+    if cached_page is not None:
+        return cached_page
+    
+    # 并发：AI背景生成 + 图片预处理
+    steps = prepare_photo_steps(plan)
+    steps.append((fetch_page_background, plan))
+    results = run_concurrently(steps)
+    ai_background = results.pop()
+    return compose_journal_page(plan, ai_background, results)
+
+def compose_journal_page(plan, ai_background=None, photos=None):
+    """
+    合成手帐页面（CPU密集，不访问网络），结果写入渲染缓存
+    
+    Args:
+        plan: plan_journal_page 的结果
+        ai_background: AI背景（fetch_page_background 的结果），None时使用默认背景
+        photos: 已预处理的图片（prepare_photo 的结果），None时在这里并发预处理
+    """
+    if photos is None:
+        photos = run_concurrently(prepare_photo_steps(plan))
+    text, date_str, weather = plan.text, plan.date_str, plan.weather
+    base_width, base_height = plan.size
+    use_ai = plan.use_ai
+    background_id = plan.background_id
+    cache_key = plan.cache_key
+    rng = random.Random(plan.seed)
+    # 处理并放置图片（1-3张，非线性排版）
+    processed_images = [img for img in photos if img is not None]
+    
+    # 创建底图
+    set_job_stage("compositing")
+    if ai_background:
+        # 使用AI生成的背景作为底图
+        base_img = ai_background.convert("RGBA")
+        
+        # 添加轻微的纸质纹理叠加（保持手账感）
+        paper_overlay = Image.new("RGBA", (base_width, base_height), (245, 240, 235, 30))
+        base_img = Image.alpha_composite(base_img, paper_overlay)
+    else:
+        # 降级方案：使用默认纸质纹理
+        if use_ai:
+            # 只在尝试使用AI但失败时显示提示（避免每次都显示）
+            pass  # 错误信息已在 generate_ai_background 中显示
+        base_img = Image.new("RGB", (base_width, base_height), (245, 240, 235))
+        
+        # 添加微妙的纹理（模拟纸张）
+        base_img = add_paper_grain(base_img, count=1000, rng=rng)
+        
+        # 如果有背景雨图，作为底层氛围（非常低的透明度，预处理结果已缓存）
+        bg = get_overlay(bg_path, base_width, base_height, alpha_scale=0.15)
+        if bg is not None:
+            base_img = Image.alpha_composite(base_img.convert("RGBA"), bg).convert("RGB")
+        
+        # 转换为RGBA以便后续合成
+        if base_img.mode != "RGBA":
+            base_img = base_img.convert("RGBA")
+    
+    # 非线性排版：随机位置和角度
+    positions = []
+    for i, img in enumerate(processed_images):
+        # 计算可用区域（避免重叠）- 移动端优化边距
+        margin = int(base_width * 0.1)  # 响应式边距
+        x_range = (margin, base_width - img.width - margin)
+        y_range = (margin, base_height - img.height - margin)
+        
+        # 尝试找到一个不重叠的位置
+        max_attempts = 50
+        for _ in range(max_attempts):
+            x = rng.randint(*x_range)
+            y = rng.randint(*y_range)
+            
+            # 检查是否与已有位置重叠
+            overlap = False
+            for px, py, pw, ph in positions:
+                if not (x + img.width < px or x > px + pw or y + img.height < py or y > py + ph):
+                    overlap = True
+                    break
+            
+            if not overlap:
+                positions.append((x, y, img.width, img.height))
+                break
+        else:
+            # 如果找不到不重叠的位置，使用默认位置
+            x = margin + i * (base_width - 2 * margin) // len(processed_images)
+            y = margin + rng.randint(0, base_height // 3)
+            positions.append((x, y, img.width, img.height))
+    
+    # 粘贴图片（带旋转和透明度）
+    for i, (img, (x, y, w, h)) in enumerate(zip(processed_images, positions)):
+        # 随机旋转角度（-15到15度）
+        angle = rng.uniform(-15, 15)
+        rotated_img = img.rotate(angle, expand=False, fillcolor=(0, 0, 0, 0))
+        
+        # 调整透明度（模拟记忆碎片感）
+        scale_alpha(rotated_img, 0.85)  # 85%不透明度
+        
+        # 粘贴到基图上
+        base_img.paste(rotated_img, (x, y), rotated_img)
+    
+    # 加载字体 - 移动端优化尺寸（字体在进程内只解析一次，见 font_registry）
+    font_size_title = int(base_width * 0.06)  # 响应式字体大小
+    font_size_text = int(base_width * 0.04)
+    font_title = get_font(font_size_title)
+    font_text = get_font(font_size_text)
+    
+    draw = ImageDraw.Draw(base_img)
+    
+    # 绘制日期和天气（左上角，略微旋转）
+    # 增强颜色对比度，确保字体清晰可见
+    date_weather_text = f"{date_str}  {weather}"
+    
+    # 计算文字宽度
+    if font_title is not None:
+        try:
+            bbox = draw.textbbox((0, 0), date_weather_text, font=font_title)
+            text_width = bbox[2] - bbox[0]
+        except Exception as e:
+            # 如果字体不支持某些字符，使用估算
+            text_width = len(date_weather_text) * font_size_title * 0.6
+    else:
+        # 如果没有字体，使用估算（中文字符通常更宽）
+        text_width = len(date_weather_text) * font_size_title * 0.8
+    
+    date_x = int(base_width * 0.08)
+    date_y = int(base_height * 0.08)
+    
+    # 创建日期文字的临时图像以便旋转
+    # 使用更深的颜色和更高的不透明度，确保字体清晰可见
+    date_img = Image.new("RGBA", (int(text_width) + 100, font_size_title + 50), (0, 0, 0, 0))
+    date_draw = ImageDraw.Draw(date_img)
+    # 增强颜色对比度：使用更深的颜色 (60, 60, 80) 和更高的不透明度 (240)
+    try:
+        if font_title is not None:
+            # 尝试使用字体绘制
+            try:
+                date_draw.text((50, 25), date_weather_text, fill=(60, 60, 80, 240), font=font_title)
+            except Exception as e:
+                # 如果字体不支持某些字符，尝试不使用字体
+                date_draw.text((50, 25), date_weather_text, fill=(60, 60, 80, 240))
+        else:
+            # 如果没有字体，直接绘制（PIL会使用默认字体，可能不支持中文）
+            # 如果默认字体不支持中文，至少显示日期数字部分
+            try:
+                date_draw.text((50, 25), date_weather_text, fill=(60, 60, 80, 240))
+            except:
+                # 如果还是失败，使用ASCII格式的日期
+                ascii_date = date_str.replace("年", "-").replace("月", "-").replace("日", "")
+                date_draw.text((50, 25), f"{ascii_date} {weather}", fill=(60, 60, 80, 240))
+    except Exception as e:
+        # 最后的降级方案：只显示日期数字
+        try:
+            ascii_date = date_str.replace("年", "-").replace("月", "-").replace("日", "")
+            date_draw.text((50, 25), ascii_date, fill=(60, 60, 80, 240))
+        except:
+            pass
+    
+    date_img = date_img.rotate(-5, expand=False, fillcolor=(0, 0, 0, 0))
+    base_img.paste(date_img, (date_x, date_y), date_img)
+    
+    # 绘制文字（非线性排版，模拟手写感）
+    if text:
+        lines = text.split('\n')
+        # 文字起始位置（避开图片区域）- 移动端优化
+        text_start_y = base_height // 2
+        if processed_images:
+            # 如果有多张图片，文字放在下方
+            max_img_bottom = max([y + h for _, (x, y, w, h) in zip(processed_images, positions)])
+            text_start_y = max_img_bottom + int(base_height * 0.1)
+        
+        current_y = text_start_y
+        line_spacing = font_size_text * 1.5
+        
+        for i, line in enumerate(lines):
+            if line.strip():
+                # 每行略微不同的x位置（模拟手写）- 移动端优化
+                x_offset = rng.randint(-20, 20) if i > 0 else 0
+                text_x = int(base_width * 0.1) + x_offset
+                
+                # 略微旋转（-3到3度）
+                line_angle = rng.uniform(-3, 3)
+                
+                # 创建单行文字的临时图像
+                if font_text is not None:
+                    try:
+                        bbox = draw.textbbox((0, 0), line, font=font_text)
+                        line_width = bbox[2] - bbox[0]
+                        line_height = bbox[3] - bbox[1]
+                    except:
+                        line_width = len(line) * font_size_text * 0.6
+                        line_height = font_size_text * 1.2
+                else:
+                    line_width = len(line) * font_size_text * 0.6
+                    line_height = font_size_text * 1.2
+                
+                line_img = Image.new("RGBA", (int(line_width) + 100, int(line_height) + 50), (0, 0, 0, 0))
+                line_draw = ImageDraw.Draw(line_img)
+                # 增强颜色对比度：使用更深的颜色和更高的不透明度，确保字体清晰可见
+                try:
+                    if font_text is not None:
+                        line_draw.text((50, 25), line, fill=(40, 40, 60, 250), font=font_text)
+                    else:
+                        # 如果没有字体，直接绘制（PIL会使用默认字体）
+                        line_draw.text((50, 25), line, fill=(40, 40, 60, 250))
+                except Exception as e:
+                    # 如果绘制失败，尝试不使用字体
+                    try:
+                        line_draw.text((50, 25), line, fill=(40, 40, 60, 250))
+                    except:
+                        # 如果还是失败，跳过这一行
+                        continue
+                line_img = line_img.rotate(line_angle, expand=False, fillcolor=(0, 0, 0, 0))
+                
+                # 粘贴到基图
+                base_img.paste(line_img, (int(text_x), int(current_y)), line_img)
+                
+                current_y += line_spacing + rng.randint(-10, 10)  # 随机行间距变化
+    
+    # 如果有雾气层，最后叠加（很低的透明度，预处理结果已缓存）
+    fog = get_overlay(fog_path, base_width, base_height, alpha_cap=80)
+    if fog is not None:
+        base_img = Image.alpha_composite(base_img, fog)
+    
+    # 转换回RGB
+    final_img = base_img.convert("RGB")
+    
+    # 写入渲染缓存（AI背景生成失败时不缓存，下次仍会重试AI）
+    if cache_key is not None and (ai_background is not None or background_id == "default"):
+        try:
+            put_cached_page(cache_key, final_img)
+        except Exception as e:
+            print(f"写入渲染缓存失败: {e}")
+    
+    return final_img
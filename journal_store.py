@@ -0,0 +1,335 @@
+"""
+日记存储
+优先使用 Supabase（数据库 + Storage），未配置或失败时降级到本地（见 local_store）；
+Streamlit 页面和命令行批量渲染（见 generator.py）共用，模块不依赖 Streamlit
+"""
+import os
+import uuid
+from urllib.parse import quote, urlparse
+
+from image_encoding import encode_image
+from image_source import ImageSource
+from jobs import notify, run_concurrently
+from journal_query import LIST_FIELDS
+from local_store import (
+    append_local_journal,
+    count_local_journals,
+    get_local_journal,
+    load_local_journals,
+    query_local_journals,
+    save_local_journals,
+    update_local_journal
+)
+from project_paths import project_path
+from renditions import RENDITION_WIDTHS, RENDITIONS_FOLDER, create_renditions
+
+# 支持从.env文件加载环境变量（推荐方式）
+try:
+    from dotenv import load_dotenv
+    load_dotenv()  # 自动加载项目根目录下的.env文件
+except ImportError:
+    # 如果没有安装python-dotenv，跳过（不影响功能）
+    pass
+
+# Supabase支持（可选，如果配置了环境变量则使用云数据库）
+try:
+    from supabase_config import (
+        get_supabase_client,
+        upload_file_to_supabase,
+        load_journals_from_supabase,
+        count_journals_in_supabase,
+        save_journal_to_supabase,
+        update_journal_in_supabase,
+        query_journals_in_supabase,
+        get_journal_from_supabase,
+        delete_file_from_supabase,
+        storage_path_from_url
+    )
+    SUPABASE_AVAILABLE = get_supabase_client() is not None
+except ImportError:
+    SUPABASE_AVAILABLE = False
+except Exception:
+    SUPABASE_AVAILABLE = False
+
+# 路径配置（相对于项目根目录，保存到日记条目中的就是这种形式，见 project_paths）
+DATA_DIR = "data"
+IMAGES_DIR = os.path.join(DATA_DIR, "images")
+
+# 创建必要的目录
+os.makedirs(project_path(IMAGES_DIR), exist_ok=True)
+
+def load_journals():
+    """加载所有日记条目（优先使用Supabase，降级到本地文件）"""
+    if SUPABASE_AVAILABLE:
+        try:
+            journals = load_journals_from_supabase()
+            # 转换格式以兼容现有代码（将URL转换为路径格式）
+            for journal in journals:
+                if "journal_image_url" in journal:
+                    journal["journal_image_path"] = journal["journal_image_url"]
+                if "image_paths" in journal and isinstance(journal["image_paths"], list):
+                    # image_paths已经是URL数组，保持原样
+                    pass
+            return journals
+        except Exception as e:
+            notify("warning", f"⚠️ Supabase加载失败，使用本地文件：{str(e)}")
+    
+    # 降级到本地文件
+    return load_local_journals()
+
+def save_journals(journals):
+    """保存日记条目（兼容函数，实际使用save_journal）"""
+    # 这个函数主要用于向后兼容，实际保存使用save_journal函数
+    if SUPABASE_AVAILABLE:
+        # 如果使用Supabase，这个函数不应该被调用
+        # 因为每个条目应该单独保存
+        pass
+    else:
+        # 本地文件模式
+        save_local_journals(journals)
+
+def save_journal(journal_entry):
+    """保存单个日记条目（新增，支持Supabase和本地）"""
+    if SUPABASE_AVAILABLE:
+        try:
+            # 准备Supabase格式的数据
+            supabase_data = {
+                "date": journal_entry["date"],
+                "weather": journal_entry["weather"],
+                "text": journal_entry["text"],
+                "image_paths": journal_entry.get("image_paths", []),
+                "journal_image_url": journal_entry.get("journal_image_path") or journal_entry.get("journal_image_url"),
+                "renditions": journal_entry.get("renditions")
+            }
+            journal_id = save_journal_to_supabase(supabase_data)
+            if journal_id:
+                journal_entry["id"] = journal_id
+                return True
+            return False
+        except Exception as e:
+            notify("warning", f"⚠️ Supabase保存失败，使用本地文件：{str(e)}")
+    
+    # 降级到本地文件
+    append_local_journal(journal_entry)
+    return True
+
+def count_journals():
+    """日记条目总数（优先使用Supabase，降级到本地文件）"""
+    if SUPABASE_AVAILABLE:
+        try:
+            return count_journals_in_supabase()
+        except Exception as e:
+            notify("warning", f"⚠️ Supabase加载失败，使用本地文件：{str(e)}")
+    return count_local_journals()
+
+def query_journals(keyword=None, weather=None, date_from=None, date_to=None, sort=None, offset=0, limit=None,
+                   fields=None):
+    """
+    按条件查询日记（优先使用Supabase，降级到本地文件）
+    关键词、天气、日期范围、排序和分页一次查询完成
+    
+    Returns:
+        (条目列表, 符合条件的总数)
+    """
+    if SUPABASE_AVAILABLE:
+        try:
+            journals, total = query_journals_in_supabase(
+                keyword=keyword, weather=weather, date_from=date_from, date_to=date_to,
+                sort=sort, offset=offset, limit=limit, fields=fields
+            )
+            # 转换格式以兼容现有代码
+            for journal in journals:
+                if "journal_image_url" in journal:
+                    journal["journal_image_path"] = journal["journal_image_url"]
+            return journals, total
+        except Exception as e:
+            notify("warning", f"⚠️ Supabase搜索失败，使用本地搜索：{str(e)}")
+    
+    return query_local_journals(
+        keyword=keyword, weather=weather, date_from=date_from, date_to=date_to,
+        sort=sort, offset=offset, limit=limit, fields=fields
+    )
+
+def get_journal(journal_id):
+    """按ID读取单条日记的完整内容（优先使用Supabase，降级到本地文件）"""
+    if SUPABASE_AVAILABLE:
+        try:
+            journal = get_journal_from_supabase(journal_id)
+            if journal and "journal_image_url" in journal:
+                journal["journal_image_path"] = journal["journal_image_url"]
+            return journal
+        except Exception as e:
+            notify("warning", f"⚠️ Supabase加载失败，使用本地文件：{str(e)}")
+    return get_local_journal(journal_id)
+
+def load_journals_page(offset, limit, search_keyword="", weather_filter="全部"):
+    """
+    分页加载日记条目（按创建时间倒序），搜索和天气筛选与分页在同一次查询中完成
+    只返回列表展示需要的字段，完整内容通过 get_journal 按需读取
+    
+    Returns:
+        (当前页条目, 总数)
+    """
+    return query_journals(
+        keyword=search_keyword, weather=weather_filter, offset=offset, limit=limit, fields=LIST_FIELDS
+    )
+
+def save_image(uploaded_file):
+    """
+    保存上传的图片（优先使用Supabase Storage，降级到本地文件）
+    
+    Args:
+        uploaded_file: ImageSource 或上传的文件对象；传入 ImageSource 时会把存储位置记录到 location
+    
+    Returns:
+        图片URL或本地路径
+    """
+    source = ImageSource.coerce(uploaded_file)
+    file_id = str(uuid.uuid4())
+    file_ext = os.path.splitext(source.name or "")[1]
+    file_bytes = source.read_bytes()
+    
+    if SUPABASE_AVAILABLE:
+        try:
+            # 上传到Supabase Storage
+            filename = f"{file_id}{file_ext}"
+            url = upload_file_to_supabase(file_bytes, filename, folder="uploads")
+            if url:
+                source.location = url
+                return url  # 返回URL而不是路径
+        except Exception as e:
+            notify("warning", f"⚠️ Supabase上传失败，使用本地文件：{str(e)}")
+    
+    # 降级到本地文件
+    file_path = os.path.join(IMAGES_DIR, f"{file_id}{file_ext}")
+    with open(file_path, "wb") as f:
+        f.write(file_bytes)
+    source.location = file_path
+    return file_path
+
+def journal_download_name(path_or_url, date_str):
+    """下载时使用的文件名（扩展名与存储的文件一致）"""
+    file_ext = os.path.splitext(urlparse(path_or_url).path)[1] or ".png"
+    return f"journal_{date_str}{file_ext}"
+
+def storage_download_url(url, file_name):
+    """
+    Supabase Storage 公开URL的下载地址
+    带 download 参数时以附件形式返回（浏览器直接下载，不经过本服务）
+    """
+    separator = "&" if "?" in url else "?"
+    return f"{url}{separator}download={quote(file_name)}"
+
+def store_journal_image(journal_image, journal_id):
+    """
+    编码并保存手账图片（优先使用Supabase Storage，降级到本地文件）
+    格式、质量等由 image_encoding 的环境变量配置，只编码一次
+    
+    Returns:
+        (存储位置（URL或本地路径）, EncodedImage)
+    """
+    encoded = encode_image(journal_image)
+    return store_journal_file(encoded, journal_id), encoded
+
+def store_journal_file(encoded, journal_id):
+    """
+    保存已编码的手账图片（优先使用Supabase Storage，降级到本地文件）
+    
+    Returns:
+        存储位置（URL或本地路径）
+    """
+    journal_filename = f"journal_{journal_id}{encoded.extension}"
+    
+    if SUPABASE_AVAILABLE:
+        try:
+            url = upload_file_to_supabase(
+                encoded.data,
+                journal_filename,
+                folder="journals",
+                content_type=encoded.content_type
+            )
+            if url:
+                return url
+        except Exception as e:
+            notify("warning", f"⚠️ Supabase上传失败，使用本地存储：{str(e)}")
+    
+    # 本地存储
+    journal_image_path = os.path.join(IMAGES_DIR, journal_filename)
+    with open(journal_image_path, "wb") as f:
+        f.write(encoded.data)
+    return journal_image_path
+
+def store_rendition(data, filename):
+    """保存图片副本（优先使用Supabase Storage，降级到本地文件）"""
+    if SUPABASE_AVAILABLE:
+        try:
+            url = upload_file_to_supabase(data, filename, folder=RENDITIONS_FOLDER)
+            if url:
+                return url
+        except Exception as e:
+            notify("warning", f"⚠️ Supabase上传失败，使用本地文件：{str(e)}")
+    
+    rendition_dir = os.path.join(IMAGES_DIR, RENDITIONS_FOLDER)
+    os.makedirs(rendition_dir, exist_ok=True)
+    file_path = os.path.join(rendition_dir, filename)
+    with open(file_path, "wb") as f:
+        f.write(data)
+    return file_path
+
+def create_journal_renditions(journal_image, journal_image_path, sources=()):
+    """
+    为手账图片（缩略图、手账本视图尺寸）和上传的原图（缩略图）生成展示尺寸副本，并发执行
+    
+    Returns:
+        日记条目的 renditions 字段（结构见 renditions.py）
+    """
+    steps = [(create_renditions, journal_image, journal_image_path, store_rendition)]
+    locations = []
+    for source in sources:
+        # 原图只需要缩略图，按缩略图尺寸解码
+        image = source.open_reduced(RENDITION_WIDTHS["thumb"])
+        if source.location and image is not None:
+            steps.append((create_renditions, image, source.location, store_rendition, ("thumb",)))
+            locations.append(source.location)
+    results = run_concurrently(steps)
+    return {"page": results[0], "images": dict(zip(locations, results[1:]))}
+
+def update_journal_page(journal, journal_image_path, renditions):
+    """
+    替换日记的手账图片和副本（重新渲染后使用，日期、天气和文字不变）
+    
+    Returns:
+        是否更新成功
+    """
+    if SUPABASE_AVAILABLE:
+        try:
+            return update_journal_in_supabase(
+                journal["id"],
+                {"journal_image_url": journal_image_path, "renditions": renditions}
+            )
+        except Exception as e:
+            notify("warning", f"⚠️ Supabase更新失败：{str(e)}")
+            return False
+    
+    entry = dict(journal, journal_image_path=journal_image_path, renditions=renditions)
+    return update_local_journal(journal["id"], entry)
+
+def remove_replaced_file(previous_path, current_path):
+    """
+    重新保存手账图片后删除旧文件（格式配置变化时扩展名不同，旧文件不会被覆盖）
+    旧文件是Supabase Storage中的对象时一并删除；与新文件是同一个文件时不删除
+    """
+    if not previous_path or previous_path == current_path:
+        return
+    if previous_path.startswith(('http://', 'https://')):
+        if not SUPABASE_AVAILABLE:
+            return
+        previous_object = storage_path_from_url(previous_path)
+        current_object = storage_path_from_url(current_path) if current_path else None
+        if previous_object and previous_object != current_object:
+            delete_file_from_supabase(previous_path)
+    elif os.path.exists(previous_path):
+        try:
+            os.remove(previous_path)
+        except OSError as e:
+            print(f"删除旧手账图片失败: {e}")
@@ -0,0 +1,435 @@
+"""
+本地文件存储
+未配置Supabase（或Supabase不可用）时使用，接口与 supabase_config 中的函数对应
+
+日记保存在 SQLite 数据库（data/journals.db）中：新增、修改、删除只写入对应的一条记录，
+按ID、日期、天气、创建时间的查询走索引。关键词检索的倒排列表（search_postings 表）
+与日记在同一个事务中更新，检索只读取查询词对应的倒排列表。
+
+写入使用 WAL 日志和 BEGIN IMMEDIATE 事务：同一容器内多个会话同时保存时依次写入，不会丢失条目；
+进程崩溃不会留下写了一半的数据。数据库定期在线备份为快照，启动时发现数据库损坏则从快照恢复。
+
+旧版本的 data/journals.json 会在首次打开数据库时自动导入，导入后重命名为 journals.json.migrated
+"""
+import contextlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from journal_query import ALL_WEATHER, RELEVANCE_SORT, SEARCH_FIELDS, effective_sort, sort_fields
+from project_paths import project_path
+from search_index import combine_scores, journal_tokens, query_terms
+
+DATA_DIR = project_path("data")
+DB_FILE = os.path.join(DATA_DIR, "journals.db")
+# 旧版本的JSON存储（仅用于迁移）
+JOURNALS_FILE = os.path.join(DATA_DIR, "journals.json")
+_LEGACY_SEARCH_INDEX_FILE = os.path.join(DATA_DIR, "journals.search_index.json")
+
+# 单独成列的字段；其他字段以JSON保存在 extra 列中
+_COLUMNS = ("id", "date", "weather", "text", "image_paths", "journal_image_path", "created_at")
+# 以JSON保存的列表字段
+_JSON_COLUMNS = ("image_paths",)
+# 一次 IN (...) 查询的最大参数个数
+_IN_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS journals (
+    id TEXT PRIMARY KEY,
+    date TEXT NOT NULL DEFAULT '',
+    weather TEXT NOT NULL DEFAULT '',
+    text TEXT NOT NULL DEFAULT '',
+    image_paths TEXT NOT NULL DEFAULT '[]',
+    journal_image_path TEXT,
+    created_at TEXT NOT NULL DEFAULT '',
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_journals_date ON journals(date);
+CREATE INDEX IF NOT EXISTS idx_journals_weather ON journals(weather);
+CREATE INDEX IF NOT EXISTS idx_journals_created_at ON journals(created_at);
+
+CREATE TABLE IF NOT EXISTS search_postings (
+    token TEXT NOT NULL,
+    journal_id TEXT NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (token, journal_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_search_postings_journal ON search_postings(journal_id);
+"""
+
+# 等待其他会话/进程释放写锁的最长时间（秒）
+BUSY_TIMEOUT_SECONDS = 30
+
+# 数据库快照：写入后距上次快照超过该时长（秒）时，在线备份一份完整副本；
+# 启动时数据库损坏则从最近的快照恢复
+SNAPSHOT_FILE = os.path.join(DATA_DIR, "journals.snapshot.db")
+try:
+    SNAPSHOT_INTERVAL = max(0.0, float(os.getenv("LOCAL_SNAPSHOT_SECONDS", "300")))
+except ValueError:
+    SNAPSHOT_INTERVAL = 300.0
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+_snapshot_lock = threading.Lock()
+_last_snapshot = 0.0
+
+
+def _open_connection() -> sqlite3.Connection:
+    # isolation_level=None：事务由 _write_transaction 显式控制
+    conn = sqlite3.connect(DB_FILE, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    # WAL：写入不阻塞读取，崩溃时未提交的事务自动丢弃，已提交的数据完整保留
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _connect() -> sqlite3.Connection:
+    """当前线程的数据库连接（sqlite3 连接不能跨线程使用，每个线程各自复用一个）"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        _ensure_initialized()
+        conn = _open_connection()
+        _local.conn = conn
+    return conn
+
+
+@contextlib.contextmanager
+def _write_transaction(conn: sqlite3.Connection):
+    """
+    写事务：BEGIN IMMEDIATE 在读取前就取得写锁，多个会话同时写入时依次执行，
+    不会出现两边都基于旧数据写入而丢失其中一条的情况；出错时整体回滚
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+    _maybe_snapshot(conn)
+
+
+def _is_healthy(conn: sqlite3.Connection) -> bool:
+    try:
+        return conn.execute("PRAGMA quick_check").fetchone()[0] == "ok"
+    except sqlite3.DatabaseError as e:
+        print(f"本地数据库检查失败: {e}")
+        return False
+
+
+def _restore_snapshot():
+    """把损坏的数据库移到一旁，从最近的快照恢复（没有快照时从空数据库开始）"""
+    suffix = f".corrupt-{int(time.time())}"
+    for path in (DB_FILE, f"{DB_FILE}-wal", f"{DB_FILE}-shm"):
+        if os.path.exists(path):
+            os.replace(path, path + suffix)
+    if os.path.exists(SNAPSHOT_FILE):
+        tmp_path = f"{DB_FILE}.{uuid.uuid4().hex}.tmp"
+        shutil.copyfile(SNAPSHOT_FILE, tmp_path)
+        os.replace(tmp_path, DB_FILE)
+        print(f"本地数据库已损坏（保留为 {DB_FILE}{suffix}），已从快照 {SNAPSHOT_FILE} 恢复")
+    else:
+        print(f"本地数据库已损坏（保留为 {DB_FILE}{suffix}），且没有可用快照，使用新的空数据库")
+
+
+def _ensure_initialized():
+    """检查数据库完整性（损坏时从快照恢复）、建表，并在数据库为空时导入旧版 journals.json（每个进程只执行一次）"""
+    global _initialized, _last_snapshot
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        os.makedirs(DATA_DIR, exist_ok=True)
+        try:
+            conn = _open_connection()
+            healthy = _is_healthy(conn)
+        except sqlite3.DatabaseError as e:
+            print(f"打开本地数据库失败: {e}")
+            conn, healthy = None, False
+        if not healthy:
+            if conn is not None:
+                conn.close()
+            _restore_snapshot()
+            conn = _open_connection()
+        try:
+            conn.executescript(_SCHEMA)
+            _migrate_json(conn)
+        finally:
+            conn.close()
+        try:
+            _last_snapshot = os.path.getmtime(SNAPSHOT_FILE)
+        except OSError:
+            _last_snapshot = 0.0
+        _initialized = True
+
+
+def _maybe_snapshot(conn: sqlite3.Connection):
+    """距上次快照超过 SNAPSHOT_INTERVAL 时备份数据库（在线备份后原子替换旧快照）"""
+    global _last_snapshot
+    if time.time() - _last_snapshot < SNAPSHOT_INTERVAL:
+        return
+    # 已有线程在备份时直接跳过，不阻塞写入
+    if not _snapshot_lock.acquire(blocking=False):
+        return
+    tmp_path = f"{SNAPSHOT_FILE}.{uuid.uuid4().hex}.tmp"
+    try:
+        backup = sqlite3.connect(tmp_path)
+        try:
+            conn.backup(backup)
+        finally:
+            backup.close()
+        os.replace(tmp_path, SNAPSHOT_FILE)
+        _last_snapshot = time.time()
+    except (OSError, sqlite3.Error) as e:
+        print(f"保存本地数据库快照失败: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    finally:
+        _snapshot_lock.release()
+
+
+def _migrate_json(conn: sqlite3.Connection):
+    if not os.path.exists(JOURNALS_FILE):
+        return
+    if conn.execute("SELECT 1 FROM journals LIMIT 1").fetchone() is not None:
+        return
+    try:
+        with open(JOURNALS_FILE, 'r', encoding='utf-8') as f:
+            journals = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"读取旧版日记文件失败，跳过导入: {e}")
+        return
+    with _write_transaction(conn):
+        for journal in journals:
+            _insert(conn, journal)
+    os.replace(JOURNALS_FILE, f"{JOURNALS_FILE}.migrated")
+    # 旧版本保存在JSON旁边的检索索引已由 search_postings 表取代
+    try:
+        os.remove(_LEGACY_SEARCH_INDEX_FILE)
+    except OSError:
+        pass
+    print(f"已将 {len(journals)} 条日记从 {JOURNALS_FILE} 导入 {DB_FILE}")
+
+
+def _row_to_journal(row: sqlite3.Row) -> Dict:
+    keys = row.keys()
+    journal = json.loads(row["extra"]) if "extra" in keys else {}
+    for column in keys:
+        if column == "extra":
+            continue
+        value = row[column]
+        if column in _JSON_COLUMNS:
+            value = json.loads(value) if value else []
+        elif value is None:
+            continue
+        journal[column] = value
+    return journal
+
+
+def _journal_to_row(journal: Dict) -> Tuple:
+    values = []
+    for column in _COLUMNS:
+        value = journal.get(column)
+        if column in _JSON_COLUMNS:
+            value = json.dumps(value or [], ensure_ascii=False)
+        elif column != "journal_image_path":
+            value = "" if value is None else str(value)
+        values.append(value)
+    extra = {k: v for k, v in journal.items() if k not in _COLUMNS}
+    values.append(json.dumps(extra, ensure_ascii=False))
+    return tuple(values)
+
+
+def _index_journal(conn: sqlite3.Connection, journal_id: str, journal: Dict):
+    conn.execute("DELETE FROM search_postings WHERE journal_id = ?", (journal_id,))
+    conn.executemany(
+        "INSERT INTO search_postings (token, journal_id, tf) VALUES (?, ?, ?)",
+        [(token, journal_id, tf) for token, tf in Counter(journal_tokens(journal)).items()]
+    )
+
+
+def _insert(conn: sqlite3.Connection, journal: Dict):
+    """写入（或覆盖）一条日记及其倒排列表，调用方负责事务"""
+    # UPSERT 保留原有行的 rowid（load_local_journals 按写入顺序返回）
+    conn.execute(
+        f"INSERT INTO journals ({', '.join(_COLUMNS)}, extra) "
+        f"VALUES ({', '.join('?' * (len(_COLUMNS) + 1))}) "
+        f"ON CONFLICT(id) DO UPDATE SET "
+        f"{', '.join(f'{column} = excluded.{column}' for column in _COLUMNS[1:] + ('extra',))}",
+        _journal_to_row(journal)
+    )
+    _index_journal(conn, str(journal.get("id", "")), journal)
+
+
+def load_local_journals() -> List[Dict]:
+    """加载所有日记条目（按写入顺序）"""
+    rows = _connect().execute("SELECT * FROM journals ORDER BY rowid").fetchall()
+    return [_row_to_journal(row) for row in rows]
+
+
+def save_local_journals(journals: List[Dict]):
+    """覆盖保存所有日记条目"""
+    conn = _connect()
+    with _write_transaction(conn):
+        conn.execute("DELETE FROM journals")
+        conn.execute("DELETE FROM search_postings")
+        for journal in journals:
+            _insert(conn, journal)
+
+
+def append_local_journal(journal_entry: Dict):
+    """追加一条日记条目"""
+    conn = _connect()
+    with _write_transaction(conn):
+        _insert(conn, journal_entry)
+
+
+def update_local_journal(journal_id: str, journal_entry: Dict) -> bool:
+    """替换一条日记条目，不存在返回False"""
+    conn = _connect()
+    with _write_transaction(conn):
+        if conn.execute("SELECT 1 FROM journals WHERE id = ?", (journal_id,)).fetchone() is None:
+            return False
+        _insert(conn, dict(journal_entry, id=journal_id))
+        return True
+
+
+def delete_local_journal(journal_id: str) -> bool:
+    """删除一条日记条目，不存在返回False"""
+    conn = _connect()
+    with _write_transaction(conn):
+        deleted = conn.execute("DELETE FROM journals WHERE id = ?", (journal_id,)).rowcount
+        conn.execute("DELETE FROM search_postings WHERE journal_id = ?", (journal_id,))
+        return deleted > 0
+
+
+def count_local_journals() -> int:
+    """日记条目总数"""
+    return _connect().execute("SELECT COUNT(*) FROM journals").fetchone()[0]
+
+
+def get_local_journal(journal_id: str) -> Optional[Dict]:
+    """按ID读取单条日记的完整内容，不存在返回None"""
+    row = _connect().execute("SELECT * FROM journals WHERE id = ?", (journal_id,)).fetchone()
+    return _row_to_journal(row) if row is not None else None
+
+
+def search_local_journals(keyword: str) -> Dict[str, float]:
+    """关键词检索：{日记ID: 相关度}（只读取查询词对应的倒排列表）"""
+    terms = query_terms(keyword)
+    if not terms:
+        return {}
+    conn = _connect()
+    frequencies = []
+    for term, prefix in terms:
+        if prefix:
+            # 前缀匹配：token 在 [term, term + 最大字符) 范围内，走主键索引
+            rows = conn.execute(
+                "SELECT journal_id, SUM(tf) FROM search_postings WHERE token >= ? AND token < ? "
+                "GROUP BY journal_id",
+                (term, term + "\U0010ffff")
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT journal_id, tf FROM search_postings WHERE token = ?", (term,)
+            ).fetchall()
+        frequencies.append({journal_id: tf for journal_id, tf in rows})
+    return combine_scores(frequencies)
+
+
+def _select_columns(fields: Optional[Sequence[str]]) -> str:
+    if fields is None:
+        return "*"
+    # 本地条目的手账图片保存在 journal_image_path 中
+    columns = [f for f in _COLUMNS if f in fields or f == "journal_image_path"]
+    if any(f not in _COLUMNS for f in fields):
+        # 其他字段（如 renditions）保存在 extra 中
+        columns.append("extra")
+    return ", ".join(columns)
+
+
+def _batched(values: List, size: int) -> Iterable[List]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def query_local_journals(keyword: Optional[str] = None, weather: Optional[str] = None,
+                         date_from: Optional[str] = None, date_to: Optional[str] = None,
+                         sort: Optional[str] = None, offset: int = 0,
+                         limit: Optional[int] = None,
+                         fields: Optional[Sequence[str]] = None) -> Tuple[List[Dict], int]:
+    """
+    按条件查询日记（参数与 supabase_config.query_journals_in_supabase 相同）
+
+    Returns:
+        (条目列表, 符合条件的总数)
+    """
+    conn = _connect()
+    conditions, params = [], []
+    if keyword and not query_terms(keyword):
+        # 表情、符号等切分不出检索词的查询（如"☀️"）按子串匹配日期、天气和文字（同 Supabase 的 ILIKE 查询）
+        substring = keyword.strip()
+        if substring:
+            conditions.append("(" + " OR ".join(f"instr({field}, ?) > 0" for field in SEARCH_FIELDS) + ")")
+            params.extend([substring] * len(SEARCH_FIELDS))
+        keyword = None
+    if weather and weather != ALL_WEATHER:
+        conditions.append("weather = ?")
+        params.append(weather)
+    if date_from:
+        conditions.append("date >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append("date <= ?")
+        params.append(date_to)
+    sort = effective_sort(sort, keyword)
+    order_by = ", ".join(f"{field} {'DESC' if descending else 'ASC'}" for field, descending in sort_fields(sort))
+    columns = _select_columns(fields)
+
+    if not keyword:
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        total = conn.execute(f"SELECT COUNT(*) FROM journals {where}", params).fetchone()[0]
+        sql = f"SELECT {columns} FROM journals {where} ORDER BY {order_by}"
+        page_params = list(params)
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            page_params += [limit, offset]
+        rows = conn.execute(sql, page_params).fetchall()
+        return [_row_to_journal(row) for row in rows], total
+
+    # 关键词检索：倒排列表得到候选ID，再按天气、日期筛选，在内存中排序（只读取排序用到的列）
+    scores = search_local_journals(keyword)
+    sort_values = {}
+    for batch in _batched(list(scores), _IN_BATCH):
+        batch_conditions = conditions + [f"id IN ({', '.join('?' * len(batch))})"]
+        for row in conn.execute(
+            f"SELECT id, date, created_at FROM journals WHERE {' AND '.join(batch_conditions)}", params + batch
+        ):
+            sort_values[row["id"]] = row
+    ordered_ids = list(sort_values)
+    # 稳定排序，从最后一个字段开始依次排序即得到多字段排序结果；按相关度时相关度相同的条目按默认排序
+    for field, descending in reversed(sort_fields(sort)):
+        ordered_ids.sort(key=lambda journal_id: sort_values[journal_id][field], reverse=descending)
+    if sort == RELEVANCE_SORT:
+        ordered_ids.sort(key=lambda journal_id: scores[journal_id], reverse=True)
+
+    total = len(ordered_ids)
+    page_ids = ordered_ids[offset:offset + limit] if limit is not None else ordered_ids
+    journals_by_id = {}
+    for batch in _batched(page_ids, _IN_BATCH):
+        for row in conn.execute(
+            f"SELECT {columns} FROM journals WHERE id IN ({', '.join('?' * len(batch))})", batch
+        ):
+            journals_by_id[row["id"]] = _row_to_journal(row)
+    return [journals_by_id[journal_id] for journal_id in page_ids if journal_id in journals_by_id], total
@@ -0,0 +1,89 @@
+"""
+氛围叠加层缓存
+背景雨图、雾气层等素材预处理（缩放 + 透明度调整）后缓存在进程内，
+新建和编辑手账共用同一份缓存；素材文件修改后自动失效
+"""
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image
+
+from compositing import cap_alpha, scale_alpha
+
+_lock = threading.Lock()
+# 键：(素材路径, 宽, 高, 透明度缩放, 透明度上限)；值：(mtime, 预处理好的RGBA图层)
+_overlay_cache: Dict[Tuple, Tuple[float, Image.Image]] = {}
+
+
+def _prepare_overlay(path: str, size: Tuple[int, int], alpha_scale: Optional[float],
+                     alpha_cap: Optional[int]) -> Image.Image:
+    """读取素材并生成可直接 alpha_composite 的RGBA图层"""
+    with Image.open(path) as src:
+        layer = src.convert("RGBA")
+    layer = layer.resize(size, Image.Resampling.LANCZOS)
+
+    if alpha_scale is not None:
+        scale_alpha(layer, alpha_scale)
+    if alpha_cap is not None:
+        cap_alpha(layer, alpha_cap)
+    return layer
+
+
+def get_overlay(path: str, width: int, height: int, alpha_scale: Optional[float] = None,
+                alpha_cap: Optional[int] = None) -> Optional[Image.Image]:
+    """
+    获取预处理好的叠加图层
+
+    Args:
+        path: 素材路径
+        width: 目标宽度
+        height: 目标高度
+        alpha_scale: 透明度缩放系数（如0.15）
+        alpha_cap: 透明度上限（如80）
+
+    Returns:
+        RGBA图层（共享对象，调用方不要原地修改），素材不存在或读取失败返回None
+    """
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    key = (os.path.abspath(path), width, height, alpha_scale, alpha_cap)
+    cached = _overlay_cache.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with _lock:
+        cached = _overlay_cache.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            layer = _prepare_overlay(path, (width, height), alpha_scale, alpha_cap)
+        except Exception as e:
+            print(f"加载叠加层失败 ({path}): {e}")
+            return None
+        _overlay_cache[key] = (mtime, layer)
+        return layer
+
+
+def overlay_fingerprint(paths: Iterable[str]) -> List:
+    """
+    素材文件的标识（路径、修改时间、文件大小；文件不存在时为None），用于渲染缓存键：
+    替换素材后缓存自动失效
+    """
+    fingerprint = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            fingerprint.append([path, stat.st_mtime, stat.st_size])
+        except OSError:
+            fingerprint.append([path, None, None])
+    return fingerprint
+
+
+def clear_overlay_cache():
+    """清空叠加层缓存"""
+    with _lock:
+        _overlay_cache.clear()
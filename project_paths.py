@@ -0,0 +1,23 @@
+"""
+项目目录
+素材、缓存和本地数据库都按项目根目录定位，不依赖启动时的当前目录
+（从其他目录运行 streamlit run /path/to/app.py 或 python /path/to/generator.py 时也能找到素材，
+不会在当前目录下另建一个 data/）
+
+日记条目中保存的本地图片路径（如 data/images/xxx.jpg）是相对于项目根目录的，
+入口（app.py、generator.py）启动时切换到项目根目录，见 use_project_root
+"""
+import os
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def project_path(*parts: str) -> str:
+    """项目根目录下的绝对路径"""
+    return os.path.join(PROJECT_ROOT, *parts)
+
+
+def use_project_root():
+    """把当前目录切换到项目根目录（日记条目中保存的相对路径据此解析）"""
+    if os.getcwd() != PROJECT_ROOT:
+        os.chdir(PROJECT_ROOT)
@@ -0,0 +1,97 @@
+"""
+手账页面渲染缓存
+以 (图片内容哈希, 文字, 日期, 天气, 尺寸, 种子, 渲染器版本, 背景ID, 字体和素材标识) 的哈希为键，
+缓存渲染完成的PNG：内存LRU淘汰，同时落盘到 data/render_cache；
+字体、素材文件按路径和修改时间参与计算，更换后自动失效，不需要手动递增渲染器版本
+"""
+import hashlib
+import json
+import threading
+from io import BytesIO
+from typing import Any, List, Optional, Tuple
+
+from PIL import Image
+
+from cache_store import DiskCache, LRUCache, TieredCache, env_megabytes
+from project_paths import project_path
+
+# 渲染逻辑改变（排版、特效、素材处理方式）时递增，使旧缓存失效（更换字体、素材文件不需要）
+RENDERER_VERSION = "2"
+
+RENDER_CACHE_DIR = project_path("data", "render_cache")
+
+_render_cache = TieredCache(
+    LRUCache(env_megabytes("RENDER_CACHE_MEMORY_MB", 64)),
+    DiskCache(RENDER_CACHE_DIR, env_megabytes("RENDER_CACHE_DISK_MB", 512), suffix=".png"),
+)
+# 按页面统计（内存或磁盘命中都算 page_hits；内存层LRU自身的 hits / misses 见 render_cache_stats）
+_stats_lock = threading.Lock()
+_stats = {"page_hits": 0, "page_misses": 0}
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def render_cache_key(image_hashes: List[str], text: str, date_str: str, weather: str,
+                     size: Tuple[int, int], seed: int, background_id: str, assets: Any = None) -> str:
+    """
+    计算渲染缓存键
+
+    Args:
+        image_hashes: 用户图片原始字节的SHA-256（按排版顺序）
+        text: 文字
+        date_str: 日期字符串
+        weather: 天气
+        size: 页面尺寸 (宽, 高)
+        seed: 渲染种子
+        background_id: 背景标识（默认背景或AI背景的prompt哈希）
+        assets: 字体和素材文件的标识（可JSON序列化，见 font_fingerprint / overlay_fingerprint）
+    """
+    payload = json.dumps({
+        "images": list(image_hashes),
+        "text": text or "",
+        "date": date_str or "",
+        "weather": weather or "",
+        "size": list(size),
+        "seed": seed,
+        "renderer": RENDERER_VERSION,
+        "background": background_id,
+        "assets": assets,
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_cached_page(key: str) -> Optional[Image.Image]:
+    """读取缓存的手账页面，未命中返回None"""
+    data = _render_cache.get(key)
+    if data is None:
+        _count("page_misses")
+        return None
+    try:
+        img = Image.open(BytesIO(data))
+        img.load()
+        page = img.convert("RGB")
+    except Exception as e:
+        print(f"渲染缓存损坏，已丢弃 ({key}): {e}")
+        _render_cache.delete(key)
+        _count("page_misses")
+        return None
+    _count("page_hits")
+    return page
+
+
+def put_cached_page(key: str, image: Image.Image):
+    """写入渲染缓存"""
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    _render_cache.put(key, buffer.getvalue())
+
+
+def render_cache_stats():
+    """内存层LRU的命中/未命中次数和当前占用，以及按页面的统计（page_hits / page_misses）"""
+    stats = _render_cache.memory.stats()
+    with _stats_lock:
+        stats.update(_stats)
+    return stats
@@ -0,0 +1,219 @@
+"""
+手账渲染服务
+手账合成是CPU密集的PIL处理，在Streamlit进程的线程中执行时多个会话争抢GIL，
+同时合成的整页RGBA画布和2K AI背景也会一起占用内存。
+合成改为在固定数量的工作进程中执行，并限制排队数量：
+    - 最多 RENDER_WORKERS 个手账同时合成，吞吐随CPU核数扩展，内存占用有上限
+    - 超出的请求按顺序排队，页面显示排队位置
+    - 排队数量达到 RENDER_QUEUE_LIMIT 时直接拒绝（RenderServiceBusy），不再无限堆积
+渲染缓存查询和AI背景（调用生图API并下载，主要是网络等待）在调用方的任务线程中完成，
+不占用渲染进程；只有图片预处理和合成交给渲染进程
+
+用法：
+    ticket = get_render_service().reserve()       # 页面线程中占位，队列已满时抛出 RenderServiceBusy
+    with ticket:
+        image = ticket.render(images, text, date_str, weather)
+
+环境变量：
+    RENDER_WORKERS: 渲染进程数（默认2）
+    RENDER_QUEUE_LIMIT: 所有渲染进程都在工作时最多排队的请求数（默认8）
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple
+
+from font_registry import resolve_cjk_font
+from jobs import Job, job_context, notify, set_job_stage
+from journal_renderer import compose_journal_page, fetch_page_background, get_planned_page, plan_journal_page
+
+try:
+    RENDER_WORKERS = max(1, int(os.getenv("RENDER_WORKERS", "2")))
+except ValueError:
+    RENDER_WORKERS = 2
+
+try:
+    RENDER_QUEUE_LIMIT = max(0, int(os.getenv("RENDER_QUEUE_LIMIT", "8")))
+except ValueError:
+    RENDER_QUEUE_LIMIT = 8
+
+
+class RenderServiceBusy(Exception):
+    """渲染队列已满"""
+
+    def __init__(self, queued: int):
+        super().__init__(f"手账渲染繁忙（已有 {queued} 个请求在排队），请稍后再试")
+        self.queued = queued
+
+
+def _init_worker():
+    # 每个渲染进程启动时解析一次中文字体
+    resolve_cjk_font()
+
+
+def _compose_in_worker(plan, ai_background) -> Tuple[object, List[Tuple[str, str]]]:
+    """在渲染进程中预处理图片并合成页面，提示信息随结果带回主进程"""
+    job = Job("render")
+    with job_context(job):
+        image = compose_journal_page(plan, ai_background)
+    return image, job.messages
+
+
+class RenderTicket:
+    """
+    渲染请求在服务中的占位
+    reserve() 时按顺序排队，render() 获取AI背景后等到有空闲的渲染进程再合成；离开 with 块时释放
+    """
+
+    def __init__(self, service: "RenderService"):
+        self._service = service
+        self.released = False
+
+    @property
+    def position(self) -> Optional[int]:
+        """排队位置（1表示有渲染进程空闲时下一个渲染），无需排队、已开始渲染或已释放时为None"""
+        return self._service.position(self)
+
+    def render(self, *args, **kwargs):
+        """渲染手账页面（参数同 journal_renderer.create_journal_page），阻塞直到完成"""
+        return self._service.render(self, args, kwargs)
+
+    def release(self):
+        self._service.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class RenderService:
+    """基于进程池的渲染服务（进程内共享一个，见 get_render_service）"""
+
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._cond = threading.Condition()
+        self._waiting: List[RenderTicket] = []
+        self._ready: List[RenderTicket] = []
+        self._running = 0
+
+    def reserve(self) -> RenderTicket:
+        """占一个渲染位置，所有渲染进程都在工作且排队已满时抛出 RenderServiceBusy"""
+        with self._cond:
+            free = max(0, self.workers - self._running)
+            if len(self._waiting) >= free + self.queue_limit:
+                raise RenderServiceBusy(max(0, len(self._waiting) - free))
+            ticket = RenderTicket(self)
+            self._waiting.append(ticket)
+            return ticket
+
+    def position(self, ticket: RenderTicket) -> Optional[int]:
+        with self._cond:
+            if ticket not in self._waiting:
+                return None
+            ahead = self._waiting.index(ticket) - max(0, self.workers - self._running)
+            return ahead + 1 if ahead >= 0 else None
+
+    def _acquire(self, ticket: RenderTicket):
+        """
+        等待空闲的渲染进程
+        只在已调用 render() 的请求之间按占位顺序分配：占位后尚未开始执行的请求
+        （如还在后台任务队列中）不会挡住后面的请求
+        """
+        with self._cond:
+            if ticket.released or ticket not in self._waiting:
+                raise RuntimeError("渲染位置已释放")
+            self._ready.append(ticket)
+            set_job_stage("queued")
+            while self._running >= self.workers or self._first_ready() is not ticket:
+                self._cond.wait()
+            self._ready.remove(ticket)
+            self._waiting.remove(ticket)
+            self._running += 1
+
+    def _first_ready(self) -> Optional[RenderTicket]:
+        for ticket in self._waiting:
+            if ticket in self._ready:
+                return ticket
+        return None
+
+    def render(self, ticket: RenderTicket, args, kwargs):
+        kwargs = dict(kwargs)
+        use_cache = kwargs.pop("use_cache", True)
+        plan = plan_journal_page(*args, **kwargs)
+        cached_page = get_planned_page(plan) if use_cache else None
+        if cached_page is not None:
+            return cached_page
+
+        # AI背景在当前任务线程中获取，等待网络时不占用渲染进程
+        ai_background = fetch_page_background(plan)
+
+        self._acquire(ticket)
+        set_job_stage("compositing")
+        try:
+            future = self._get_executor().submit(_compose_in_worker, plan, ai_background)
+            try:
+                image, messages = future.result()
+            except BrokenProcessPool:
+                # 渲染进程异常退出（如内存不足被终止），重建进程池，后续请求不受影响
+                self._reset_executor()
+                raise RuntimeError("渲染进程异常退出，请重试")
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._cond.notify_all()
+        for level, message in messages:
+            notify(level, message)
+        return image
+
+    def release(self, ticket: RenderTicket):
+        """释放占位（未渲染就结束的请求也要释放，否则一直占着队列）"""
+        with self._cond:
+            ticket.released = True
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+            if ticket in self._ready:
+                self._ready.remove(ticket)
+            self._cond.notify_all()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._cond:
+            if self._executor is None:
+                # 使用 spawn 启动渲染进程：主进程中已有线程池和网络连接，fork 后在子进程中不可用
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker
+                )
+            return self._executor
+
+    def _reset_executor(self):
+        with self._cond:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_service: Optional[RenderService] = None
+_service_lock = threading.Lock()
+
+
+def get_render_service() -> RenderService:
+    """获取进程级共享的渲染服务"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = RenderService(RENDER_WORKERS, RENDER_QUEUE_LIMIT)
+    return _service
+
+
+def render_journal_page(*args, **kwargs):
+    """占位并渲染手账页面（参数同 journal_renderer.create_journal_page），队列已满时抛出 RenderServiceBusy"""
+    with get_render_service().reserve() as ticket:
+        return ticket.render(*args, **kwargs)
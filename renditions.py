@@ -0,0 +1,119 @@
+"""
+图片的展示尺寸副本（rendition）
+保存手账时为手账图片和上传的原图生成缩小的副本，页面按显示宽度选用最小的合适副本，
+浏览器不再下载整张 1200x1600 的手账或手机原图，Streamlit 也不用在每次rerun时重新编码大图
+
+副本信息保存在日记条目的 renditions 字段中：
+    {
+        "page": {"thumb": ..., "book": ..., "full": ...},      # 手账图片
+        "images": {原图路径或URL: {"thumb": ..., "full": ...}}  # 上传的原图
+    }
+"""
+import os
+from typing import Callable, Dict, Iterable, Optional
+from urllib.parse import urlparse
+
+from PIL import Image
+
+from image_encoding import EncodedImage, encode_image
+
+# 副本名称 -> 最大宽度（像素）；full 为原图
+RENDITION_WIDTHS = {
+    "thumb": 320,
+    "book": 800,
+}
+# 按2倍像素密度选择副本，高分屏上也清晰
+RENDITION_DENSITY = 2
+# 副本固定使用JPEG（缩略图不需要透明度，浏览器兼容性最好）
+RENDITION_FORMAT = "JPEG"
+RENDITION_QUALITY = 85
+RENDITIONS_FOLDER = "renditions"
+
+# 保存副本的函数：(编码后的字节, 文件名) -> 存储位置（路径或URL），失败返回None
+RenditionStore = Callable[[bytes, str], Optional[str]]
+
+
+def make_rendition(image: Image.Image, width: int) -> Image.Image:
+    """按最大宽度等比缩小（不放大），返回RGB图片"""
+    rendition = image.convert("RGB") if image.mode != "RGB" else image.copy()
+    if rendition.width > width:
+        height = max(1, round(rendition.height * width / rendition.width))
+        rendition = rendition.resize((width, height), Image.Resampling.LANCZOS)
+    return rendition
+
+
+def encode_rendition(image: Image.Image) -> EncodedImage:
+    return encode_image(image, RENDITION_FORMAT, quality=RENDITION_QUALITY, log=False)
+
+
+def rendition_filename(location: str, kind: str, extension: str) -> str:
+    """副本文件名：原文件名加上副本名称，如 journal_xxx_thumb.jpg"""
+    base = os.path.splitext(os.path.basename(urlparse(location).path))[0] or "image"
+    return f"{base}_{kind}{extension}"
+
+
+def create_renditions(image: Image.Image, location: str, store: RenditionStore,
+                      kinds: Iterable[str] = ("thumb", "book")) -> Dict[str, str]:
+    """
+    生成并保存副本
+
+    Args:
+        image: 原图
+        location: 原图的存储位置（作为 full，并用于生成副本文件名）
+        store: 保存副本的函数
+        kinds: 需要生成的副本（比原图还宽的副本不生成）
+
+    Returns:
+        {副本名称: 存储位置}，始终包含 full
+    """
+    renditions = {"full": location}
+    for kind in kinds:
+        width = RENDITION_WIDTHS[kind]
+        if image.width <= width:
+            continue
+        try:
+            encoded = encode_rendition(make_rendition(image, width))
+            stored = store(encoded.data, rendition_filename(location, kind, encoded.extension))
+        except Exception as e:
+            print(f"生成图片副本失败 ({location}, {kind}): {e}")
+            continue
+        if stored:
+            renditions[kind] = stored
+    return renditions
+
+
+def _available(location: Optional[str]) -> bool:
+    if not location:
+        return False
+    return location.startswith(("http://", "https://")) or os.path.exists(location)
+
+
+def pick_rendition(renditions: Optional[Dict[str, str]], original: str, display_width: int) -> str:
+    """
+    选择能清晰显示在 display_width 宽度下的最小副本，没有合适的副本时返回原图
+
+    Args:
+        renditions: {副本名称: 存储位置}（旧日记没有副本时为None）
+        original: 原图的存储位置
+        display_width: 页面上的显示宽度（像素）
+    """
+    if renditions:
+        needed = display_width * RENDITION_DENSITY
+        for kind, width in sorted(RENDITION_WIDTHS.items(), key=lambda item: item[1]):
+            if width >= needed and _available(renditions.get(kind)):
+                return renditions[kind]
+    return original
+
+
+def page_rendition(journal: Dict, display_width: int) -> Optional[str]:
+    """日记的手账图片在给定显示宽度下使用的副本（没有手账图片返回None）"""
+    original = journal.get("journal_image_path") or journal.get("journal_image_url")
+    if not original:
+        return None
+    return pick_rendition((journal.get("renditions") or {}).get("page"), original, display_width)
+
+
+def image_rendition(journal: Dict, original: str, display_width: int) -> str:
+    """日记中一张上传原图在给定显示宽度下使用的副本"""
+    images = (journal.get("renditions") or {}).get("images") or {}
+    return pick_rendition(images.get(original), original, display_width)
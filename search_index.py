@@ -0,0 +1,101 @@
+"""
+日记全文检索的分词与排序
+中文（以及日文、韩文）没有空格分词，按字切分：每个汉字作为单字词，相邻两字作为双字词；
+英文和数字按词切分并转为小写，查询时按前缀匹配。
+
+Supabase 中把分词结果写入 search_tokens 列，由 tsvector + GIN 索引检索（见 supabase_setup.sql），
+本地模式使用同一套分词和匹配规则，倒排列表保存在本地数据库中（见 local_store），两种模式的搜索结果一致。
+"""
+import math
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from journal_query import SEARCH_FIELDS
+
+# 按字切分的文字范围：CJK统一汉字（含扩展A、兼容汉字）、日文假名、韩文音节
+_CJK_CHARS = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3040-\u30ff\uac00-\ud7af"
+_TOKEN_RE = re.compile(f"([{_CJK_CHARS}]+)|([0-9A-Za-z\u00c0-\u024f]+)")
+
+
+def _cjk_grams(run: str) -> List[str]:
+    """一段连续汉字的单字词和双字词"""
+    grams = list(run)
+    grams.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return grams
+
+
+def tokenize(text: str) -> List[str]:
+    """把文本切分为索引词（保留重复，用于计算词频）"""
+    tokens = []
+    for cjk, word in _TOKEN_RE.findall(text or ""):
+        if cjk:
+            tokens.extend(_cjk_grams(cjk))
+        else:
+            tokens.append(word.lower())
+    return tokens
+
+
+def query_terms(query: str) -> List[Tuple[str, bool]]:
+    """
+    把查询切分为检索词
+
+    Returns:
+        [(词, 是否前缀匹配), ...]，已去重；汉字按相邻两字组成双字词（单字查询用单字词），
+        英文和数字按前缀匹配
+    """
+    terms = []
+    for cjk, word in _TOKEN_RE.findall(query or ""):
+        if cjk:
+            grams = [cjk] if len(cjk) == 1 else [cjk[i:i + 2] for i in range(len(cjk) - 1)]
+            terms.extend((gram, False) for gram in grams)
+        else:
+            terms.append((word.lower(), True))
+    return list(dict.fromkeys(terms))
+
+
+def journal_tokens(journal: Dict) -> List[str]:
+    """日记条目的索引词（日期、天气、文字内容）"""
+    tokens = []
+    for field in SEARCH_FIELDS:
+        tokens.extend(tokenize(str(journal.get(field) or "")))
+    return tokens
+
+
+def search_document(journal: Dict) -> str:
+    """写入 search_tokens 列的文本（索引词以空格分隔，供 to_tsvector('simple', ...) 使用）"""
+    return " ".join(journal_tokens(journal))
+
+
+def to_tsquery(query: str) -> Optional[str]:
+    """把查询转换为 to_tsquery('simple', ...) 的查询串（所有检索词都需命中），没有检索词返回None"""
+    terms = query_terms(query)
+    if not terms:
+        return None
+    return " & ".join(f"{term}:*" if prefix else term for term, prefix in terms)
+
+
+def combine_scores(term_frequencies: Iterable[Dict[str, int]]) -> Dict[str, float]:
+    """
+    合并各检索词的倒排列表：所有检索词都命中的日记及其相关度
+    （按词频累加 log(1+tf)，与 ts_rank 一样词频越高越相关）
+
+    Args:
+        term_frequencies: 每个检索词一项，{日记ID: 词频}（前缀匹配的词频为所有匹配索引词之和）
+
+    Returns:
+        {日记ID: 相关度}，没有检索词时为空
+    """
+    scores: Optional[Dict[str, float]] = None
+    # 先处理命中条目少的检索词，尽早缩小候选集合
+    for frequencies in sorted(term_frequencies, key=len):
+        if scores is None:
+            scores = {doc_id: math.log1p(tf) for doc_id, tf in frequencies.items()}
+        else:
+            scores = {
+                doc_id: relevance + math.log1p(frequencies[doc_id])
+                for doc_id, relevance in scores.items()
+                if doc_id in frequencies
+            }
+        if not scores:
+            return {}
+    return scores or {}
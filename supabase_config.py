@@ -2,31 +2,102 @@
 Supabase 配置和工具函数
 用于替代本地文件存储
 """
+import mimetypes
 import os
+import threading
+import time
+from urllib.parse import unquote, urlparse
 from supabase import create_client, Client
-from typing import List, Dict, Optional
+from typing import Any, Callable, List, Dict, Optional, Sequence, Set, Tuple
 import base64
-from io import BytesIO
 from PIL import Image
 
+from image_encoding import encode_image
+from journal_query import ALL_WEATHER, SEARCH_FIELDS, effective_sort, project, sort_fields
+from search_index import search_document, to_tsquery
+
+# httpx 是 supabase 客户端使用的HTTP库，用于识别连接层错误
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
 # 从环境变量获取Supabase配置
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 SUPABASE_BUCKET = "journal-images"  # Storage bucket名称
 
-def get_supabase_client() -> Optional[Client]:
-    """获取Supabase客户端"""
-    if not SUPABASE_URL or not SUPABASE_KEY:
-        return None
+# 客户端空闲超过该时长（秒）后，下次使用前先做一次健康检查
+try:
+    SUPABASE_HEALTH_CHECK_SECONDS = max(0.0, float(os.getenv("SUPABASE_HEALTH_CHECK_SECONDS", "60")))
+except ValueError:
+    SUPABASE_HEALTH_CHECK_SECONDS = 60.0
+
+# 进程级共享的客户端（Streamlit rerun 不会重新导入本模块，连接在多次rerun和多个会话间复用）
+_client_lock = threading.Lock()
+_client: Optional[Client] = None
+_client_last_used = 0.0
+
+# 数据库是否已创建全文检索的列和函数（None: 未知，False: 缺失，使用ILIKE查询）
+_search_schema_available: Optional[bool] = None
+
+# 新版 supabase_setup.sql 增加的列；旧数据库缺少时，写入和查询自动去掉这些列
+OPTIONAL_COLUMNS = ("search_tokens", "renditions")
+_missing_columns: Set[str] = set()
+
+def _is_connection_error(error: Exception) -> bool:
+    """是否为连接层错误（连接断开、超时等），这类错误需要重建客户端"""
+    if httpx is not None and isinstance(error, httpx.TransportError):
+        return True
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+def _check_client_health(client: Client) -> bool:
+    """发送一个最小查询确认连接可用"""
     try:
-        return create_client(SUPABASE_URL, SUPABASE_KEY)
+        client.table("journals").select("id").limit(1).execute()
+        return True
     except Exception as e:
-        print(f"Supabase客户端创建失败: {e}")
+        print(f"Supabase连接检查失败: {e}")
+        return False
+
+def reset_supabase_client():
+    """丢弃当前客户端，下次使用时重新创建（重新建立连接）"""
+    global _client
+    with _client_lock:
+        _client = None
+
+def _handle_client_error(error: Exception):
+    """操作失败时调用：连接层错误会丢弃客户端，下次调用自动重连"""
+    if _is_connection_error(error):
+        reset_supabase_client()
+
+def get_supabase_client() -> Optional[Client]:
+    """
+    获取Supabase客户端（进程内共享，首次调用时创建）
+    客户端空闲超过 SUPABASE_HEALTH_CHECK_SECONDS 后先检查连接，失败则重新创建
+    """
+    global _client, _client_last_used
+    if not SUPABASE_URL or not SUPABASE_KEY:
         return None
+    
+    with _client_lock:
+        now = time.monotonic()
+        if _client is not None and now - _client_last_used > SUPABASE_HEALTH_CHECK_SECONDS:
+            if not _check_client_health(_client):
+                _client = None
+        if _client is None:
+            try:
+                _client = create_client(SUPABASE_URL, SUPABASE_KEY)
+            except Exception as e:
+                print(f"Supabase客户端创建失败: {e}")
+                return None
+        _client_last_used = now
+        return _client
 
 def upload_image_to_supabase(image: Image.Image, filename: str, folder: str = "journals") -> Optional[str]:
     """
     上传图片到Supabase Storage
+    按 image_encoding 的配置编码（JOURNAL_IMAGE_FORMAT 等），文件扩展名替换为对应格式的扩展名
     
     Args:
         image: PIL Image对象
@@ -41,19 +112,16 @@ def upload_image_to_supabase(image: Image.Image, filename: str, folder: str = "j
         return None
     
     try:
-        # 将PIL Image转换为bytes
-        buffer = BytesIO()
-        image.save(buffer, format="PNG")
-        image_bytes = buffer.getvalue()
+        encoded = encode_image(image)
         
         # 构建存储路径
-        storage_path = f"{folder}/{filename}"
+        storage_path = f"{folder}/{os.path.splitext(filename)[0]}{encoded.extension}"
         
         # 上传到Supabase Storage
         response = client.storage.from_(SUPABASE_BUCKET).upload(
             path=storage_path,
-            file=image_bytes,
-            file_options={"content-type": "image/png", "upsert": "true"}
+            file=encoded.data,
+            file_options={"content-type": encoded.content_type, "upsert": "true"}
         )
         
         # 获取公开URL
@@ -61,17 +129,20 @@ def upload_image_to_supabase(image: Image.Image, filename: str, folder: str = "j
         return public_url
         
     except Exception as e:
+        _handle_client_error(e)
         print(f"图片上传失败: {e}")
         return None
 
-def upload_file_to_supabase(file_bytes: bytes, filename: str, folder: str = "uploads") -> Optional[str]:
+def upload_file_to_supabase(file_bytes: bytes, filename: str, folder: str = "uploads",
+                            content_type: Optional[str] = None) -> Optional[str]:
     """
-    上传文件到Supabase Storage（用于用户上传的原始图片）
+    上传文件到Supabase Storage（用于用户上传的原始图片和已编码的图片）
     
     Args:
         file_bytes: 文件字节数据
         filename: 文件名
         folder: 存储文件夹
+        content_type: 文件类型（默认根据扩展名推断）
     
     Returns:
         图片的公开URL，失败返回None
@@ -84,9 +155,8 @@ def upload_file_to_supabase(file_bytes: bytes, filename: str, folder: str = "upl
         storage_path = f"{folder}/{filename}"
         
         # 根据文件扩展名确定content-type
-        content_type = "image/jpeg"
-        if filename.lower().endswith(".png"):
-            content_type = "image/png"
+        if content_type is None:
+            content_type = mimetypes.guess_type(filename)[0] or "image/jpeg"
         
         response = client.storage.from_(SUPABASE_BUCKET).upload(
             path=storage_path,
@@ -98,9 +168,41 @@ def upload_file_to_supabase(file_bytes: bytes, filename: str, folder: str = "upl
         return public_url
         
     except Exception as e:
+        _handle_client_error(e)
         print(f"文件上传失败: {e}")
         return None
 
+def storage_path_from_url(url: str) -> Optional[str]:
+    """
+    从公开URL中取出文件在Storage bucket中的路径（如 journals/journal_xxx.png），
+    不是本项目bucket的公开URL时返回None
+    """
+    marker = f"/object/public/{SUPABASE_BUCKET}/"
+    path = urlparse(url).path
+    if marker not in path:
+        return None
+    return unquote(path.split(marker, 1)[1]) or None
+
+def delete_file_from_supabase(url: str) -> bool:
+    """
+    按公开URL删除Storage中的文件
+    
+    Returns:
+        是否删除成功（不是本项目bucket的URL返回False）
+    """
+    storage_path = storage_path_from_url(url)
+    client = get_supabase_client()
+    if not client or not storage_path:
+        return False
+    
+    try:
+        client.storage.from_(SUPABASE_BUCKET).remove([storage_path])
+        return True
+    except Exception as e:
+        _handle_client_error(e)
+        print(f"删除文件失败: {e}")
+        return False
+
 def load_journals_from_supabase() -> List[Dict]:
     """从Supabase加载所有日记条目"""
     client = get_supabase_client()
@@ -111,9 +213,238 @@ def load_journals_from_supabase() -> List[Dict]:
         response = client.table("journals").select("*").order("created_at", desc=True).execute()
         return response.data if response.data else []
     except Exception as e:
+        _handle_client_error(e)
         print(f"加载日记失败: {e}")
         return []
 
+def _require_client() -> Client:
+    """获取客户端，不可用时抛出 ConnectionError（读取类查询由调用方降级到本地存储）"""
+    client = get_supabase_client()
+    if not client:
+        raise ConnectionError("Supabase客户端不可用")
+    return client
+
+def count_journals_in_supabase() -> int:
+    """
+    日记条目总数（只取计数，不返回数据）
+    
+    Raises:
+        查询失败时抛出异常（调用方据此降级到本地存储，而不是当作0条）
+    """
+    client = _require_client()
+    try:
+        response = client.table("journals").select("id", count="exact").limit(1).execute()
+        return response.count or 0
+    except Exception as e:
+        _handle_client_error(e)
+        print(f"统计日记数量失败: {e}")
+        raise
+
+def _quote_filter_value(value: str) -> str:
+    """PostgREST or_ 条件中的值加双引号，避免逗号、括号等保留字符破坏查询"""
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+def query_journals_in_supabase(keyword: Optional[str] = None, weather: Optional[str] = None,
+                               date_from: Optional[str] = None, date_to: Optional[str] = None,
+                               sort: Optional[str] = None, offset: int = 0,
+                               limit: Optional[int] = None,
+                               fields: Optional[Sequence[str]] = None) -> Tuple[List[Dict], int]:
+    """
+    按条件查询日记：关键词、天气、日期范围、排序和分页组合成一个查询，
+    当前页条目与符合条件的总数在同一次请求中返回
+    
+    Args:
+        keyword: 关键词（全文检索日期、天气和文字内容，分词规则见 search_index）
+        weather: 天气（None 或 "全部" 表示不筛选）
+        date_from: 起始日期（含，格式同 JOURNAL_DATE_FORMAT）
+        date_to: 结束日期（含）
+        sort: 排序方式（见 journal_query.SORT_ORDERS；有关键词且未指定时按相关度排序）
+        offset: 跳过的条目数（仅在指定 limit 时生效）
+        limit: 返回条目数（None 表示不分页）
+        fields: 返回的字段（None 表示全部字段，列表展示使用 journal_query.LIST_FIELDS）
+    
+    Returns:
+        (条目列表, 符合条件的总数)
+    
+    Raises:
+        查询失败时抛出异常（调用方据此降级到本地存储，而不是当作没有匹配的记录）
+    """
+    client = _require_client()
+    
+    ts_query = to_tsquery(keyword) if keyword else None
+    if keyword and ts_query is None:
+        # 表情、符号等切分不出检索词的查询（如"☀️"）不走全文检索，按子串匹配（ILIKE）
+        keyword = keyword.strip() or None
+    if ts_query is not None and _search_schema_available is not False:
+        try:
+            return _search_journals_rpc(client, ts_query, weather, date_from, date_to,
+                                        effective_sort(sort, keyword), offset, limit, fields)
+        except Exception as e:
+            _handle_client_error(e)
+            if _is_connection_error(e):
+                print(f"查询日记失败: {e}")
+                raise
+            if _is_missing_search_schema(e):
+                # 数据库尚未创建全文检索函数（未执行新版 supabase_setup.sql），之后都改用 ILIKE 查询
+                _mark_search_schema_unavailable(e)
+            else:
+                print(f"全文检索失败，改用ILIKE查询: {e}")
+    
+    try:
+        return _retry_without_missing_columns(
+            lambda: _query_journals(client, keyword, weather, date_from, date_to, sort, offset, limit, fields)
+        )
+    except Exception as e:
+        _handle_client_error(e)
+        print(f"查询日记失败: {e}")
+        raise
+
+def _query_journals(client: Client, keyword: Optional[str], weather: Optional[str], date_from: Optional[str],
+                    date_to: Optional[str], sort: Optional[str], offset: int, limit: Optional[int],
+                    fields: Optional[Sequence[str]]) -> Tuple[List[Dict], int]:
+    """用表查询实现的条件查询（关键词使用ILIKE匹配）"""
+    columns = ",".join(f for f in fields if f not in _missing_columns) if fields else "*"
+    query = client.table("journals").select(columns, count="exact")
+    if keyword:
+        pattern = _quote_filter_value(f"%{keyword}%")
+        query = query.or_(",".join(f"{field}.ilike.{pattern}" for field in SEARCH_FIELDS))
+    if weather and weather != ALL_WEATHER:
+        query = query.eq("weather", weather)
+    if date_from:
+        query = query.gte("date", date_from)
+    if date_to:
+        query = query.lte("date", date_to)
+    for field, descending in sort_fields(sort):
+        query = query.order(field, desc=descending)
+    if limit is not None:
+        query = query.range(offset, offset + limit - 1)
+    response = query.execute()
+    return (response.data or []), (response.count or 0)
+
+def _search_journals_rpc(client: Client, ts_query: str, weather: Optional[str], date_from: Optional[str],
+                         date_to: Optional[str], sort: str, offset: int, limit: Optional[int],
+                         fields: Optional[Sequence[str]]) -> Tuple[List[Dict], int]:
+    """调用数据库中的 search_journals 函数（tsvector + GIN 索引检索，按相关度排序并分页）"""
+    params = {
+        "query_text": ts_query,
+        "weather_filter": weather if weather and weather != ALL_WEATHER else None,
+        "date_from": date_from,
+        "date_to": date_to,
+        "sort_order": sort,
+        "result_offset": offset if limit is not None else 0,
+        "result_limit": limit,
+        # 列表展示不需要文字内容，不返回以减小响应
+        "with_text": fields is None or "text" in fields,
+    }
+    rows = client.rpc("search_journals", params).execute().data or []
+    if rows:
+        total = rows[0]["total_count"]
+    elif params["result_offset"] > 0:
+        # 页码超出范围时当前页没有数据，单独取一次总数
+        first = client.rpc("search_journals", dict(params, result_offset=0, result_limit=1)).execute().data
+        total = first[0]["total_count"] if first else 0
+    else:
+        total = 0
+    
+    journals = []
+    for row in rows:
+        row.pop("rank", None)
+        row.pop("total_count", None)
+        journals.append(project(row, fields))
+    return journals, total
+
+def _missing_optional_column(error: Exception) -> Optional[str]:
+    """错误是否由数据库缺少某个可选列引起，返回该列名"""
+    message = str(error)
+    for column in OPTIONAL_COLUMNS:
+        if column in message and column not in _missing_columns:
+            return column
+    return None
+
+def _retry_without_missing_columns(operation: Callable[[], Any]) -> Any:
+    """执行操作；因数据库缺少可选列失败时，记录该列并去掉它重试"""
+    while True:
+        try:
+            return operation()
+        except Exception as e:
+            column = _missing_optional_column(e)
+            if column is None:
+                raise
+            _missing_columns.add(column)
+            print(f"Supabase数据库缺少 {column} 列，已忽略（请执行最新的 supabase_setup.sql）: {e}")
+            if column == "search_tokens":
+                _mark_search_schema_unavailable(e)
+
+def _without_missing_columns(journal_data: Dict) -> Dict:
+    return {k: v for k, v in journal_data.items() if k not in _missing_columns}
+
+def _mark_search_schema_unavailable(error: Exception):
+    """记录数据库缺少全文检索的列或函数，之后直接使用兼容方式，不再重复尝试"""
+    global _search_schema_available
+    if _search_schema_available is not False:
+        print(f"Supabase全文检索不可用，使用ILIKE查询（请执行最新的 supabase_setup.sql）: {error}")
+    _search_schema_available = False
+
+def _with_search_document(journal_data: Dict) -> Dict:
+    """写入日期、天气和文字内容时附带分词结果（search_tokens 列，用于全文检索）"""
+    if "search_tokens" in _missing_columns or not all(field in journal_data for field in SEARCH_FIELDS):
+        return journal_data
+    return dict(journal_data, search_tokens=search_document(journal_data))
+
+def _is_missing_search_schema(error: Exception) -> bool:
+    return "search_tokens" in str(error) or "search_journals" in str(error)
+
+def backfill_search_tokens(batch_size: int = 200) -> int:
+    """
+    为已有的日记补充分词结果（执行新版 supabase_setup.sql 后运行一次）
+    
+    Returns:
+        更新的条目数
+    """
+    client = get_supabase_client()
+    if not client:
+        return 0
+    
+    updated = 0
+    try:
+        while True:
+            response = (
+                client.table("journals")
+                .select("id,date,weather,text")
+                .is_("search_tokens", "null")
+                .limit(batch_size)
+                .execute()
+            )
+            rows = response.data or []
+            if not rows:
+                return updated
+            for row in rows:
+                client.table("journals").update(
+                    {"search_tokens": search_document(row)}
+                ).eq("id", row["id"]).execute()
+                updated += 1
+    except Exception as e:
+        _handle_client_error(e)
+        print(f"补充分词结果失败: {e}")
+        return updated
+
+def get_journal_from_supabase(journal_id: str) -> Optional[Dict]:
+    """
+    按ID读取单条日记的完整内容，不存在返回None
+    
+    Raises:
+        查询失败时抛出异常（调用方据此降级到本地存储）
+    """
+    client = _require_client()
+    try:
+        response = client.table("journals").select("*").eq("id", journal_id).limit(1).execute()
+        return response.data[0] if response.data else None
+    except Exception as e:
+        _handle_client_error(e)
+        print(f"读取日记失败: {e}")
+        raise
+
 def save_journal_to_supabase(journal_data: Dict) -> Optional[str]:
     """
     保存日记条目到Supabase
@@ -129,11 +460,15 @@ def save_journal_to_supabase(journal_data: Dict) -> Optional[str]:
         return None
     
     try:
-        response = client.table("journals").insert(journal_data).execute()
+        journal_data = _with_search_document(journal_data)
+        response = _retry_without_missing_columns(
+            lambda: client.table("journals").insert(_without_missing_columns(journal_data)).execute()
+        )
         if response.data and len(response.data) > 0:
             return response.data[0]["id"]
         return None
     except Exception as e:
+        _handle_client_error(e)
         print(f"保存日记失败: {e}")
         return None
 
@@ -144,9 +479,13 @@ def update_journal_in_supabase(journal_id: str, journal_data: Dict) -> bool:
         return False
     
     try:
-        response = client.table("journals").update(journal_data).eq("id", journal_id).execute()
+        journal_data = _with_search_document(journal_data)
+        response = _retry_without_missing_columns(
+            lambda: client.table("journals").update(_without_missing_columns(journal_data)).eq("id", journal_id).execute()
+        )
         return True
     except Exception as e:
+        _handle_client_error(e)
         print(f"更新日记失败: {e}")
         return False
 
@@ -162,59 +501,22 @@ def delete_journal_from_supabase(journal_id: str) -> bool:
         response = client.table("journals").delete().eq("id", journal_id).execute()
         return True
     except Exception as e:
+        _handle_client_error(e)
         print(f"删除日记失败: {e}")
         return False
 
 def search_journals_in_supabase(query: str) -> List[Dict]:
-    """搜索日记（按日期、天气或文字内容）"""
-    client = get_supabase_client()
-    if not client:
-        return []
-    
+    """搜索日记（按日期、天气或文字内容），失败返回空列表"""
     try:
-        # 使用PostgreSQL的ILIKE进行模糊搜索
-        # Supabase Python客户端使用不同的语法
-        response = client.table("journals").select("*").or_(
-            f"date.ilike.%{query}%,weather.ilike.%{query}%,text.ilike.%{query}%"
-        ).order("created_at", desc=True).execute()
-        return response.data if response.data else []
-    except Exception as e:
-        # 如果or_语法不支持，使用多个查询然后合并
-        try:
-            results = []
-            # 分别搜索每个字段
-            for field in ["date", "weather", "text"]:
-                field_response = client.table("journals").select("*").ilike(field, f"%{query}%").execute()
-                if field_response.data:
-                    results.extend(field_response.data)
-            
-            # 去重（基于id）
-            seen_ids = set()
-            unique_results = []
-            for item in results:
-                if item["id"] not in seen_ids:
-                    seen_ids.add(item["id"])
-                    unique_results.append(item)
-            
-            # 按创建时间排序
-            unique_results.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-            return unique_results
-        except Exception as e2:
-            print(f"搜索日记失败: {e2}")
-            return []
+        journals, _ = query_journals_in_supabase(keyword=query)
+    except Exception:
+        return []
+    return journals
 
 def filter_journals_by_weather(weather: str) -> List[Dict]:
-    """按天气筛选日记"""
-    client = get_supabase_client()
-    if not client:
-        return []
-    
+    """按天气筛选日记，失败返回空列表"""
     try:
-        if weather == "全部":
-            return load_journals_from_supabase()
-        response = client.table("journals").select("*").eq("weather", weather).order("created_at", desc=True).execute()
-        return response.data if response.data else []
-    except Exception as e:
-        print(f"筛选日记失败: {e}")
+        journals, _ = query_journals_in_supabase(weather=weather)
+    except Exception:
         return []
-
+    return journals
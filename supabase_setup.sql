@@ -33,10 +33,76 @@ CREATE TRIGGER update_journals_updated_at
     FOR EACH ROW 
     EXECUTE FUNCTION update_updated_at_column();
 
--- 4. 启用 Row Level Security (RLS) - 可选，如果只需要个人使用可以关闭
+-- 4. 图片副本
+-- 保存手账时生成的缩小副本（缩略图、手账本视图尺寸）的地址，结构见 renditions.py
+ALTER TABLE journals ADD COLUMN IF NOT EXISTS renditions JSONB;
+
+-- 5. 全文检索
+-- search_tokens 由应用写入：汉字按单字和相邻双字切分，英文和数字按词切分（见 search_index.py），
+-- 以空格分隔后用 'simple' 配置生成 tsvector，GIN 索引使搜索耗时不随日记数量线性增长。
+-- 已有数据库执行本段后，运行一次以下命令为旧日记补充分词结果：
+--   python -c "from supabase_config import backfill_search_tokens; print(backfill_search_tokens())"
+ALTER TABLE journals ADD COLUMN IF NOT EXISTS search_tokens TEXT;
+ALTER TABLE journals ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+    GENERATED ALWAYS AS (to_tsvector('simple', COALESCE(search_tokens, ''))) STORED;
+CREATE INDEX IF NOT EXISTS idx_journals_search_vector ON journals USING GIN (search_vector);
+
+-- 检索函数：关键词、天气、日期范围、排序和分页在一次调用中完成，
+-- 每行附带相关度（rank）和符合条件的总数（total_count）
+-- 返回列有变化时 CREATE OR REPLACE 无法覆盖，先删除旧版本
+DROP FUNCTION IF EXISTS search_journals(TEXT, TEXT, TEXT, TEXT, TEXT, INTEGER, INTEGER, BOOLEAN);
+CREATE OR REPLACE FUNCTION search_journals(
+    query_text TEXT,
+    weather_filter TEXT DEFAULT NULL,
+    date_from TEXT DEFAULT NULL,
+    date_to TEXT DEFAULT NULL,
+    sort_order TEXT DEFAULT 'relevance',
+    result_offset INTEGER DEFAULT 0,
+    result_limit INTEGER DEFAULT NULL,
+    with_text BOOLEAN DEFAULT TRUE
+)
+RETURNS TABLE (
+    id UUID,
+    date TEXT,
+    weather TEXT,
+    text TEXT,
+    image_paths TEXT[],
+    journal_image_url TEXT,
+    renditions JSONB,
+    created_at TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE,
+    rank REAL,
+    total_count BIGINT
+) AS $$
+    WITH matched AS (
+        SELECT j.*, ts_rank(j.search_vector, to_tsquery('simple', query_text)) AS rank
+        FROM journals j
+        WHERE j.search_vector @@ to_tsquery('simple', query_text)
+          AND (weather_filter IS NULL OR j.weather = weather_filter)
+          AND (date_from IS NULL OR j.date >= date_from)
+          AND (date_to IS NULL OR j.date <= date_to)
+    )
+    SELECT m.id, m.date, m.weather,
+           CASE WHEN with_text THEN m.text END,
+           m.image_paths, m.journal_image_url, m.renditions, m.created_at, m.updated_at,
+           m.rank, COUNT(*) OVER ()
+    FROM matched m
+    ORDER BY
+        CASE WHEN sort_order = 'relevance' THEN m.rank END DESC NULLS LAST,
+        CASE WHEN sort_order = 'date_desc' THEN m.date END DESC,
+        CASE WHEN sort_order = 'date_asc' THEN m.date END ASC,
+        CASE WHEN sort_order IN ('date_asc', 'created_at_asc') THEN m.created_at END ASC,
+        CASE WHEN sort_order = 'created_at_asc' THEN m.id END ASC,
+        m.created_at DESC,
+        m.id DESC
+    OFFSET result_offset
+    LIMIT result_limit;
+$$ LANGUAGE sql STABLE;
+
+-- 6. 启用 Row Level Security (RLS) - 可选，如果只需要个人使用可以关闭
 -- ALTER TABLE journals ENABLE ROW LEVEL SECURITY;
 
--- 5. 如果需要公开访问（个人使用），可以创建策略
+-- 7. 如果需要公开访问（个人使用），可以创建策略
 -- CREATE POLICY "Allow all operations for authenticated users" ON journals
 --     FOR ALL USING (true);
 
@@ -0,0 +1,79 @@
+"""
+共享网络客户端：连接池复用（本地HTTP服务）与 Ark 客户端复用
+"""
+import sys
+import threading
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+
+import http_clients
+from http_clients import get_ark_client, get_http_session
+
+
+class _CountingHandler(BaseHTTPRequestHandler):
+    # keep-alive 需要 HTTP/1.1 和 Content-Length
+    protocol_version = "HTTP/1.1"
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def do_GET(self):
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    _CountingHandler.connections = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _CountingHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_http_session_is_shared():
+    assert get_http_session() is get_http_session()
+
+
+def test_http_session_reuses_one_connection(stub_server):
+    session = get_http_session()
+    for i in range(5):
+        response = session.get(f"{stub_server}/image-{i}.png", timeout=5)
+        assert response.status_code == 200
+        assert response.content == b"ok"
+    assert _CountingHandler.connections == 1
+
+
+def test_ark_client_reused_per_key(monkeypatch):
+    created = []
+
+    class FakeArk:
+        def __init__(self, base_url, api_key):
+            created.append((base_url, api_key))
+
+    monkeypatch.setitem(
+        sys.modules, "volcenginesdkarkruntime", types.SimpleNamespace(Ark=FakeArk)
+    )
+    monkeypatch.setattr(http_clients, "_ark_clients", {})
+
+    first = get_ark_client("key-a", base_url="https://ark.test")
+    assert get_ark_client("key-a", base_url="https://ark.test") is first
+    other = get_ark_client("key-b", base_url="https://ark.test")
+    assert other is not first
+    assert created == [("https://ark.test", "key-a"), ("https://ark.test", "key-b")]
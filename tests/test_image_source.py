@@ -0,0 +1,50 @@
+"""
+路径和URL来源的图片同样按目标尺寸解码（JPEG draft），图片缓存只保存原始字节
+"""
+from io import BytesIO
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+import image_cache
+from image_source import ImageSource
+
+
+@pytest.fixture
+def photo_path(tmp_path):
+    image_cache.clear_image_cache()
+    path = tmp_path / "photo.jpg"
+    Image.new("RGB", (2400, 1800), (200, 180, 150)).save(path, format="JPEG")
+    yield str(path)
+    image_cache.clear_image_cache()
+
+
+def test_path_source_decodes_with_draft(photo_path):
+    source = ImageSource.from_location(photo_path)
+    assert source.digest() is not None
+
+    img = source.open_reduced(400)
+    # draft 按 1/4 解码：短边 450，不需要先解码整幅 2400x1800
+    assert img.size == (600, 450)
+    assert source.size() == (2400, 1800)
+
+
+def test_cache_holds_encoded_bytes_only(photo_path):
+    with open(photo_path, "rb") as f:
+        data = f.read()
+
+    entry = image_cache.load_cached_image(photo_path)
+    assert entry.data == data
+    assert entry.size == (2400, 1800)
+    assert entry.nbytes == len(data)
+    assert image_cache.image_cache_stats()["bytes"] == len(data)
+
+
+def test_bytes_and_path_sources_decode_alike(photo_path):
+    with open(photo_path, "rb") as f:
+        data = f.read()
+
+    from_path = ImageSource.from_location(photo_path).open_reduced(400)
+    from_bytes = ImageSource.from_bytes(data).open_reduced(400)
+    assert from_path.tobytes() == from_bytes.tobytes()
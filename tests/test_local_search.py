@@ -0,0 +1,55 @@
+"""
+本地存储的关键词查询：表情、符号等切分不出检索词的查询按子串匹配
+"""
+import threading
+
+import pytest
+
+import local_store
+from local_store import append_local_journal, query_local_journals
+
+
+@pytest.fixture
+def local_db(tmp_path, monkeypatch):
+    """使用临时目录中的本地数据库"""
+    monkeypatch.setattr(local_store, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(local_store, "DB_FILE", str(tmp_path / "journals.db"))
+    monkeypatch.setattr(local_store, "JOURNALS_FILE", str(tmp_path / "journals.json"))
+    monkeypatch.setattr(local_store, "SNAPSHOT_FILE", str(tmp_path / "journals.snapshot.db"))
+    monkeypatch.setattr(local_store, "_initialized", False)
+    monkeypatch.setattr(local_store, "_local", threading.local())
+    for i, (weather, text) in enumerate([
+        ("☀️ 晴天", "出门散步，阳光很好"),
+        ("🌧️ 雨天", "下雨了，在家看书"),
+        ("☀️ 晴天", "晒被子 ☕"),
+    ]):
+        append_local_journal({
+            "id": f"j{i}",
+            "date": f"2026年10月{10 + i}日",
+            "weather": weather,
+            "text": text,
+            "image_paths": [],
+            "journal_image_path": None,
+            "created_at": f"2026-10-{10 + i}T08:00:00",
+        })
+    yield
+    conn = getattr(local_store._local, "conn", None)
+    if conn is not None:
+        conn.close()
+
+
+def ids(result):
+    journals, total = result
+    assert total == len(journals)
+    return [journal["id"] for journal in journals]
+
+
+def test_emoji_keyword_matches_substring(local_db):
+    assert ids(query_local_journals(keyword="☀️")) == ["j2", "j0"]
+    assert ids(query_local_journals(keyword="☕")) == ["j2"]
+    assert ids(query_local_journals(keyword="🌧️", weather="☀️ 晴天")) == []
+
+
+def test_text_keyword_still_uses_index(local_db):
+    assert ids(query_local_journals(keyword="下雨")) == ["j1"]
+    assert ids(query_local_journals(keyword="   ")) == ["j2", "j1", "j0"]
@@ -0,0 +1,62 @@
+"""
+新建日记与编辑后重新生成共用渲染种子和渲染缓存
+"""
+from io import BytesIO
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+import journal_renderer
+import render_cache
+from cache_store import DiskCache, LRUCache, TieredCache
+from image_source import ImageSource
+from journal_renderer import create_journal_page
+
+
+@pytest.fixture
+def page_lookups(tmp_path, monkeypatch):
+    """使用临时目录中的渲染缓存，并记录每次查询是否命中"""
+    monkeypatch.setattr(render_cache, "_render_cache", TieredCache(
+        LRUCache(64 * 1024 * 1024),
+        DiskCache(str(tmp_path / "render_cache"), 64 * 1024 * 1024, suffix=".png"),
+    ))
+    lookups = []
+
+    def get_cached_page(key):
+        page = render_cache.get_cached_page(key)
+        lookups.append(page is not None)
+        return page
+
+    monkeypatch.setattr(journal_renderer, "get_cached_page", get_cached_page)
+    return lookups
+
+
+def photo_bytes():
+    buffer = BytesIO()
+    Image.new("RGB", (320, 240), (90, 120, 160)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_edit_rerender_hits_cache_of_new_journal(page_lookups, tmp_path):
+    data = photo_bytes()
+    content = ("下雨了，窗外很安静", "2026年10月18日", "🌧️ 雨天")
+
+    # 新建日记：上传的图片还只是内存中的字节
+    created = create_journal_page([ImageSource.from_bytes(data, name="upload.jpg")], *content, use_ai=False)
+
+    # 编辑后重新生成：同样的内容，图片从保存后的路径读取
+    saved_path = tmp_path / "photo.jpg"
+    saved_path.write_bytes(data)
+    rerendered = create_journal_page([str(saved_path)], *content, use_ai=False)
+
+    assert page_lookups == [False, True]
+    assert rerendered.tobytes() == created.convert("RGB").tobytes()
+
+
+def test_changed_content_misses_cache(page_lookups):
+    data = photo_bytes()
+    create_journal_page([data], "第一版", "2026年10月18日", "☁️ 多云", use_ai=False)
+    create_journal_page([data], "第二版", "2026年10月18日", "☁️ 多云", use_ai=False)
+
+    assert page_lookups == [False, False]